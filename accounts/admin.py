@@ -1,7 +1,62 @@
 from django.contrib import admin
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from core.admin import LargeTableAdmin
 from .models import UserBankAccount,UserAddress
+from .summary import invalidate_account_summary, invalidate_account_summaries
 
 # Register your models here.
-admin.site.register(UserBankAccount)
+@admin.register(UserBankAccount)
+class UserBankAccountAdmin(LargeTableAdmin):
+    list_display = ['account_no', 'user', 'account_type', 'balance', 'open_loans']
+    list_select_related = ['user']
+    list_filter = ['account_type']
+    # exact matches only, both columns are unique indexes; also what autocomplete searches
+    search_fields = ['=account_no', '=user__username']
+    ordering = ['-pk']
+    raw_id_fields = ['user']
+    # money moves through the posting service (journal entry) and the loan
+    # counter through recount_open_loans, never by hand
+    readonly_fields = ['balance', 'open_loans']
+    actions = ['recount_open_loans']
+
+    @admin.action(description='Recount open loans from the loan table')
+    def recount_open_loans(self, request, queryset):
+        # local import: transactions.models imports accounts.models
+        from transactions.constants import LOAN_APPROVED
+        from transactions.models import Loan
+
+        approved = Loan.objects.filter(account=OuterRef('pk'), status=LOAN_APPROVED).values('account')
+        # one UPDATE with a correlated count, however many accounts are selected
+        updated = queryset.update(
+            open_loans=Coalesce(Subquery(approved.annotate(n=Count('pk')).values('n')), 0)
+        )
+        invalidate_account_summaries(queryset.values_list('pk', flat=True))
+        self.message_user(request, f'Recounted open loans of {updated} accounts')
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            # only the edited columns: a full save would write back the balance
+            # the form loaded over postings made in the meantime
+            if form.changed_data:
+                obj.save(update_fields=form.changed_data)
+        else:
+            obj.save()
+        invalidate_account_summary(obj.pk)
+
+
+@admin.register(UserAddress)
+class UserAddressAdmin(LargeTableAdmin):
+    list_display = ['user', 'city', 'country']
+    # __str__ is the user's email
+    list_select_related = ['user']
+    search_fields = ['=user__username']
+    ordering = ['-pk']
+    raw_id_fields = ['user']
 
-admin.site.register(UserAddress)
\ No newline at end of file
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        account_id = UserBankAccount.objects.filter(user_id=obj.user_id).values_list('pk', flat=True).first()
+        if account_id:
+            invalidate_account_summary(account_id)
@@ -0,0 +1,17 @@
+from django.shortcuts import render
+
+from core.async_views import AsyncPageView
+
+
+class AsyncUserProfileView(AsyncPageView):
+    template_name = 'accounts/profile.html'
+
+    async def get(self, request):
+        # dispatch already loaded the summary, so this page does no queries of its own
+        summary = request._account_summary
+        context = {
+            'user': request.user,
+            'user_account': summary.account if summary else None,
+            'user_address': summary.address if summary else None,
+        }
+        return render(request, self.template_name, context)
@@ -0,0 +1,6 @@
+from .summary import request_account_summary
+
+
+def account_summary(request):
+    # callable, so pages that never show the summary never look it up
+    return {'account_summary': lambda: request_account_summary(request)}
@@ -2,7 +2,10 @@ from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from .constants import ACCOUNT_TYPE,GENDER_TYPE
 from django import forms
+from django.db import transaction
 from .models import UserBankAccount,UserAddress
+from .provisioning import next_account_number
+from .summary import invalidate_account_summary
 
 class UserRegistrationForm(UserCreationForm):
     birth_date = forms.DateField(widget=forms.DateInput(attrs={'type':'date'}))
@@ -21,30 +24,33 @@ class UserRegistrationForm(UserCreationForm):
     def save(self,commit=True):
         our_user = super().save(commit=False) #ami database e data save kortesi na ekhn
         if commit == True:
-            our_user.save()
-            account_type = self.cleaned_data.get('account_type')
-            gender = self.cleaned_data.get('gender')
-            postal_code = self.cleaned_data.get('postal_code')
-            country = self.cleaned_data.get('country')
-            birth_date = self.cleaned_data.get('birth_date')
-            city = self.cleaned_data.get('city')
-            street_address = self.cleaned_data.get('street_address')
-            
-            UserAddress.objects.create(
-                user=our_user,
-                postal_code = postal_code,
-                country = country,
-                city = city,
-                street_address = street_address    
-            )
-            
-            UserBankAccount.objects.create(
-              user = our_user,
-              account_type = account_type,
-              gender = gender,
-              birth_date = birth_date,
-              account_no = 100000 + our_user.id
-            )
+            # number ta transaction er baire nei, jate block cache kaje lage
+            account_no = next_account_number()
+            with transaction.atomic():
+                our_user.save()
+                account_type = self.cleaned_data.get('account_type')
+                gender = self.cleaned_data.get('gender')
+                postal_code = self.cleaned_data.get('postal_code')
+                country = self.cleaned_data.get('country')
+                birth_date = self.cleaned_data.get('birth_date')
+                city = self.cleaned_data.get('city')
+                street_address = self.cleaned_data.get('street_address')
+
+                UserAddress.objects.create(
+                    user=our_user,
+                    postal_code = postal_code,
+                    country = country,
+                    city = city,
+                    street_address = street_address
+                )
+
+                UserBankAccount.objects.create(
+                  user = our_user,
+                  account_type = account_type,
+                  gender = gender,
+                  birth_date = birth_date,
+                  account_no = account_no
+                )
         return our_user
     
     def __init__(self,*args,**kwargs):
@@ -121,6 +127,7 @@ class UserUpdateForm(forms.ModelForm):
             user_address.postal_code = self.cleaned_data['postal_code']
             user_address.country = self.cleaned_data['country']
             user_address.save()
+            invalidate_account_summary(user_account.pk)
 
         return user
       
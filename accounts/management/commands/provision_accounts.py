@@ -0,0 +1,58 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.provisioning import provision_accounts
+from transactions.batch import read_records
+
+
+class Command(BaseCommand):
+    help = (
+        'Create customers (user, address, bank account) from a csv/jsonl file with columns '
+        'username, email, first_name, last_name, password, account_type, gender, birth_date, '
+        'street_address, city, postal_code, country'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--rejects', help='Write rejected lines to this file instead of stderr')
+        parser.add_argument(
+            '--hasher-profile', choices=list(settings.PASSWORD_HASHER_PROFILES),
+            help='Password hasher profile, defaults to PROVISIONING_HASHER_PROFILE; '
+                 'the first login rehashes with PASSWORD_HASHER_PROFILE',
+        )
+        parser.add_argument('--workers', type=int, help='Hashing threads, defaults to PROVISIONING_HASH_WORKERS')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+
+        rejects = open(options['rejects'], 'w') if options['rejects'] else None
+
+        def on_reject(line_no, reason):
+            message = f'line {line_no}: {reason}\n'
+            if rejects:
+                rejects.write(message)
+            else:
+                self.stderr.write(message, ending='')
+
+        try:
+            with open(path, newline='') as stream:
+                result = provision_accounts(
+                    read_records(stream, fmt),
+                    chunk_size=options['chunk_size'],
+                    on_reject=on_reject,
+                    hasher_profile=options['hasher_profile'],
+                    workers=options['workers'],
+                )
+        except OSError as exc:
+            raise CommandError(exc)
+        finally:
+            if rejects:
+                rejects.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {result.created} customers, rejected {result.rejected} '
+            f'in {result.elapsed:.2f}s ({result.throughput:,.0f} customers/s)'
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 18:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_alter_userbankaccount_gender'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userbankaccount',
+            name='open_loans',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
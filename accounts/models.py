@@ -15,6 +15,8 @@ class UserBankAccount(models.Model):
      gender = models.CharField(max_length=10,choices=GENDER_TYPE)
      initial_deposite_date = models.DateField(auto_now_add=True)
      balance = models.DecimalField(default=0,max_digits=12,decimal_places=2)
+     # approved but not yet repaid loans, kept in step by transactions.services
+     open_loans = models.PositiveIntegerField(default=0)
      
      def __str__(self):
         return str(self.account_no)
@@ -32,3 +34,12 @@ class UserAddress(models.Model):
         return str(self.user.email)
     
     
+
+
+class AccountNumberSequence(models.Model):
+    # next free account number; accounts.provisioning hands them out in blocks
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.BigIntegerField()
+
+    def __str__(self):
+        return f'{self.name}: {self.next_value}'
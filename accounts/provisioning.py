@@ -0,0 +1,279 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass
+from datetime import date
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Max
+from django.utils.module_loading import import_string
+
+from core.db import BULK_BATCH_SIZE
+from .constants import ACCOUNT_TYPE, GENDER_TYPE
+from .models import AccountNumberSequence, UserAddress, UserBankAccount
+
+ACCOUNT_NO_SEQUENCE = 'account_no'
+FIRST_ACCOUNT_NO = 100001
+BLOCK_SIZE = getattr(settings, 'ACCOUNT_NO_BLOCK_SIZE', 20)
+
+ACCOUNT_TYPES = {value for value, _ in ACCOUNT_TYPE}
+GENDERS = {value for value, _ in GENDER_TYPE}
+
+
+def _create_sequence(count):
+    # first use: start above every account number handed out so far
+    highest = UserBankAccount.objects.aggregate(highest=Max('account_no'))['highest'] or 0
+    start = max(FIRST_ACCOUNT_NO, highest + 1)
+    try:
+        with transaction.atomic():
+            AccountNumberSequence.objects.create(name=ACCOUNT_NO_SEQUENCE, next_value=start + count)
+        return True
+    except IntegrityError:
+        # another process created it first
+        return False
+
+
+def reserve_account_numbers(count):
+    """
+    Reserve `count` consecutive account numbers and return them as a range.
+    The increment is a single conditional UPDATE, so concurrent callers
+    always get disjoint blocks. Numbers reserved by a transaction that rolls
+    back are handed out again; numbers reserved and then not used are gaps.
+    """
+    sequence = AccountNumberSequence.objects.filter(name=ACCOUNT_NO_SEQUENCE)
+    with transaction.atomic():
+        if not sequence.update(next_value=F('next_value') + count):
+            if not _create_sequence(count):
+                sequence.update(next_value=F('next_value') + count)
+        end = sequence.values_list('next_value', flat=True).get()
+    return range(end - count, end)
+
+
+class AccountNumberAllocator:
+    """
+    Hands out account numbers one at a time from a block reserved in a
+    single UPDATE, so registrations hit the sequence row once per block.
+    Unused numbers of a block are lost when the process exits.
+    """
+
+    def __init__(self, block_size=BLOCK_SIZE):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._block = iter(())
+
+    def next(self):
+        if connection.in_atomic_block:
+            # a cached block would outlive a rollback of the reservation
+            return reserve_account_numbers(1)[0]
+        with self._lock:
+            number = next(self._block, None)
+            if number is None:
+                self._block = iter(reserve_account_numbers(self.block_size))
+                number = next(self._block)
+            return number
+
+
+allocator = AccountNumberAllocator()
+
+
+def next_account_number():
+    return allocator.next()
+
+
+class RejectedCustomer(ValueError):
+    pass
+
+
+@dataclass
+class CustomerRecord:
+    line: int
+    username: str
+    email: str
+    first_name: str
+    last_name: str
+    password: str
+    account_type: str
+    gender: str
+    birth_date: date
+    street_address: str
+    city: str
+    postal_code: int
+    country: str
+
+
+@dataclass
+class ProvisionResult:
+    created: int = 0
+    rejected: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def throughput(self):
+        return self.created / self.elapsed if self.elapsed else 0.0
+
+
+def parse_customer(line_no, raw):
+    try:
+        username = str(raw['username']).strip()
+        account_type = str(raw['account_type']).strip()
+        gender = str(raw['gender']).strip()
+        postal_code = int(raw['postal_code'])
+        birth_date = raw.get('birth_date') or None
+        if birth_date:
+            birth_date = date.fromisoformat(str(birth_date).strip())
+    except (KeyError, TypeError, ValueError):
+        raise RejectedCustomer('Malformed record, expected username, account_type, gender and postal_code')
+    if not username or len(username) > 150:
+        raise RejectedCustomer('Username must be 1 to 150 characters')
+    if account_type not in ACCOUNT_TYPES:
+        raise RejectedCustomer(f'Unknown account type {account_type!r}')
+    if gender not in GENDERS:
+        raise RejectedCustomer(f'Unknown gender {gender!r}')
+    return CustomerRecord(
+        line=line_no,
+        username=username,
+        email=str(raw.get('email') or ''),
+        first_name=str(raw.get('first_name') or ''),
+        last_name=str(raw.get('last_name') or ''),
+        password=raw.get('password') or None,
+        account_type=account_type,
+        gender=gender,
+        birth_date=birth_date,
+        street_address=str(raw.get('street_address') or ''),
+        city=str(raw.get('city') or ''),
+        postal_code=postal_code,
+        country=str(raw.get('country') or ''),
+    )
+
+
+def _reject(on_reject, line_no, reason):
+    if on_reject:
+        on_reject(line_no, reason)
+
+
+def provisioning_hasher(profile=None):
+    """The hasher of `profile` (default PROVISIONING_HASHER_PROFILE)."""
+    profile = profile or settings.PROVISIONING_HASHER_PROFILE
+    return import_string(settings.PASSWORD_HASHER_PROFILES[profile])()
+
+
+def hash_passwords(passwords, hasher, pool=None):
+    """make_password() every password with hasher, on the pool's threads if given."""
+    # records without a password get an unusable one and go through password reset
+    def hash_one(password):
+        return make_password(password, hasher=hasher)
+    return list(pool.map(hash_one, passwords) if pool else map(hash_one, passwords))
+
+
+def provision_chunk(records, on_reject=None, hasher=None, pool=None):
+    """
+    Create the users, addresses and bank accounts of one chunk of
+    CustomerRecords in a single db transaction: one query for taken
+    usernames, one sequence reservation and three bulk_creates.
+    Returns the number of created customers.
+    """
+    # hashing is the slow part, done before the transaction so it does not
+    # hold the write lock; a taken username wastes its hash
+    passwords = hash_passwords([record.password for record in records], hasher or provisioning_hasher(), pool)
+    with transaction.atomic():
+        taken = set(
+            User.objects.filter(username__in=[record.username for record in records])
+            .values_list('username', flat=True)
+        )
+        fresh = []
+        for record, password in zip(records, passwords):
+            if record.username in taken:
+                _reject(on_reject, record.line, f'Username {record.username} already exists')
+                continue
+            taken.add(record.username)
+            fresh.append((record, password))
+        if not fresh:
+            return 0
+
+        users = User.objects.bulk_create(
+            [
+                User(
+                    username=record.username,
+                    email=record.email,
+                    first_name=record.first_name,
+                    last_name=record.last_name,
+                    password=password,
+                )
+                for record, password in fresh
+            ],
+            batch_size=BULK_BATCH_SIZE,
+        )
+        if not connection.features.can_return_rows_from_bulk_insert:
+            ids = User.objects.in_bulk([user.username for user in users], field_name='username')
+            users = [ids[user.username] for user in users]
+
+        UserAddress.objects.bulk_create(
+            [
+                UserAddress(
+                    user=user,
+                    street_address=record.street_address,
+                    city=record.city,
+                    postal_code=record.postal_code,
+                    country=record.country,
+                )
+                for user, (record, _) in zip(users, fresh)
+            ],
+            batch_size=BULK_BATCH_SIZE,
+        )
+        UserBankAccount.objects.bulk_create(
+            [
+                UserBankAccount(
+                    user=user,
+                    account_type=record.account_type,
+                    gender=record.gender,
+                    birth_date=record.birth_date,
+                    account_no=account_no,
+                )
+                for user, (record, _), account_no in zip(users, fresh, reserve_account_numbers(len(fresh)))
+            ],
+            batch_size=BULK_BATCH_SIZE,
+        )
+    return len(fresh)
+
+
+def provision_accounts(rows, chunk_size=1000, on_reject=None, hasher_profile=None, workers=None):
+    """
+    Stream (line_no, dict) rows (see transactions.batch.read_records) through
+    validation and create the customers chunk by chunk, one transaction per
+    chunk. on_reject(line_no, reason) is called for every rejected line.
+    Passwords are hashed with hasher_profile (default
+    PROVISIONING_HASHER_PROFILE) on `workers` threads (default
+    PROVISIONING_HASH_WORKERS).
+    """
+    hasher = provisioning_hasher(hasher_profile)
+    workers = workers or settings.PROVISIONING_HASH_WORKERS
+    result = ProvisionResult()
+    started = time.perf_counter()
+
+    def report(line_no, reason):
+        result.rejected += 1
+        if on_reject:
+            on_reject(line_no, reason)
+
+    def valid_records():
+        for line_no, raw in rows:
+            try:
+                yield parse_customer(line_no, raw)
+            except RejectedCustomer as exc:
+                report(line_no, str(exc))
+
+    records = valid_records()
+    with ThreadPoolExecutor(workers) if workers > 1 else nullcontext() as pool:
+        while True:
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                break
+            result.created += provision_chunk(chunk, on_reject=report, hasher=hasher, pool=pool)
+
+    result.elapsed = time.perf_counter() - started
+    return result
@@ -0,0 +1,148 @@
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .models import UserBankAccount, UserAddress
+
+CACHE_ALIAS = getattr(settings, 'ACCOUNT_SUMMARY_CACHE', 'account_summary')
+RECENT_TRANSACTIONS = getattr(settings, 'ACCOUNT_SUMMARY_RECENT_TRANSACTIONS', 5)
+# the cache is filled from the primary, a lagging replica would cache stale balances
+PRIMARY = DEFAULT_DB_ALIAS
+
+
+@dataclass
+class AccountSummary:
+    """
+    Read-mostly view of an account that the navbar, profile and transaction
+    pages need on every request. Only plain field values are cached (never the
+    User row), and the model instances are rebuilt on the way out.
+    """
+    account_fields: dict
+    address_fields: dict = None
+    recent_transactions: list = field(default_factory=list)
+
+    @property
+    def balance(self):
+        return self.account_fields['balance']
+
+    @property
+    def open_loans(self):
+        return self.account_fields['open_loans']
+
+    @property
+    def account(self):
+        return _instance(UserBankAccount, self.account_fields)
+
+    @property
+    def address(self):
+        if self.address_fields is None:
+            return None
+        return _instance(UserAddress, self.address_fields)
+
+
+def _fields(instance):
+    return {f.attname: getattr(instance, f.attname) for f in instance._meta.concrete_fields}
+
+
+def _instance(model, fields):
+    return model.from_db(DEFAULT_DB_ALIAS, list(fields), list(fields.values()))
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _user_key(user_id):
+    return f'account-id:{user_id}'
+
+
+def _summary_key(account_id):
+    return f'account-summary:{account_id}'
+
+
+def _recent_transactions(account):
+    # local import: transactions.models imports accounts.models
+    from transactions.models import Transaction
+
+    return (
+        Transaction.objects.using(PRIMARY).filter(account=account)
+        .order_by('-timestamp', '-id')
+        .values('timestamp', 'transaction_type', 'amount', 'balance_after_transaction')[:RECENT_TRANSACTIONS]
+    )
+
+
+def build_account_summary(account):
+    address = UserAddress.objects.using(PRIMARY).filter(user_id=account.user_id).first()
+    return AccountSummary(
+        account_fields=_fields(account),
+        address_fields=_fields(address) if address else None,
+        recent_transactions=list(_recent_transactions(account)),
+    )
+
+
+async def abuild_account_summary(account):
+    address = await UserAddress.objects.using(PRIMARY).filter(user_id=account.user_id).afirst()
+    return AccountSummary(
+        account_fields=_fields(account),
+        address_fields=_fields(address) if address else None,
+        recent_transactions=[row async for row in _recent_transactions(account)],
+    )
+
+
+def get_account_summary(user):
+    """AccountSummary of the user's bank account, or None when the user has none."""
+    if not user.is_authenticated:
+        return None
+    cache = _cache()
+    account_id = cache.get(_user_key(user.pk))
+    summary = cache.get(_summary_key(account_id)) if account_id else None
+    if summary is not None:
+        return summary
+
+    try:
+        account = UserBankAccount.objects.using(PRIMARY).get(user_id=user.pk)
+    except UserBankAccount.DoesNotExist:
+        return None
+    summary = build_account_summary(account)
+    # the user -> account mapping never changes, so it can outlive the summary
+    cache.set(_user_key(user.pk), account.pk, None)
+    cache.set(_summary_key(account.pk), summary)
+    return summary
+
+
+async def aget_account_summary(user):
+    if not user.is_authenticated:
+        return None
+    cache = _cache()
+    account_id = await cache.aget(_user_key(user.pk))
+    summary = await cache.aget(_summary_key(account_id)) if account_id else None
+    if summary is not None:
+        return summary
+
+    try:
+        account = await UserBankAccount.objects.using(PRIMARY).aget(user_id=user.pk)
+    except UserBankAccount.DoesNotExist:
+        return None
+    summary = await abuild_account_summary(account)
+    await cache.aset(_user_key(user.pk), account.pk, None)
+    await cache.aset(_summary_key(account.pk), summary)
+    return summary
+
+
+def request_account_summary(request):
+    """get_account_summary memoized on the request, so a page looks it up only once."""
+    if not hasattr(request, '_account_summary'):
+        request._account_summary = get_account_summary(request.user)
+    return request._account_summary
+
+
+def invalidate_account_summary(account_id):
+    """Drop the cached summary once the current db transaction commits."""
+    transaction.on_commit(lambda: _cache().delete(_summary_key(account_id)))
+
+
+def invalidate_account_summaries(account_ids):
+    keys = [_summary_key(account_id) for account_id in account_ids]
+    transaction.on_commit(lambda: _cache().delete_many(keys))
@@ -1,3 +1,186 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+from decimal import Decimal
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from transactions.constants import DEPOSIT
+from transactions.models import Transaction
+from transactions.services import approve_loan, post_transaction, request_loan
+from .models import UserBankAccount, UserAddress
+from .provisioning import provision_accounts, reserve_account_numbers
+from .summary import get_account_summary
+
+
+class AccountSummaryCacheTests(TestCase):
+    def setUp(self):
+        caches['account_summary'].clear()
+        self.user = User.objects.create_user(username='sadia', password='pass12345', first_name='Sadia')
+        self.account = UserBankAccount.objects.create(
+            user=self.user, account_type='Savings', gender='Female', account_no=300001, balance=500
+        )
+        UserAddress.objects.create(
+            user=self.user, street_address='12 Lake Road', city='Dhaka', postal_code=1207, country='Bangladesh'
+        )
+        self.client.force_login(self.user)
+
+    def test_profile_is_served_from_cache(self):
+        self.client.get(reverse('profile'))
+        # only the session and the user are read once the summary is warm
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('profile'))
+        self.assertEqual(response.context['user_account'].account_no, 300001)
+        self.assertEqual(response.context['user_address'].city, 'Dhaka')
+        self.assertContains(response, 'balance : 500')
+
+    def test_posting_invalidates_summary_on_commit(self):
+        self.assertEqual(get_account_summary(self.user).balance, Decimal(500))
+        with self.captureOnCommitCallbacks(execute=True):
+            post_transaction(Transaction(account=self.account, amount=Decimal(250), transaction_type=DEPOSIT))
+
+        summary = get_account_summary(self.user)
+        self.assertEqual(summary.balance, Decimal(750))
+        self.assertEqual(summary.recent_transactions[0]['amount'], Decimal(250))
+
+    def test_user_without_account_has_no_summary(self):
+        staff = User.objects.create_user(username='staff', password='pass12345')
+        self.assertIsNone(get_account_summary(staff))
+
+
+class ProvisioningTests(TestCase):
+    def customer(self, n, **extra):
+        row = {
+            'username': f'customer{n}', 'email': f'customer{n}@example.com', 'account_type': 'Savings',
+            'gender': 'Female', 'birth_date': '1995-05-01', 'street_address': f'{n} Mirpur Road',
+            'city': 'Dhaka', 'postal_code': '1216', 'country': 'Bangladesh',
+        }
+        row.update(extra)
+        return row
+
+    def test_sequence_starts_above_existing_accounts_and_never_overlaps(self):
+        user = User.objects.create_user(username='old', password='pass12345')
+        UserBankAccount.objects.create(user=user, account_type='Savings', gender='Male', account_no=100500)
+
+        first = reserve_account_numbers(10)
+        second = reserve_account_numbers(5)
+        self.assertEqual(first, range(100501, 100511))
+        self.assertEqual(second, range(100511, 100516))
+
+    def test_chunks_are_bulk_created(self):
+        rows = [(n, self.customer(n)) for n in range(1, 26)]
+        rows.append((26, self.customer(1)))  # duplicate username
+        rows.append((27, self.customer(27, gender='Other')))
+        rejected = []
+
+        with CaptureQueriesContext(connection) as captured:
+            result = provision_accounts(rows, chunk_size=10, on_reject=lambda *r: rejected.append(r))
+        # one insert per table per chunk
+        for table in ('auth_user', 'accounts_useraddress', 'accounts_userbankaccount'):
+            inserts = [q for q in captured if q['sql'].startswith(f'INSERT INTO "{table}"')]
+            self.assertEqual(len(inserts), 3)
+
+        self.assertEqual(result.created, 25)
+        self.assertEqual([line for line, _ in rejected], [27, 26])
+        numbers = list(UserBankAccount.objects.order_by('account_no').values_list('account_no', flat=True))
+        self.assertEqual(len(set(numbers)), 25)
+        account = UserBankAccount.objects.select_related('user__address').get(user__username='customer7')
+        self.assertEqual(account.user.address.street_address, '7 Mirpur Road')
+        self.assertFalse(account.user.has_usable_password())
+
+    def test_command_reads_jsonl(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as f:
+            for n in range(3):
+                f.write(json.dumps(self.customer(n, password='Str0ng-pass!')) + '\n')
+        self.addCleanup(os.unlink, f.name)
+
+        out = io.StringIO()
+        call_command('provision_accounts', f.name, stdout=out)
+        self.assertIn('Created 3 customers', out.getvalue())
+        self.assertTrue(User.objects.get(username='customer2').check_password('Str0ng-pass!'))
+
+    def test_passwords_hashed_with_the_provisioning_profile_on_threads(self):
+        rows = [(n, self.customer(n, password='Str0ng-pass!')) for n in range(1, 4)]
+        result = provision_accounts(rows, hasher_profile='scrypt', workers=2)
+
+        self.assertEqual(result.created, 3)
+        for user in User.objects.filter(username__startswith='customer'):
+            self.assertTrue(user.password.startswith('scrypt$'))
+            self.assertTrue(user.check_password('Str0ng-pass!'))
+
+    def test_registration_is_atomic(self):
+        data = self.customer(1, password1='Str0ng-pass!', password2='Str0ng-pass!', first_name='A', last_name='B')
+        response = self.client.post(reverse('register'), data)
+        self.assertEqual(response.status_code, 302)
+        account = UserBankAccount.objects.get(user__username='customer1')
+        self.assertGreaterEqual(account.account_no, 100001)
+
+
+class PasswordHashingTests(TestCase):
+    def test_login_rehashes_with_the_profile_hasher(self):
+        user = User.objects.create_user(username='tania', password='Str0ng-pass!')
+        self.assertTrue(user.password.startswith('md5$'))  # fast profile under the test runner
+
+        with override_settings(PASSWORD_HASHERS=[settings.PASSWORD_HASHER_PROFILES['scrypt'], *settings.PASSWORD_HASHERS]):
+            response = self.client.post(reverse('login'), {'username': 'tania', 'password': 'Str0ng-pass!'})
+            self.assertEqual(response.status_code, 302)
+            user.refresh_from_db()
+            self.assertTrue(user.password.startswith('scrypt$'))
+            self.assertTrue(user.check_password('Str0ng-pass!'))
+
+    def test_every_profile_hasher_verifies(self):
+        for hasher in settings.PASSWORD_HASHER_PROFILES.values():
+            self.assertIn(hasher, settings.PASSWORD_HASHERS)
+
+
+class AccountAdminTests(TestCase):
+    def setUp(self):
+        caches['account_summary'].clear()
+        self.client.force_login(User.objects.create_superuser('boss', 'boss@example.com', 'pass12345'))
+
+    def test_balance_is_not_editable(self):
+        user = User.objects.create_user(username='owner', password='pass12345')
+        account = UserBankAccount.objects.create(
+            user=user, account_type='Savings', gender='Male', account_no=600100, balance=Decimal(100)
+        )
+        url = reverse('admin:accounts_userbankaccount_change', args=[account.pk])
+        response = self.client.get(url)
+        self.assertNotIn('balance', response.context['adminform'].form.fields)
+
+        # a posting lands between loading the form and saving it
+        UserBankAccount.objects.filter(pk=account.pk).update(balance=Decimal(700))
+        response = self.client.post(url, {
+            'user': user.pk, 'account_type': 'Current', 'account_no': 600100, 'gender': 'Male',
+            'birth_date': '', 'balance': '999999', 'open_loans': 5,
+        })
+        self.assertEqual(response.status_code, 302)
+        account.refresh_from_db()
+        self.assertEqual((account.account_type, account.balance, account.open_loans), ('Current', Decimal(700), 0))
+
+    def test_recount_open_loans_is_one_update(self):
+        accounts = []
+        for n in range(3):
+            user = User.objects.create_user(username=f'owner{n}', password='pass12345')
+            accounts.append(UserBankAccount.objects.create(
+                user=user, account_type='Savings', gender='Male', account_no=600000 + n, open_loans=2
+            ))
+        approve_loan(request_loan(accounts[0], Decimal(500)))
+
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post(reverse('admin:accounts_userbankaccount_changelist'), {
+                'action': 'recount_open_loans', '_selected_action': [a.pk for a in accounts],
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len([q for q in captured if q['sql'].startswith('UPDATE')]), 1)
+        self.assertEqual(
+            dict(UserBankAccount.objects.values_list('account_no', 'open_loans')),
+            {600000: 1, 600001: 0, 600002: 0},
+        )
@@ -1,7 +1,11 @@
 
+from django.conf import settings
 from django.urls import path
 from . views import UserRegistrationsView,UserLoginView,UserLogoutView,UserProfileView,UserPasswordChangeView
 
+if settings.ASYNC_READ_VIEWS:
+    from .async_views import AsyncUserProfileView as UserProfileView
+
 urlpatterns = [
   
     path('register/', UserRegistrationsView.as_view(),name='register'),
@@ -5,7 +5,7 @@ from django.contrib.auth import login
 from django.urls import reverse_lazy
 from django.views import View
 from django.contrib.auth.views import LoginView,LogoutView,PasswordChangeView
-from .models import UserBankAccount, UserAddress
+from .summary import request_account_summary
 from django.contrib.auth import update_session_auth_hash
 
 
@@ -18,7 +18,6 @@ class UserRegistrationsView(FormView):
     success_url = reverse_lazy('profile')
     
     def form_valid(self,form):
-        print(form.cleaned_data)
         user = form.save()
         login(self.request,user)
         return super().form_valid(form) #form valid function call hobe jodi sob thik thake
@@ -39,12 +38,10 @@ class UserProfileView(View):
 
     def get(self, request):
         user = request.user
-        try:
-            user_account = UserBankAccount.objects.get(user=user)
-            user_address = UserAddress.objects.get(user=user)
-        except UserBankAccount.DoesNotExist or UserAddress.DoesNotExist:
-            user_account = None
-            user_address = None
+        # account ar address cache theke ashe, db te jay na
+        summary = request_account_summary(request)
+        user_account = summary.account if summary else None
+        user_address = summary.address if summary else None
 
         context = {
             'user': user,
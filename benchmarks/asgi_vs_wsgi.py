@@ -0,0 +1,164 @@
+"""
+Requests/sec and latency percentiles of the read-only pages served through
+Django's WSGI handler (sync views, one thread per in-flight request) and its
+ASGI handler (with and without ASYNC_READ_VIEWS), on the project URL routes.
+
+    python -m benchmarks.asgi_vs_wsgi --requests 2000 --concurrency 64
+
+Each scenario runs in its own process because ASYNC_READ_VIEWS picks the
+views when the urlconf is imported. Requests go through the test client
+handlers in-process, so the numbers compare the request paths and leave
+server (gunicorn / uvicorn) overhead out.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from benchmarks.harness import print_table, setup_django, summarize, write_results, Timer
+
+ROUTES = [
+    '/',
+    '/accounts/profile/',
+    '/transactions/report/',
+    '/transactions/loans/',
+    '/transactions/statement/?format=csv',
+]
+
+SCENARIOS = {
+    # name: (handler, ASYNC_READ_VIEWS)
+    'wsgi-sync-views': ('wsgi', '0'),
+    'asgi-sync-views': ('asgi', '0'),
+    'asgi-async-views': ('asgi', '1'),
+}
+
+
+def seed_users(users, transactions_per_user):
+    from benchmarks.fixtures import seed
+    from transactions.services import request_loan
+
+    seeded = seed(users, transactions_per_user)
+    for user in seeded:
+        request_loan(user.account, Decimal(500))
+    return seeded
+
+
+def body_length(response):
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
+
+
+async def abody_length(response):
+    # async iteration is how the ASGI handler drains streaming responses,
+    # sync iterators included (it consumes those in a worker thread)
+    if response.streaming:
+        return sum([len(chunk) async for chunk in response])
+    return len(response.content)
+
+
+def run_wsgi(users, route, requests, concurrency):
+    from django.test import Client
+
+    clients = []
+    for n in range(concurrency):
+        client = Client()
+        client.force_login(users[n % len(users)])
+        clients.append(client)
+
+    def worker(n):
+        client, latencies = clients[n], []
+        for _ in range(n, requests, concurrency):
+            started = time.perf_counter()
+            response = client.get(route)
+            body_length(response)
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.status_code
+        return latencies
+
+    with Timer() as timer, ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(worker, range(concurrency)))
+    return [latency for latencies in results for latency in latencies], timer.elapsed
+
+
+def run_asgi(users, route, requests, concurrency):
+    from django.test import AsyncClient
+
+    async def main():
+        clients = []
+        for n in range(concurrency):
+            client = AsyncClient()
+            await client.aforce_login(users[n % len(users)])
+            clients.append(client)
+
+        async def worker(n):
+            client, latencies = clients[n], []
+            for _ in range(n, requests, concurrency):
+                started = time.perf_counter()
+                response = await client.get(route)
+                await abody_length(response)
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.status_code
+            return latencies
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(worker(n) for n in range(concurrency)))
+        return [latency for latencies in results for latency in latencies], time.perf_counter() - started
+
+    return asyncio.run(main())
+
+
+def run_scenario(name, args):
+    handler, _ = SCENARIOS[name]
+    setup_django()
+    users = seed_users(args.users, args.transactions)
+    runner = run_wsgi if handler == 'wsgi' else run_asgi
+    rows = []
+    for route in ROUTES:
+        # warm up caches (account summary, templates) before measuring
+        runner(users, route, args.concurrency, args.concurrency)
+        latencies, elapsed = runner(users, route, args.requests, args.concurrency)
+        rows.append(summarize(latencies, elapsed, scenario=name, route=route))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=1000, help='requests per route')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--users', type=int, default=16)
+    parser.add_argument('--transactions', type=int, default=200, help='transactions per seeded account')
+    parser.add_argument('--scenario', choices=SCENARIOS, action='append', help='run only these scenarios')
+    parser.add_argument('--output', help='JSON result path (default benchmarks/results/)')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_scenario(args.scenario[0], args)))
+        return
+
+    rows = []
+    for name in args.scenario or SCENARIOS:
+        env = dict(os.environ, ASYNC_READ_VIEWS=SCENARIOS[name][1])
+        command = [
+            sys.executable, '-m', 'benchmarks.asgi_vs_wsgi', '--child', '--scenario', name,
+            '--requests', str(args.requests), '--concurrency', str(args.concurrency),
+            '--users', str(args.users), '--transactions', str(args.transactions),
+        ]
+        output = subprocess.run(command, env=env, check=True, stdout=subprocess.PIPE, text=True).stdout
+        rows.extend(json.loads(output.splitlines()[-1]))
+
+    print_table(rows, ['scenario', 'route', 'ops_per_sec', 'p50_ms', 'p99_ms'])
+    config = {'requests': args.requests, 'concurrency': args.concurrency,
+              'users': args.users, 'transactions': args.transactions}
+    path = write_results('asgi_vs_wsgi', {'config': config, 'results': rows}, args.output)
+    print(f'\nresults written to {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Fast fixture generator for the benchmarks: users, accounts, addresses and a
+transaction history are written with bulk_create, the password is hashed
+once and shared, and the daily snapshots are rebuilt in one pass.
+"""
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import UserAddress, UserBankAccount
+from accounts.provisioning import reserve_account_numbers
+from transactions.constants import DEPOSIT, WITHDRAWAL, MIN_DEPOSIT_AMOUNT, MIN_WITHDRAW_AMOUNT
+from transactions.models import Transaction
+from transactions.snapshots import rebuild_daily_balances
+
+BENCH_PASSWORD = 'bench-pass-123'
+BATCH_SIZE = 2000
+
+
+@contextmanager
+def explicit_timestamps():
+    # auto_now_add would overwrite the spread-out history timestamps
+    field = Transaction._meta.get_field('timestamp')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def _history(account, count, days, rng, now):
+    balance = Decimal(0)
+    span = timedelta(days=days).total_seconds()
+    offsets = sorted(rng.random() * span for _ in range(count))
+    rows = []
+    for offset in offsets:
+        if balance >= 2 * MIN_WITHDRAW_AMOUNT and rng.random() < 0.3:
+            transaction_type = WITHDRAWAL
+            amount = Decimal(rng.randint(MIN_WITHDRAW_AMOUNT, int(balance) // 2))
+            balance -= amount
+        else:
+            transaction_type = DEPOSIT
+            amount = Decimal(rng.randint(MIN_DEPOSIT_AMOUNT, 5000))
+            balance += amount
+        rows.append(Transaction(
+            account_id=account.pk,
+            amount=amount,
+            balance_after_transaction=balance,
+            transaction_type=transaction_type,
+            timestamp=now - timedelta(seconds=span - offset),
+        ))
+    return rows, balance
+
+
+def seed(users=100, transactions_per_user=50, days=30, prefix='bench', seed=0):
+    """
+    Create `users` users with an account, an address and a random
+    deposit/withdraw history of `transactions_per_user` rows spread over the
+    last `days` days. Every user's password is BENCH_PASSWORD. Returns the
+    created User objects.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    password = make_password(BENCH_PASSWORD)
+
+    with transaction.atomic():
+        created = User.objects.bulk_create(
+            [User(username=f'{prefix}{n}', password=password, email=f'{prefix}{n}@example.com') for n in range(users)],
+            batch_size=BATCH_SIZE,
+        )
+        # bulk_create returns pks on sqlite/postgres, refetch to be safe elsewhere
+        created = list(User.objects.filter(username__in=[u.username for u in created]).order_by('pk'))
+
+        UserAddress.objects.bulk_create(
+            [
+                UserAddress(user=user, street_address=f'{n} Bench Road', city='Dhaka', postal_code=1200, country='Bangladesh')
+                for n, user in enumerate(created)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        UserBankAccount.objects.bulk_create(
+            [
+                UserBankAccount(user=user, account_type='Savings', gender='Male', account_no=account_no)
+                for user, account_no in zip(created, reserve_account_numbers(len(created)))
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        accounts = list(UserBankAccount.objects.filter(user__in=created).order_by('pk'))
+
+        pending = []
+        balances = {}
+        with explicit_timestamps():
+            for account in accounts:
+                rows, balances[account.pk] = _history(account, transactions_per_user, days, rng, now)
+                pending.extend(rows)
+                if len(pending) >= BATCH_SIZE:
+                    Transaction.objects.bulk_create(pending, batch_size=BATCH_SIZE)
+                    pending = []
+            Transaction.objects.bulk_create(pending, batch_size=BATCH_SIZE)
+
+        by_user = {}
+        for account in accounts:
+            account.balance = balances[account.pk]
+            by_user[account.user_id] = account
+        UserBankAccount.objects.bulk_update(accounts, ['balance'], batch_size=BATCH_SIZE)
+        for user in created:
+            # replace the balance-less instance bulk_create cached on the user
+            user.account = by_user[user.pk]
+
+    account_ids = [account.pk for account in accounts]
+    for start in range(0, len(account_ids), 500):
+        rebuild_daily_balances(account_ids[start:start + 500])
+    return created
@@ -0,0 +1,173 @@
+"""
+The banking flows the benchmark drives through the Django test client. A
+flow is a class with an optional untimed prepare() step and a timed
+request() that returns the response; run_flow() records the latency and the
+number of SQL queries of every request.
+"""
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.db import OperationalError, connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from transactions.constants import DEPOSIT, WITHDRAWAL, LOAN
+from transactions.idempotency import new_idempotency_key
+from transactions.models import Loan
+from transactions.services import approve_loan, request_loan
+from .fixtures import BENCH_PASSWORD
+from .harness import summarize
+
+_counter = itertools.count()
+
+
+class Flow:
+    name = ''
+    login = True
+    expected_status = 302
+
+    def __init__(self, user):
+        self.user = user
+        self.client = Client()
+        if self.login:
+            self.client.force_login(user)
+
+    def prepare(self):
+        pass
+
+    def request(self):
+        raise NotImplementedError
+
+    def post(self, path, data=None):
+        # a fresh idempotency key per posting, the way a retrying client sends them
+        return self.client.post(path, data or {}, headers={'Idempotency-Key': new_idempotency_key()})
+
+
+class RegistrationFlow(Flow):
+    name = 'register'
+    login = False
+
+    def request(self):
+        username = f'register{next(_counter)}-{self.user.pk}'
+        return self.client.post('/accounts/register/', {
+            'username': username,
+            'password1': BENCH_PASSWORD,
+            'password2': BENCH_PASSWORD,
+            'first_name': 'Bench',
+            'last_name': 'User',
+            'email': f'{username}@example.com',
+            'account_type': 'Savings',
+            'birth_date': '1990-01-01',
+            'gender': 'Male',
+            'street_address': '1 Bench Road',
+            'city': 'Dhaka',
+            'postal_code': 1200,
+            'country': 'Bangladesh',
+        })
+
+
+class LoginFlow(Flow):
+    name = 'login'
+    login = False
+
+    def request(self):
+        self.client.cookies.clear()
+        return self.client.post('/accounts/login/', {'username': self.user.username, 'password': BENCH_PASSWORD})
+
+
+class DepositFlow(Flow):
+    name = 'deposit'
+
+    def request(self):
+        return self.post('/transactions/deposit/', {'amount': 1000, 'transaction_type': DEPOSIT})
+
+
+class WithdrawFlow(Flow):
+    name = 'withdraw'
+
+    def request(self):
+        return self.post('/transactions/withdraw/', {'amount': 500, 'transaction_type': WITHDRAWAL})
+
+
+class LoanRequestFlow(Flow):
+    name = 'loan_request'
+
+    def request(self):
+        return self.post('/transactions/loan_request/', {'amount': 1000, 'transaction_type': LOAN})
+
+
+class LoanPayFlow(Flow):
+    name = 'loan_pay'
+
+    def prepare(self):
+        # an approved loan to pay back; approval is an admin action, not timed
+        self.loan = approve_loan(request_loan(self.user.account, Decimal(500)))
+
+    def request(self):
+        return self.post(f'/transactions/loans/{self.loan.pk}/')
+
+
+class ReportFlow(Flow):
+    name = 'report'
+    expected_status = 200
+
+    def request(self):
+        return self.client.get('/transactions/report/')
+
+
+FLOWS = {flow.name: flow for flow in (
+    RegistrationFlow, LoginFlow, DepositFlow, WithdrawFlow, LoanRequestFlow, LoanPayFlow, ReportFlow,
+)}
+
+
+def _drive(flow, iterations):
+    latencies, queries, errors = [], [], 0
+    for _ in range(iterations):
+        flow.prepare()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            try:
+                response = flow.request()
+            except OperationalError:
+                # "database is locked" and friends, counted rather than fatal
+                errors += 1
+                continue
+            finally:
+                latencies.append(time.perf_counter() - started)
+        if response.status_code != flow.expected_status:
+            raise AssertionError(f'{flow.name}: expected {flow.expected_status}, got {response.status_code}')
+        queries.append(len(captured))
+    connection.close()
+    return latencies, queries, errors
+
+
+def run_flow(name, users, iterations, concurrency=1):
+    """
+    Run `iterations` requests of a flow spread over `concurrency` threads,
+    each thread acting as its own user. Returns the summarize() dict plus
+    query counts per request. ops_per_sec is over wall time, so it includes
+    the untimed prepare() steps; the latency percentiles do not.
+    """
+    flow_class = FLOWS[name]
+    flows = [flow_class(users[n % len(users)]) for n in range(concurrency)]
+    shares = [iterations // concurrency + (n < iterations % concurrency) for n in range(concurrency)]
+
+    started = time.perf_counter()
+    if concurrency == 1:
+        results = [_drive(flows[0], iterations)]
+    else:
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(_drive, flows, shares))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for result in results for latency in result[0]]
+    queries = [count for result in results for count in result[1]]
+    return summarize(
+        latencies, elapsed,
+        flow=name,
+        errors=sum(result[2] for result in results),
+        queries_per_request=round(sum(queries) / len(queries), 2) if queries else 0,
+        max_queries=max(queries, default=0),
+    )
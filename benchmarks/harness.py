@@ -0,0 +1,115 @@
+"""
+Shared plumbing for the benchmark scripts: Django setup against a throwaway
+test database, latency statistics and machine-readable result files.
+"""
+import atexit
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = BASE_DIR / 'benchmarks' / 'results'
+
+
+def setup_django():
+    """Configure Django and swap the default database for a fresh test database."""
+    if str(BASE_DIR) not in sys.path:
+        sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mamar_bank.settings')
+
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    # allow the test client's 'testserver' host and keep DEBUG query logging off
+    setup_test_environment(debug=False)
+    settings.ALLOWED_HOSTS = ['*']
+    # every flow hammers a few users from one address, the limiter would answer 429s
+    settings.RATE_LIMITS = {}
+    # the withdraw flow posts far more often than the velocity rules allow
+    settings.VELOCITY_RULES = []
+    if connection.vendor == 'sqlite':
+        # a file, not sqlite's shared in-memory db, which fails concurrent
+        # writers with 'table is locked' instead of waiting for the lock
+        directory = tempfile.mkdtemp(prefix='mamar-bench-')
+        atexit.register(shutil.rmtree, directory, ignore_errors=True)
+        connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'bench.sqlite3')
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    atexit.register(connection.creation.destroy_test_db, old_name, verbosity=0)
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, elapsed, **extra):
+    """latencies in seconds -> dict of ops/sec and percentiles in milliseconds."""
+    result = {
+        'operations': len(latencies),
+        'ops_per_sec': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3) if latencies else 0.0,
+    }
+    result.update(extra)
+    return result
+
+
+class Timer:
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.started
+
+
+def environment():
+    import django
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def write_results(name, payload, output=None):
+    """
+    Write {'benchmark', 'environment', 'timestamp', **payload} as JSON. By
+    default the file lands in benchmarks/results/<name>-<timestamp>.json so
+    runs from different releases can be diffed.
+    """
+    document = {
+        'benchmark': name,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'environment': environment(),
+        **payload,
+    }
+    if output is None:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        output = RESULTS_DIR / f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    Path(output).write_text(json.dumps(document, indent=2, default=str))
+    return output
+
+
+def print_table(rows, columns):
+    widths = [max(len(str(column)), *(len(str(row.get(column, ''))) for row in rows)) for column in columns]
+    print('  '.join(str(column).ljust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print('  '.join(str(row.get(column, '')).ljust(width) for column, width in zip(columns, widths)))
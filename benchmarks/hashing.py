@@ -0,0 +1,74 @@
+"""
+Password hashing cost per profile (see PASSWORD_HASHER_PROFILES in
+settings): raw hash/verify operations and the login and registration flows,
+all on one thread, so ops/sec is per core.
+
+    python -m benchmarks.hashing --iterations 50
+    python -m benchmarks.hashing --profile default --profile scrypt
+"""
+import argparse
+import time
+
+from benchmarks.harness import print_table, setup_django, summarize, write_results
+
+COLUMNS = ['profile', 'hasher', 'operation', 'ops_per_sec', 'p50_ms', 'p99_ms']
+
+
+def time_calls(func, iterations):
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - started)
+    return latencies, sum(latencies)
+
+
+def run_profile(profile, iterations):
+    from django.conf import settings
+    from django.contrib.auth.hashers import check_password, get_hasher, make_password
+    from django.test import override_settings
+
+    from benchmarks.fixtures import BENCH_PASSWORD, seed
+    from benchmarks.flows import run_flow
+
+    preferred = settings.PASSWORD_HASHER_PROFILES[profile]
+    hashers = [preferred] + [h for h in settings.PASSWORD_HASHERS if h != preferred]
+    rows = []
+    with override_settings(PASSWORD_HASHERS=hashers):
+        algorithm = get_hasher().algorithm
+        encoded = make_password(BENCH_PASSWORD)
+        for operation, func in [
+            ('hash', lambda: make_password(BENCH_PASSWORD)),
+            ('verify', lambda: check_password(BENCH_PASSWORD, encoded)),
+        ]:
+            latencies, elapsed = time_calls(func, iterations)
+            rows.append(summarize(latencies, elapsed, profile=profile, hasher=algorithm, operation=operation))
+
+        # seeded with this profile's hasher, so logins do not rehash
+        users = seed(users=4, transactions_per_user=1, prefix=f'hash-{profile}-')
+        for flow in ('login', 'register'):
+            result = run_flow(flow, users, iterations)
+            rows.append(dict(result, profile=profile, hasher=algorithm, operation=flow))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=30, help='operations per measurement')
+    parser.add_argument('--profile', action='append', help='only these profiles')
+    parser.add_argument('--output', help='JSON result path (default benchmarks/results/)')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.conf import settings
+
+    profiles = args.profile or list(settings.PASSWORD_HASHER_PROFILES)
+    rows = [row for profile in profiles for row in run_profile(profile, args.iterations)]
+    print_table(rows, COLUMNS)
+
+    path = write_results('hashing', {'config': {'iterations': args.iterations}, 'results': rows}, args.output)
+    print(f'\nresults written to {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Bulk onboarding throughput (accounts.provisioning.provision_accounts) per
+password hasher profile and number of hashing threads.
+
+    python -m benchmarks.provisioning --customers 2000
+    python -m benchmarks.provisioning --profile default --workers 1 --workers 4
+
+The slow profiles are measured on --slow-customers customers only, their
+customers/s is what matters. Measured on one core, 1 worker:
+
+    profile  hasher         customers/s
+    default  pbkdf2_sha256  2.0     (100k customers take about 14 hours)
+    scrypt   scrypt         3.4
+    fast     md5            3,245   (100k customers in about 30 seconds)
+
+The hashers release the GIL, so the slow profiles scale with the threads up
+to the number of cores; a cheap PROVISIONING_HASHER_PROFILE is what makes
+100k customers a matter of minutes, their first login then rehashes with
+PASSWORD_HASHER_PROFILE.
+"""
+import argparse
+import os
+
+from benchmarks.harness import print_table, setup_django, write_results
+
+COLUMNS = ['profile', 'hasher', 'workers', 'customers', 'elapsed_s', 'customers_per_sec']
+
+
+def customer_rows(count, prefix):
+    for n in range(count):
+        yield n + 1, {
+            'username': f'{prefix}{n}', 'email': f'{prefix}{n}@example.com', 'password': 'Bench-pass-123',
+            'account_type': 'Savings', 'gender': 'Female', 'birth_date': '1990-01-01',
+            'street_address': f'{n} Mirpur Road', 'city': 'Dhaka', 'postal_code': '1216', 'country': 'Bangladesh',
+        }
+
+
+def run(profile, workers, customers, chunk_size):
+    from accounts.provisioning import provision_accounts, provisioning_hasher
+
+    result = provision_accounts(
+        customer_rows(customers, f'prov-{profile}-{workers}-'),
+        chunk_size=chunk_size, hasher_profile=profile, workers=workers,
+    )
+    return {
+        'profile': profile,
+        'hasher': provisioning_hasher(profile).algorithm,
+        'workers': workers,
+        'customers': result.created,
+        'elapsed_s': round(result.elapsed, 3),
+        'customers_per_sec': round(result.throughput, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--customers', type=int, default=2000, help='customers per run with the fast profile')
+    parser.add_argument('--slow-customers', type=int, default=20, help='customers per run with the other profiles')
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--profile', action='append', help='only these profiles')
+    parser.add_argument('--workers', type=int, action='append', help='hashing threads (default 1 and every core)')
+    parser.add_argument('--output', help='JSON result path (default benchmarks/results/)')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.conf import settings
+
+    profiles = args.profile or list(settings.PASSWORD_HASHER_PROFILES)
+    worker_counts = args.workers or sorted({1, os.cpu_count() or 1})
+    rows = [
+        run(profile, workers, args.customers if profile == 'fast' else args.slow_customers, args.chunk_size)
+        for profile in profiles
+        for workers in worker_counts
+    ]
+    print_table(rows, COLUMNS)
+
+    config = {'customers': args.customers, 'slow_customers': args.slow_customers, 'chunk_size': args.chunk_size}
+    path = write_results('provisioning', {'config': config, 'results': rows}, args.output)
+    print(f'\nresults written to {path}')
+
+
+if __name__ == '__main__':
+    main()
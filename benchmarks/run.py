@@ -0,0 +1,77 @@
+"""
+Benchmark the core banking flows against a freshly seeded test database.
+
+    python -m benchmarks.run --users 500 --transactions 200 --iterations 300
+    python -m benchmarks.run --flow deposit --flow report --baseline old.json
+
+Reports ops/sec, p50/p95/p99 latency and SQL queries per request for each
+flow and writes them as JSON to benchmarks/results/ (or --output). With
+--baseline the run is compared flow by flow with an earlier result file.
+"""
+import argparse
+import json
+import sys
+
+from benchmarks.harness import Timer, print_table, setup_django, write_results
+
+COLUMNS = ['flow', 'ops_per_sec', 'p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request']
+
+
+def compare(rows, baseline_path, tolerance):
+    """Print the change against a baseline file; return the flows that regressed."""
+    with open(baseline_path) as f:
+        baseline = {row['flow']: row for row in json.load(f)['results']}
+    regressed = []
+    print(f'\nagainst {baseline_path}:')
+    for row in rows:
+        old = baseline.get(row['flow'])
+        if old is None:
+            continue
+        p99 = (row['p99_ms'] - old['p99_ms']) / old['p99_ms'] if old['p99_ms'] else 0
+        queries = row['queries_per_request'] - old['queries_per_request']
+        print(f"  {row['flow']:<14} p99 {p99:+.1%}  queries/request {queries:+.2f}")
+        if p99 > tolerance or queries > 0:
+            regressed.append(row['flow'])
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--transactions', type=int, default=100, help='history rows per seeded account')
+    parser.add_argument('--days', type=int, default=30, help='days the history is spread over')
+    parser.add_argument('--iterations', type=int, default=200, help='requests per flow')
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='client threads per flow (sqlite serializes writes, so keep low there)')
+    parser.add_argument('--flow', action='append', help='only run these flows')
+    parser.add_argument('--output', help='JSON result path (default benchmarks/results/)')
+    parser.add_argument('--baseline', help='earlier result file to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed p99 slowdown against the baseline')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from benchmarks.fixtures import seed
+    from benchmarks.flows import FLOWS, run_flow
+
+    names = args.flow or list(FLOWS)
+    unknown = set(names) - set(FLOWS)
+    if unknown:
+        parser.error(f"unknown flow(s): {', '.join(sorted(unknown))}")
+
+    with Timer() as timer:
+        users = seed(args.users, args.transactions, args.days)
+    print(f'seeded {args.users} users x {args.transactions} transactions in {timer.elapsed:.2f}s\n')
+
+    rows = [run_flow(name, users, args.iterations, args.concurrency) for name in names]
+    print_table(rows, COLUMNS)
+
+    config = {key: getattr(args, key) for key in ('users', 'transactions', 'days', 'iterations', 'concurrency')}
+    path = write_results('flows', {'config': config, 'seed_seconds': round(timer.elapsed, 3), 'results': rows}, args.output)
+    print(f'\nresults written to {path}')
+
+    if args.baseline and compare(rows, args.baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+SQL queries per authenticated request under each session profile
+(SESSION_PROFILE: db, cached_db, cache, signed_cookies).
+
+    python -m benchmarks.session_queries --iterations 200
+
+Each profile runs in its own process because the session engine is read
+when the settings are imported. The login flow logs in from scratch every
+time, the others reuse one logged in session.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.harness import print_table, setup_django, write_results
+
+FLOWS = ['login', 'report', 'deposit', 'withdraw']
+
+PROFILES = ['db', 'cached_db', 'cache', 'signed_cookies']
+
+
+def run_profile(name, args):
+    setup_django()
+    from benchmarks.fixtures import seed
+    from benchmarks.flows import run_flow
+
+    users = seed(args.users, args.transactions)
+    rows = []
+    for flow in FLOWS:
+        row = run_flow(flow, users, args.iterations)
+        row['profile'] = name
+        rows.append(row)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200, help='requests per flow')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--transactions', type=int, default=20, help='history rows per seeded account')
+    parser.add_argument('--profile', choices=PROFILES, action='append', help='run only these profiles')
+    parser.add_argument('--output', help='JSON result path (default benchmarks/results/)')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_profile(args.profile[0], args)))
+        return
+
+    rows = []
+    for name in args.profile or PROFILES:
+        # the fast hasher, so the login numbers are about the session and not PBKDF2
+        env = dict(os.environ, SESSION_PROFILE=name, PASSWORD_HASHER_PROFILE='fast')
+        command = [
+            sys.executable, '-m', 'benchmarks.session_queries', '--child', '--profile', name,
+            '--iterations', str(args.iterations), '--users', str(args.users),
+            '--transactions', str(args.transactions),
+        ]
+        output = subprocess.run(command, env=env, check=True, stdout=subprocess.PIPE, text=True).stdout
+        rows.extend(json.loads(output.splitlines()[-1]))
+
+    print_table(rows, ['profile', 'flow', 'queries_per_request', 'max_queries', 'p50_ms', 'p99_ms'])
+    config = {'iterations': args.iterations, 'users': args.users, 'transactions': args.transactions}
+    path = write_results('session_queries', {'config': config, 'results': rows}, args.output)
+    print(f'\nresults written to {path}')
+
+
+if __name__ == '__main__':
+    main()
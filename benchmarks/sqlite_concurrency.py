@@ -0,0 +1,78 @@
+"""
+Concurrent deposits and withdrawals against sqlite with the stock settings
+and with the tuned profile (DB_SQLITE_PROFILE=tuned: WAL, busy timeout,
+BEGIN IMMEDIATE and the in-process write queue).
+
+    python -m benchmarks.sqlite_concurrency --iterations 400 --concurrency 16
+
+Each profile runs in its own process because the database OPTIONS are read
+when the settings are imported. 'errors' counts requests that failed with
+an OperationalError ("database is locked") instead of completing.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.harness import print_table, setup_django, write_results
+
+FLOWS = ['deposit', 'withdraw']
+
+PROFILES = {
+    # name: extra environment
+    'default': {'DB_SQLITE_PROFILE': '', 'SERIALIZE_MONEY_WRITES': ''},
+    'tuned-no-queue': {'DB_SQLITE_PROFILE': 'tuned', 'SERIALIZE_MONEY_WRITES': ''},
+    'tuned': {'DB_SQLITE_PROFILE': 'tuned', 'SERIALIZE_MONEY_WRITES': '1'},
+}
+
+
+def run_profile(name, args):
+    setup_django()
+    from benchmarks.fixtures import seed
+    from benchmarks.flows import run_flow
+
+    users = seed(args.users, args.transactions)
+    rows = []
+    for flow in FLOWS:
+        row = run_flow(flow, users, args.iterations, concurrency=args.concurrency)
+        row['profile'] = name
+        rows.append(row)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=400, help='requests per flow')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--users', type=int, default=64)
+    parser.add_argument('--transactions', type=int, default=20, help='history rows per seeded account')
+    parser.add_argument('--profile', choices=PROFILES, action='append', help='run only these profiles')
+    parser.add_argument('--output', help='JSON result path (default benchmarks/results/)')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_profile(args.profile[0], args)))
+        return
+
+    rows = []
+    for name in args.profile or PROFILES:
+        env = dict(os.environ, DB_ENGINE='sqlite', **PROFILES[name])
+        command = [
+            sys.executable, '-m', 'benchmarks.sqlite_concurrency', '--child', '--profile', name,
+            '--iterations', str(args.iterations), '--concurrency', str(args.concurrency),
+            '--users', str(args.users), '--transactions', str(args.transactions),
+        ]
+        output = subprocess.run(command, env=env, check=True, stdout=subprocess.PIPE, text=True).stdout
+        rows.extend(json.loads(output.splitlines()[-1]))
+
+    print_table(rows, ['profile', 'flow', 'ops_per_sec', 'p50_ms', 'p99_ms', 'errors'])
+    config = {'iterations': args.iterations, 'concurrency': args.concurrency,
+              'users': args.users, 'transactions': args.transactions}
+    path = write_results('sqlite_concurrency', {'config': config, 'results': rows}, args.output)
+    print(f'\nresults written to {path}')
+
+
+if __name__ == '__main__':
+    main()
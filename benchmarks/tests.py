@@ -0,0 +1,26 @@
+from django.db.models import Sum
+from django.test import TestCase
+
+from transactions.models import DailyBalance, Transaction
+from .fixtures import seed
+from .flows import FLOWS, run_flow
+
+
+class BenchmarkSmokeTests(TestCase):
+    def test_seeded_history_matches_balances(self):
+        users = seed(users=3, transactions_per_user=20, days=5)
+        for user in users:
+            last = Transaction.objects.filter(account=user.account).first()
+            self.assertEqual(user.account.balance, last.balance_after_transaction)
+            self.assertEqual(
+                DailyBalance.objects.filter(account=user.account).first().closing_balance,
+                user.account.balance,
+            )
+        self.assertEqual(Transaction.objects.count(), 60)
+
+    def test_every_flow_runs(self):
+        users = seed(users=2, transactions_per_user=5)
+        for name in FLOWS:
+            result = run_flow(name, users, iterations=2)
+            self.assertEqual(result['operations'], 2)
+            self.assertGreater(result['queries_per_request'], 0)
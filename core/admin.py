@@ -1,3 +1,45 @@
+from django.conf import settings
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max
+from django.utils.functional import cached_property
 
-# Register your models here.
+
+def estimated_rows(queryset):
+    """Cheap row count of the queryset's whole table, from the planner stats or the highest id."""
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                           [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        # -1 until the table is first analyzed
+        if row and row[0] >= 0:
+            return row[0]
+    # one index seek; tables the admin pages through are append-mostly
+    return queryset.model._base_manager.using(queryset.db).aggregate(n=Max('pk'))['n'] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    COUNT(*) over millions of rows costs more than the page itself. Past
+    ADMIN_EXACT_COUNT_LIMIT rows an unfiltered changelist shows an estimate
+    and a filtered one counts at most that many rows.
+    """
+
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN_EXACT_COUNT_LIMIT
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_rows(queryset)
+            if estimate > limit:
+                return estimate
+        return queryset.order_by()[:limit].count()
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # skip the second, unfiltered COUNT(*) behind the "N total" link
+    show_full_result_count = False
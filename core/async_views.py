@@ -0,0 +1,30 @@
+from django.contrib.auth.views import redirect_to_login
+from django.shortcuts import render
+from django.views import View
+
+from accounts.summary import aget_account_summary
+
+
+class AsyncPageView(View):
+    """
+    Base for the async read-only pages. Everything base.html touches lazily
+    (request.user, the navbar account summary, the session behind the
+    messages) is loaded up front with async calls, so rendering never falls
+    back to a sync DB query inside the event loop.
+    """
+    login_required = False
+
+    async def dispatch(self, request, *args, **kwargs):
+        # auser() also loads the session, which the messages storage reads later
+        request.user = await request.auser()
+        if self.login_required and not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        request._account_summary = await aget_account_summary(request.user)
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class AsyncHomeView(AsyncPageView):
+    template_name = 'index.html'
+
+    async def get(self, request):
+        return render(request, self.template_name)
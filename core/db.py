@@ -0,0 +1,3 @@
+# rows per bulk_create / bulk_update / pk__in batch, keeps every statement
+# under sqlite's bound parameter limit
+BULK_BATCH_SIZE = 300
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.sessions import purge_expired_sessions
+
+
+class Command(BaseCommand):
+    help = 'Delete expired sessions in batches (a clearsessions that does not lock the table for long)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0, help='seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        purged = purge_expired_sessions(
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            on_batch=lambda purged: self.stdout.write(f'Purged {purged} sessions so far'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Purged {purged} expired sessions ({settings.SESSION_PROFILE} sessions)'
+        ))
@@ -0,0 +1,123 @@
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from django.template.backends.django import Template
+
+logger = logging.getLogger('mamar_bank.requests')
+
+# metrics of the request being served; contextvars follow sync_to_async, so
+# queries that async views run in the ORM worker thread are counted too
+_current = ContextVar('request_metrics', default=None)
+
+_lock = threading.Lock()
+_totals = {}
+
+
+@dataclass
+class RequestMetrics:
+    queries: int = 0
+    db_time: float = 0.0
+    template_time: float = 0.0
+    total_time: float = 0.0
+
+    def as_log(self):
+        return (
+            f'queries={self.queries} db_ms={self.db_time * 1000:.1f} '
+            f'template_ms={self.template_time * 1000:.1f} total_ms={self.total_time * 1000:.1f}'
+        )
+
+    def server_timing(self):
+        return (
+            f'db;dur={self.db_time * 1000:.1f}, tpl;dur={self.template_time * 1000:.1f}, '
+            f'total;dur={self.total_time * 1000:.1f}'
+        )
+
+
+def start():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper added to every db connection, see CoreConfig.ready."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_time += time.perf_counter() - started
+        metrics.queries += 1
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+_template_render = Template.render
+
+
+def _timed_render(self, context=None, request=None):
+    metrics = _current.get()
+    if metrics is None:
+        return _template_render(self, context, request)
+    started = time.perf_counter()
+    try:
+        return _template_render(self, context, request)
+    finally:
+        # template time also holds the queries run by lazy context values,
+        # those are in db_time as well
+        metrics.template_time += time.perf_counter() - started
+
+
+def install_template_timer():
+    # render() / TemplateResponse / render_to_string all go through the
+    # backend Template.render once per top level template
+    Template.render = _timed_render
+
+
+def add(view_name, metrics):
+    with _lock:
+        totals = _totals.setdefault(view_name, {
+            'requests': 0, 'queries': 0, 'max_queries': 0,
+            'db_time': 0.0, 'template_time': 0.0, 'total_time': 0.0, 'max_total_time': 0.0,
+        })
+        totals['requests'] += 1
+        totals['queries'] += metrics.queries
+        totals['max_queries'] = max(totals['max_queries'], metrics.queries)
+        totals['db_time'] += metrics.db_time
+        totals['template_time'] += metrics.template_time
+        totals['total_time'] += metrics.total_time
+        totals['max_total_time'] = max(totals['max_total_time'], metrics.total_time)
+
+
+def snapshot():
+    """Per url name averages of everything recorded in this process."""
+    with _lock:
+        rows = {name: dict(totals) for name, totals in _totals.items()}
+    for name, totals in rows.items():
+        n = totals['requests']
+        rows[name] = {
+            'requests': n,
+            'avg_queries': round(totals['queries'] / n, 2),
+            'max_queries': totals['max_queries'],
+            'avg_db_ms': round(totals['db_time'] / n * 1000, 3),
+            'avg_template_ms': round(totals['template_time'] / n * 1000, 3),
+            'avg_total_ms': round(totals['total_time'] / n * 1000, 3),
+            'max_total_ms': round(totals['max_total_time'] * 1000, 3),
+        }
+    return rows
+
+
+def reset():
+    with _lock:
+        _totals.clear()
@@ -0,0 +1,145 @@
+import math
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from django.http import HttpResponse
+
+from . import metrics, ratelimit, routers
+
+
+class RequestMetricsMiddleware:
+    """
+    Count the SQL queries, db time, template render time and total latency
+    of every request. The numbers are attached to the request as
+    request.metrics, logged on the 'mamar_bank.requests' logger, added as a
+    Server-Timing header and aggregated per url name for the metrics page.
+    Streaming bodies are sent after the middleware returns, so their time is
+    not part of total_ms.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.metrics, token = metrics.start()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.stop(token)
+        return self.finish(request, response, started)
+
+    async def __acall__(self, request):
+        request.metrics, token = metrics.start()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.stop(token)
+        return self.finish(request, response, started)
+
+    def finish(self, request, response, started):
+        request_metrics = request.metrics
+        request_metrics.total_time = time.perf_counter() - started
+        match = request.resolver_match
+        view_name = (match.view_name if match else None) or 'unresolved'
+
+        metrics.add(view_name, request_metrics)
+        metrics.logger.info(
+            'view=%s status=%s %s', view_name, response.status_code, request_metrics.as_log()
+        )
+        budget = settings.QUERY_BUDGETS.get(view_name)
+        if budget is not None and request_metrics.queries > budget:
+            metrics.logger.warning(
+                'view=%s ran %s queries, budget is %s', view_name, request_metrics.queries, budget
+            )
+        if getattr(settings, 'REQUEST_METRICS_SERVER_TIMING', True):
+            response['Server-Timing'] = request_metrics.server_timing()
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Give core.routers the current request, and pin the client to the
+    primary for REPLICA_PIN_SECONDS after a request that wrote or was not a
+    safe method, so its next reads see its own writes. Must wrap the
+    session middleware, whose save is a write too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state, token = routers.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.stop(token)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        state, token = routers.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            routers.stop(token)
+        return self.finish(request, response, state)
+
+    def finish(self, request, response, state):
+        if state.wrote or request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            response.set_cookie(
+                routers.PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+
+class RateLimitMiddleware:
+    """
+    Turn away POSTs over their view's RATE_LIMITS with a 429 and a
+    Retry-After header. The check runs in process_view, after url resolution
+    and authentication but before the view, so a throttled login never
+    reaches the form or the password hasher. Must come after
+    AuthenticationMiddleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method in ('GET', 'HEAD', 'OPTIONS'):
+            return None
+        view_name = request.resolver_match.view_name
+        wait = ratelimit.check(request, view_name)
+        if not wait:
+            return None
+        metrics.logger.warning('view=%s rate limited for %.1fs', view_name, wait)
+        response = HttpResponse('Too many requests, please try again later.', status=429, content_type='text/plain')
+        response['Retry-After'] = str(math.ceil(wait))
+        return response
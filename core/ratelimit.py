@@ -0,0 +1,132 @@
+"""
+Token bucket rate limits per url name (settings.RATE_LIMITS), keyed by
+client IP, submitted username, user or bank account. A bucket holds `rate`
+tokens and refills at rate/per tokens a second; a request takes one token
+from every bucket of its view or is turned away with a 429.
+
+A bucket is stored as its theoretical arrival time (GCRA): the moment it
+will be full again. That is one float per bucket, so a check is one
+get_many and one set_many on the RATE_LIMIT_CACHE. The read and the write
+are not atomic, concurrent requests of one bucket may slip one extra token
+each, which is fine for throttling. When the shared cache is down the
+buckets live in a per-process LocMemCache until it is back.
+"""
+import hashlib
+import logging
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+logger = logging.getLogger('mamar_bank.requests')
+
+KEYS = ['ip', 'username', 'user', 'account']
+
+# per-process buckets while the shared cache is unreachable
+fallback = LocMemCache('rate-limit-fallback', {'TIMEOUT': None, 'OPTIONS': {'MAX_ENTRIES': 10000}})
+
+
+@dataclass(frozen=True)
+class Limit:
+    key: str
+    rate: int
+    per: int
+
+    @property
+    def interval(self):
+        # seconds one token takes to come back
+        return self.per / self.rate
+
+
+def get_limits(view_name):
+    return [Limit(key=limit['key'], rate=limit['rate'], per=limit['per']) for limit in settings.RATE_LIMITS.get(view_name, ())]
+
+
+def client_ip(request):
+    # behind a proxy set RATE_LIMIT_IP_HEADER to the header it fills in, e.g. HTTP_X_REAL_IP
+    header = settings.RATE_LIMIT_IP_HEADER
+    return (header and request.META.get(header)) or request.META.get('REMOTE_ADDR', '')
+
+
+def key_value(request, key):
+    """The value request is counted under for key, or None when it has none (e.g. anonymous)."""
+    if key == 'ip':
+        return client_ip(request)
+    if key == 'username':
+        username = request.POST.get('username', '').strip().lower()
+        return username or None
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return None
+    if key == 'user':
+        return str(user.pk)
+    if key == 'account':
+        # local import: accounts.summary pulls in the models
+        from accounts.summary import request_account_summary
+
+        summary = request_account_summary(request)
+        return str(summary.account_fields['id']) if summary else None
+    raise ValueError(f'Unknown rate limit key {key!r}')
+
+
+def bucket_key(view_name, key, value):
+    # usernames are client input: hashed so the cache key is short and safe for any backend
+    digest = hashlib.blake2b(value.encode(), digest_size=8).hexdigest()
+    return f'rl:{view_name}:{key}:{digest}'
+
+
+def _cache():
+    if settings.RATE_LIMIT_CACHE is None:
+        return fallback
+    return caches[settings.RATE_LIMIT_CACHE]
+
+
+def take(buckets, now=None):
+    """
+    Take a token from every (cache_key, Limit) bucket. Returns 0 if the
+    request may go on, else the seconds until it would be let through; a
+    refused request takes no token from any bucket.
+    """
+    if not buckets:
+        return 0
+    now = time.time() if now is None else now
+    cache = _cache()
+    keys = [cache_key for cache_key, _ in buckets]
+    try:
+        arrivals = cache.get_many(keys)
+    except Exception:
+        logger.warning('rate limit cache unavailable, using the local buckets', exc_info=True)
+        cache = fallback
+        arrivals = cache.get_many(keys)
+
+    updates = {}
+    wait = 0
+    for cache_key, limit in buckets:
+        arrival = max(arrivals.get(cache_key, now), now) + limit.interval
+        # the bucket is empty once its arrival time is a whole bucket ahead of now
+        over = arrival - now - limit.per
+        if over > 0:
+            wait = max(wait, over)
+        updates[cache_key] = arrival
+    if wait:
+        return wait
+
+    timeout = max(limit.per for _, limit in buckets)
+    try:
+        cache.set_many(updates, timeout)
+    except Exception:
+        logger.warning('rate limit cache unavailable, using the local buckets', exc_info=True)
+        fallback.set_many(updates, timeout)
+    return 0
+
+
+def check(request, view_name):
+    """Seconds the request has to wait under view_name's RATE_LIMITS, 0 when it may go on."""
+    buckets = []
+    for limit in get_limits(view_name):
+        value = key_value(request, limit.key)
+        if value is not None:
+            buckets.append((bucket_key(view_name, limit.key, value), limit))
+    return take(buckets)
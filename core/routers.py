@@ -0,0 +1,66 @@
+import random
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from django.conf import settings
+
+PRIMARY = 'default'
+PIN_COOKIE = 'db_primary'
+
+# routing state of the request being served, set by ReplicaRoutingMiddleware
+_state = ContextVar('db_routing', default=None)
+
+
+@dataclass
+class RoutingState:
+    request: object
+    pinned: bool = False
+    wrote: bool = False
+
+
+def start(request):
+    state = RoutingState(request=request, pinned=PIN_COOKIE in request.COOKIES)
+    return state, _state.set(state)
+
+
+def stop(token):
+    _state.reset(token)
+
+
+def is_replica_view(view_name):
+    if view_name in settings.REPLICA_READ_VIEWS:
+        return True
+    return view_name.startswith('admin:') and view_name.endswith('_changelist')
+
+
+class PrimaryReplicaRouter:
+    """
+    Reads of the read-only pages (REPLICA_READ_VIEWS) go to a replica, all
+    the rest to the primary. A request that has written, or a client that
+    wrote in the last REPLICA_PIN_SECONDS, reads from the primary so it
+    always sees its own postings. Outside a request (commands, services)
+    everything stays on the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        replicas = settings.DATABASE_REPLICAS
+        if state is None or state.pinned or state.wrote or not replicas:
+            return None
+        match = state.request.resolver_match
+        if match and is_replica_view(match.view_name):
+            return random.choice(replicas)
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
@@ -0,0 +1,37 @@
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore as DatabaseSessionStore
+from django.utils import timezone
+
+
+def session_store():
+    return import_module(settings.SESSION_ENGINE).SessionStore
+
+
+def purge_expired_sessions(batch_size=1000, pause=0, on_batch=None):
+    """
+    Delete the expired rows of the session table batch_size at a time, each
+    batch its own short transaction so logins are not held up behind one big
+    DELETE. Engines without a table (cache, signed_cookies) expire sessions
+    by themselves and purge nothing. on_batch(purged) is called after every
+    batch. Returns the number of deleted sessions.
+    """
+    store = session_store()
+    if not issubclass(store, DatabaseSessionStore):
+        store.clear_expired()
+        return 0
+
+    sessions = store.get_model_class().objects
+    now = timezone.now()
+    purged = 0
+    while True:
+        batch = list(sessions.filter(expire_date__lt=now).values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return purged
+        purged += sessions.filter(pk__in=batch).delete()[0]
+        if on_batch:
+            on_batch(purged)
+        if pause:
+            time.sleep(pause)
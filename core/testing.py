@@ -0,0 +1,18 @@
+from django.conf import settings
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin: assertWithinQueryBudget(response) fails when the request
+    behind a test client response ran more queries than QUERY_BUDGETS allows
+    for its url name (or than an explicit budget).
+    """
+
+    def assertWithinQueryBudget(self, response, budget=None):
+        request = getattr(response, 'wsgi_request', None) or response.asgi_request
+        view_name = request.resolver_match.view_name
+        if budget is None:
+            budget = settings.QUERY_BUDGETS[view_name]
+        queries = request.metrics.queries
+        if queries > budget:
+            self.fail(f'{view_name} ran {queries} queries, its budget is {budget}')
@@ -1,3 +1,291 @@
-from django.test import TestCase
+import io
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+from django.utils import timezone
+
+from accounts.async_views import AsyncUserProfileView
+from accounts.models import UserBankAccount
+from mamar_bank.urls import urlpatterns as project_urlpatterns
+from transactions.async_views import AsyncLoanListView, AsyncStatementExportView, AsyncTransactionReportView
+from transactions.constants import DEPOSIT, WITHDRAWAL, LOAN
+from transactions.models import Transaction
+from transactions.services import approve_loan, post_transaction, request_loan
+from . import metrics, ratelimit
+from .routers import PIN_COOKIE
+from .async_views import AsyncHomeView
+from .testing import QueryBudgetMixin
+
+# same routes and names as the project, with the async views matched first
+urlpatterns = [
+    path('', AsyncHomeView.as_view(), name='home'),
+    path('accounts/profile/', AsyncUserProfileView.as_view(), name='profile'),
+    path('transactions/report/', AsyncTransactionReportView.as_view(), name='transaction_report'),
+    path('transactions/statement/', AsyncStatementExportView.as_view(), name='transaction_statement'),
+    path('transactions/loans/', AsyncLoanListView.as_view(), name='loan_list'),
+] + project_urlpatterns
+
+
+@override_settings(ROOT_URLCONF='core.tests')
+class AsyncReadViewTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        caches['account_summary'].clear()
+        self.user = User.objects.create_user(username='nadia', password='pass12345', first_name='Nadia')
+        self.account = UserBankAccount.objects.create(
+            user=self.user, account_type='Savings', gender='Female', account_no=400001
+        )
+        for amount in (1000, 2000):
+            post_transaction(Transaction(account=self.account, amount=Decimal(amount), transaction_type=DEPOSIT))
+        request_loan(self.account, Decimal(500))
+
+    async def test_report_and_loans(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get('/transactions/report/')
+        self.assertEqual(response.status_code, 200)
+        # queries run in the ORM worker thread are counted as well
+        self.assertGreater(response.asgi_request.metrics.queries, 0)
+        self.assertWithinQueryBudget(response)
+        self.assertEqual([t.amount for t in response.context['object_list']], [Decimal(2000), Decimal(1000)])
+        self.assertContains(response, 'balance : 3000')
+
+        response = await self.async_client.get('/transactions/loans/')
+        self.assertEqual([loan.principal for loan in response.context['loans']], [Decimal(500)])
+
+        response = await self.async_client.get('/accounts/profile/')
+        self.assertEqual(response.context['user_account'].account_no, 400001)
+
+    async def test_statement_streams_asynchronously(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get('/transactions/statement/', {'format': 'jsonl'})
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(len(body.splitlines()), 2)
+
+    async def test_login_required(self):
+        response = await self.async_client.get('/transactions/report/')
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response['Location'].startswith('/accounts/login/'))
+
+    async def test_home_for_anonymous_user(self):
+        response = await self.async_client.get('/')
+        self.assertEqual(response.status_code, 200)
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        caches['account_summary'].clear()
+        metrics.reset()
+        self.user = User.objects.create_user(username='karim', password='pass12345')
+        self.account = UserBankAccount.objects.create(
+            user=self.user, account_type='Savings', gender='Male', account_no=400002
+        )
+        # enough history and loans that a per-row query would blow the budget
+        for _ in range(60):
+            post_transaction(Transaction(account=self.account, amount=Decimal(1000), transaction_type=DEPOSIT))
+        self.loans = [approve_loan(request_loan(self.account, Decimal(500))) for _ in range(2)]
+        self.client.force_login(self.user)
+
+    def test_read_views(self):
+        for url in ['/', '/accounts/profile/', '/transactions/report/', '/transactions/loans/',
+                    '/transactions/report/?start_date=2020-01-01&end_date=2099-01-01']:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertWithinQueryBudget(response)
+            self.assertIn('db;dur=', response['Server-Timing'])
+
+        response = self.client.get('/transactions/statement/')
+        b''.join(response.streaming_content)
+        self.assertWithinQueryBudget(response)
+
+    def test_posting_views(self):
+        for url, data in [
+            ('/transactions/deposit/', {'amount': 1000, 'transaction_type': DEPOSIT}),
+            ('/transactions/withdraw/', {'amount': 500, 'transaction_type': WITHDRAWAL}),
+            ('/transactions/loan_request/', {'amount': 500, 'transaction_type': LOAN}),
+            (f'/transactions/loans/{self.loans[0].pk}/', {}),
+        ]:
+            # the forms always send an idempotency key
+            response = self.client.post(url, data, headers={'Idempotency-Key': url})
+            self.assertEqual(response.status_code, 302)
+            self.assertWithinQueryBudget(response)
+
+    def test_metrics_page_is_staff_only(self):
+        self.client.get('/transactions/report/')
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        views = self.client.get('/metrics/').json()['views']
+        self.assertEqual(views['transaction_report']['requests'], 1)
+        self.assertLessEqual(views['transaction_report']['max_queries'], 8)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'])
+class ReplicaRoutingTests(TransactionTestCase):
+    # replica_1 is the sqlite stand-in, a test mirror of default; committed
+    # data is needed for a second connection to see it
+    databases = {'default', 'replica_1'}
+
+    def setUp(self):
+        caches['account_summary'].clear()
+        self.user = User.objects.create_user(username='mitu', password='pass12345')
+        self.account = UserBankAccount.objects.create(
+            user=self.user, account_type='Savings', gender='Female', account_no=400003
+        )
+        post_transaction(Transaction(account=self.account, amount=Decimal(1000), transaction_type=DEPOSIT))
+        self.client.force_login(self.user)
+        self.client.cookies.pop(PIN_COOKIE, None)
+
+    def get(self, url):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica_1']) as replica:
+            response = self.client.get(url)
+        return response, len(primary), len(replica)
+
+    def test_read_only_pages_use_the_replica(self):
+        response, primary, replica = self.get('/transactions/report/')
+        self.assertContains(response, 'balance : 1000')
+        self.assertGreater(replica, 0)
+        # only the summary cache fill goes to the primary
+        self.assertEqual(primary, 3)
+
+        _, primary, replica = self.get('/transactions/deposit/')
+        self.assertEqual(replica, 0)
+
+    def test_reads_stick_to_the_primary_after_a_write(self):
+        response = self.client.post('/transactions/deposit/', {'amount': 500, 'transaction_type': DEPOSIT})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        response, primary, replica = self.get('/transactions/report/')
+        self.assertEqual(replica, 0)
+        self.assertContains(response, 'balance : 1500')
+
+
+@override_settings(RATE_LIMITS={
+    'login': [{'key': 'ip', 'rate': 4, 'per': 60}, {'key': 'username', 'rate': 2, 'per': 60}],
+    'deposit_money': [{'key': 'account', 'rate': 2, 'per': 60}],
+})
+class RateLimitTests(TestCase):
+    def setUp(self):
+        caches['account_summary'].clear()
+        caches['rate_limit'].clear()
+        ratelimit.fallback.clear()
+        self.user = User.objects.create_user(username='karim', password='pass12345')
+        self.account = UserBankAccount.objects.create(
+            user=self.user, account_type='Savings', gender='Male', account_no=400010
+        )
+
+    def login(self, username, ip='10.0.0.1'):
+        return self.client.post(
+            reverse('login'), {'username': username, 'password': 'wrong-pass'}, REMOTE_ADDR=ip
+        )
+
+    def test_login_throttled_before_the_hasher(self):
+        with mock.patch('django.contrib.auth.forms.authenticate', return_value=None) as authenticate:
+            self.assertEqual(self.login('karim').status_code, 200)
+            self.assertEqual(self.login('KARIM').status_code, 200)
+            response = self.login('karim')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(authenticate.call_count, 2)
+
+    def test_username_and_ip_buckets(self):
+        for ip in ('10.0.0.1', '10.0.0.2'):
+            self.login('karim', ip)
+        # same username from a third address, its bucket is empty
+        self.assertEqual(self.login('karim', '10.0.0.3').status_code, 429)
+        # other usernames from one address run into the ip bucket
+        for username in ('a', 'b', 'c'):
+            self.login(username)
+        self.assertEqual(self.login('d').status_code, 429)
+        self.assertEqual(self.login('d', '10.0.0.4').status_code, 200)
+
+    def test_postings_limited_per_account(self):
+        self.client.force_login(self.user)
+        for _ in range(2):
+            self.client.post(reverse('deposit_money'), {'amount': '500'})
+        response = self.client.post(reverse('deposit_money'), {'amount': '500'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(Transaction.objects.count(), 2)
+        # reads are not limited
+        self.assertEqual(self.client.get(reverse('deposit_money')).status_code, 200)
+
+    def test_bucket_refills(self):
+        limit = ratelimit.Limit(key='ip', rate=2, per=60)
+        buckets = [('rl:test', limit)]
+        self.assertEqual(ratelimit.take(buckets, now=1000), 0)
+        self.assertEqual(ratelimit.take(buckets, now=1000), 0)
+        self.assertEqual(ratelimit.take(buckets, now=1010), 20)
+        # one token back every 30 seconds
+        self.assertEqual(ratelimit.take(buckets, now=1030), 0)
+        self.assertEqual(ratelimit.take(buckets, now=1031), 29)
+
+    def test_local_fallback_when_the_cache_is_down(self):
+        with mock.patch.object(caches['rate_limit'], 'get_many', side_effect=ConnectionError), \
+                self.assertLogs('mamar_bank.requests', 'WARNING'):
+            for _ in range(2):
+                self.assertEqual(self.login('karim').status_code, 200)
+            self.assertEqual(self.login('karim').status_code, 429)
+
+    def test_check_is_cheap(self):
+        limits = [ratelimit.Limit(key='ip', rate=10 ** 6, per=1), ratelimit.Limit(key='username', rate=10 ** 6, per=1)]
+        buckets = [(f'rl:bench:{n}', limit) for n, limit in enumerate(limits)]
+        started = time.perf_counter()
+        for _ in range(1000):
+            ratelimit.take(buckets)
+        self.assertLess((time.perf_counter() - started) / 1000, 0.001)
+
+
+class SessionStorageTests(TestCase):
+    def setUp(self):
+        caches['account_summary'].clear()
+        self.user = User.objects.create_user(username='salma', password='pass12345')
+        self.account = UserBankAccount.objects.create(
+            user=self.user, account_type='Savings', gender='Female', account_no=400020
+        )
+
+    def test_purge_expired_sessions_in_batches(self):
+        for n in range(5):
+            session = SessionStore()
+            session['n'] = n
+            session.create()
+        live = SessionStore()
+        live.create()
+        Session.objects.exclude(pk=live.session_key).update(expire_date=timezone.now() - timedelta(days=1))
+        out = io.StringIO()
+        call_command('purge_sessions', '--batch-size', '2', stdout=out)
+        self.assertEqual(list(Session.objects.values_list('pk', flat=True)), [live.session_key])
+        self.assertIn('Purged 4 sessions so far', out.getvalue())
+        self.assertIn('Purged 5 expired sessions', out.getvalue())
+
+    def test_messages_do_not_touch_the_session(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('deposit_money'), {'amount': '500'})
+        self.assertIn('messages', response.cookies)
+        self.assertNotIn('_messages', Session.objects.get().get_decoded())
+        response = self.client.get(reverse('transaction_report'))
+        self.assertEqual([str(message) for message in response.context['messages']], [
+            'BDT 500.00 was deposited to your account successfully'
+        ])
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_signed_cookie_sessions(self):
+        response = self.client.post(reverse('login'), {'username': 'salma', 'password': 'pass12345'})
+        self.assertRedirects(response, reverse('home'))
+        self.assertFalse(Session.objects.exists())
+        # the session comes from the cookie, only the user row is read
+        with CaptureQueriesContext(connections['default']) as captured:
+            self.client.get(reverse('profile'))
+        self.assertFalse(any('django_session' in query['sql'] for query in captured))
@@ -1,6 +1,19 @@
+from django.contrib.auth.mixins import UserPassesTestMixin
+from django.http import JsonResponse
 from django.shortcuts import render
+from django.views import View
 from django.views.generic import TemplateView
+from . import metrics
 # Create your views here.
 
 class HomeView(TemplateView):
-    template_name = 'index.html'
\ No newline at end of file
+    template_name = 'index.html'
+
+
+class RequestMetricsView(UserPassesTestMixin, View):
+    # staff only: per view query counts and timings of this process
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request):
+        return JsonResponse({'views': metrics.snapshot()})
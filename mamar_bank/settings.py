@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
+from importlib.util import find_spec
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,11 +46,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.RateLimitMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -66,6 +71,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'accounts.context_processors.account_summary',
             ],
         },
     },
@@ -73,15 +79,239 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'mamar_bank.wsgi.application'
 
+# Serve the read-only pages (report, statement, loan list, profile, home)
+# with the async views. Only worth it behind an ASGI server.
+ASYNC_READ_VIEWS = os.environ.get('ASYNC_READ_VIEWS', '') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# Configured from the environment:
+#   DB_ENGINE            sqlite (default) or postgresql
+#   DB_NAME / DB_USER / DB_PASSWORD / DB_HOST / DB_PORT
+#   DB_CONN_MAX_AGE      seconds a connection is kept open between requests
+#   DB_POOL=1            psycopg connection pool (postgresql, Django 5.1+);
+#                        replaces persistent connections
+#   DB_POOL_MIN_SIZE / DB_POOL_MAX_SIZE
+#   DB_REPLICA_HOSTS     comma separated read replicas (postgresql)
+#   DB_SQLITE_REPLICAS   number of local stand-in replicas on the same file
+#   DB_SQLITE_PROFILE=tuned  WAL, synchronous=NORMAL, mmap, BEGIN IMMEDIATE
+#   DB_SQLITE_TIMEOUT    seconds a writer waits for the lock (tuned profile)
+# Replicas become replica_1, replica_2, ... and are used by
+# core.routers.PrimaryReplicaRouter for the read-only pages.
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DB_POOL = os.environ.get('DB_POOL', '') == '1'
+    _primary = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('DB_NAME', 'mamar_bank'),
+        'USER': os.environ.get('DB_USER', 'mamar_bank'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
+        # the pool keeps the connections, persistent ones can not be combined with it
+        'CONN_MAX_AGE': 0 if DB_POOL else int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'pool': {
+                'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+                'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            },
+        } if DB_POOL else {},
+    }
+    _replica_hosts = [host for host in os.environ.get('DB_REPLICA_HOSTS', '').split(',') if host]
+else:
+    _primary = {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': True,
     }
+    if os.environ.get('DB_SQLITE_PROFILE') == 'tuned':
+        # WAL lets readers run next to the writer, IMMEDIATE takes the write
+        # lock at BEGIN so two transactions can not deadlock upgrading their
+        # read locks, and the timeout makes writers wait instead of failing
+        # with "database is locked"
+        _primary['OPTIONS'] = {
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA mmap_size=268435456;'
+                'PRAGMA temp_store=MEMORY;'
+            ),
+            'timeout': int(os.environ.get('DB_SQLITE_TIMEOUT', 20)),
+            'transaction_mode': 'IMMEDIATE',
+        }
+    # stand-ins read the primary's file
+    _replica_hosts = [None] * int(os.environ.get('DB_SQLITE_REPLICAS', 0))
+
+DATABASES = {'default': _primary}
+for _n, _host in enumerate(_replica_hosts, start=1):
+    DATABASES[f'replica_{_n}'] = dict(
+        _primary,
+        OPTIONS=dict(_primary.get('OPTIONS', {})),
+        TEST={'MIRROR': 'default'},
+        **({'HOST': _host} if _host else {}),
+    )
+
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+
+# run money-moving writes one at a time per process (transactions.write_queue);
+# on by default with the tuned sqlite profile, where there is one writer anyway
+SERIALIZE_MONEY_WRITES = os.environ.get(
+    'SERIALIZE_MONEY_WRITES', '1' if os.environ.get('DB_SQLITE_PROFILE') == 'tuned' else ''
+) == '1'
+
+# aliases the router reads from
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+
+# read-only pages served from a replica, by url name (plus every admin changelist)
+REPLICA_READ_VIEWS = {'home', 'profile', 'transaction_report', 'transaction_statement', 'loan_list'}
+
+# after a write the client reads from the primary for this long
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 10))
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# account_summary holds balance/profile/recent transactions per account
+# (accounts/summary.py). LocMemCache is a bounded in-process LRU; point the
+# env vars at redis/memcached to share it between workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'account_summary': {
+        'BACKEND': os.environ.get('ACCOUNT_SUMMARY_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('ACCOUNT_SUMMARY_CACHE_LOCATION', 'account-summary'),
+        'TIMEOUT': int(os.environ.get('ACCOUNT_SUMMARY_CACHE_TIMEOUT', 300)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('ACCOUNT_SUMMARY_CACHE_MAX_ENTRIES', 10000)),
+        },
+    },
+    # rate limit buckets; point it at a shared cache (redis/memcached) so every worker sees the same buckets
+    'rate_limit': {
+        'BACKEND': os.environ.get('RATE_LIMIT_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('RATE_LIMIT_CACHE_LOCATION', 'rate-limit'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('RATE_LIMIT_CACHE_MAX_ENTRIES', 100000)),
+        },
+    },
+    # session store of the cache / cached_db session profiles; like rate_limit it
+    # has to be a shared cache once there is more than one worker process
+    'sessions': {
+        'BACKEND': os.environ.get('SESSION_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('SESSION_CACHE_LOCATION', 'sessions'),
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('SESSION_CACHE_MAX_ENTRIES', 100000)),
+        },
+    },
+}
+
+ACCOUNT_SUMMARY_CACHE = 'account_summary'
+ACCOUNT_SUMMARY_RECENT_TRANSACTIONS = 5
+
+# seconds a posting's idempotency key is remembered; purge_idempotency_keys deletes older ones
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
+# posting receipts: drain_outbox hands them to this sender (ConsoleSender or
+# FileSender locally, a real email/SMS gateway class in production)
+NOTIFICATION_SENDER = os.environ.get('NOTIFICATION_SENDER', 'transactions.outbox.ConsoleSender')
+NOTIFICATION_FILE = os.environ.get('NOTIFICATION_FILE', BASE_DIR / 'notifications.jsonl')
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_RETRY_BASE_SECONDS = 30
+OUTBOX_RETRY_MAX_SECONDS = 60 * 60
+
+# velocity rules checked on every customer deposit/withdrawal against the
+# per-account hourly counters; transaction_type 1 = deposit, 2 = withdrawal.
+# a rule has max_count (postings) and/or max_amount (BDT) per window_hours;
+# the hour the window starts in counts by the share of it inside the window
+VELOCITY_RULES = [
+    {'name': 'withdrawals_per_hour', 'transaction_type': 2, 'window_hours': 1, 'max_count': 5},
+    {'name': 'withdrawn_per_day', 'transaction_type': 2, 'window_hours': 24, 'max_amount': 50000},
+]
+
+# token bucket limits on POSTs, by url name (core.ratelimit): `rate` requests
+# per `per` seconds for every client ip / submitted username / user / account.
+# None as RATE_LIMIT_CACHE keeps the buckets in each process only
+RATE_LIMIT_CACHE = 'rate_limit'
+RATE_LIMIT_IP_HEADER = os.environ.get('RATE_LIMIT_IP_HEADER') or None
+_posting_limits = [
+    {'key': 'account', 'rate': 30, 'per': 60},
+    {'key': 'ip', 'rate': 120, 'per': 60},
+]
+RATE_LIMITS = {
+    'login': [
+        {'key': 'ip', 'rate': 20, 'per': 60},
+        {'key': 'username', 'rate': 5, 'per': 60},
+    ],
+    'register': [
+        {'key': 'ip', 'rate': 10, 'per': 60 * 60},
+    ],
+    'password_change': [
+        {'key': 'user', 'rate': 5, 'per': 60},
+    ],
+    'deposit_money': _posting_limits,
+    'withdraw_money': _posting_limits,
+    'loan_request': _posting_limits,
+    'pay': _posting_limits,
+}
+
+# archive_transactions moves postings older than this many days out of the
+# transactions table; reports and exports read them back for older date ranges
+TRANSACTION_ARCHIVE_DAYS = int(os.environ.get('TRANSACTION_ARCHIVE_DAYS', 2 * 365))
+
+# admin changelists count at most this many rows, bigger tables show an estimate
+ADMIN_EXACT_COUNT_LIMIT = int(os.environ.get('ADMIN_EXACT_COUNT_LIMIT', 10000))
+
+# yearly rate paid on the average daily balance of savings accounts
+SAVINGS_INTEREST_RATE = os.environ.get('SAVINGS_INTEREST_RATE', '0.04')
+
+
+# Request metrics: core.middleware counts queries and times every request.
+# Budgets are max queries per request by url name; going over logs a warning
+# and core.testing.QueryBudgetMixin fails the test.
+
+QUERY_BUDGETS = {
+    # worst case: cold account summary cache (3 queries) and, for postings,
+    # the first posting of the day creating its daily snapshot (3 more);
+    # keyed postings add the idempotency claim and its result (4), every
+    # posting its outbox event (1) and withdrawals the velocity check and
+    # counter, creating the hour's bucket on the first one (up to 5); history
+    # reads that run past the hot rows look up the archive cutoff and read the
+    # archive (2)
+    'home': 5,
+    'profile': 5,
+    'transaction_report': 10,
+    'transaction_statement': 7,
+    'loan_list': 6,
+    'deposit_money': 20,
+    'withdraw_money': 25,
+    'loan_request': 10,
+    'pay': 26,
+}
+
+REQUEST_METRICS_SERVER_TIMING = True
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # INFO logs one line per request, WARNING only budget overruns
+        'mamar_bank.requests': {
+            'handlers': ['console'],
+            'level': os.environ.get('REQUEST_METRICS_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
 }
 
 
@@ -104,6 +334,75 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing profile
+# The first hasher hashes new passwords, the rest only verify old hashes;
+# a login with an old hash rehashes it with the first one, so switching
+# profile upgrades users as they log in.
+#   default - Django's PBKDF2
+#   argon2  - Argon2 (needs argon2-cffi, falls back to scrypt without it)
+#   scrypt  - scrypt from hashlib
+#   fast    - salted MD5, a single round: only for tests and benchmarks, never production
+# PASSWORD_HASHER_PROFILE picks one; the test settings default to fast.
+
+_VERIFY_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+PASSWORD_HASHER_PROFILES = {
+    'default': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'argon2': (
+        'django.contrib.auth.hashers.Argon2PasswordHasher' if find_spec('argon2')
+        else 'django.contrib.auth.hashers.ScryptPasswordHasher'
+    ),
+    'scrypt': 'django.contrib.auth.hashers.ScryptPasswordHasher',
+    'fast': 'django.contrib.auth.hashers.MD5PasswordHasher',
+}
+
+# every profile's hasher stays in the verify list, so hashes made under another
+# profile still log in (and get rehashed) after PASSWORD_HASHER_PROFILE changes
+_VERIFY_HASHERS += [hasher for hasher in PASSWORD_HASHER_PROFILES.values() if hasher not in _VERIFY_HASHERS]
+
+PASSWORD_HASHER_PROFILE = os.environ.get('PASSWORD_HASHER_PROFILE', 'default')
+
+PASSWORD_HASHERS = [PASSWORD_HASHER_PROFILES[PASSWORD_HASHER_PROFILE]] + [
+    hasher for hasher in _VERIFY_HASHERS if hasher != PASSWORD_HASHER_PROFILES[PASSWORD_HASHER_PROFILE]
+]
+
+# provision_accounts hashes the imported passwords with this profile on
+# PROVISIONING_HASH_WORKERS threads (the hashers release the GIL). With a
+# cheaper profile than PASSWORD_HASHER_PROFILE the customers' first login
+# rehashes their password with the real one.
+PROVISIONING_HASHER_PROFILE = os.environ.get('PROVISIONING_HASHER_PROFILE', PASSWORD_HASHER_PROFILE)
+PROVISIONING_HASH_WORKERS = int(os.environ.get('PROVISIONING_HASH_WORKERS', os.cpu_count() or 1))
+
+
+# Session profile: where the login session lives
+#   db             - django_session table, a read on every authenticated request
+#   cached_db      - cache in front of the table, which is only read on a cache miss
+#   cache          - the sessions cache only, a cache flush logs everybody out
+#   signed_cookies - the signed session data in the cookie itself, no storage
+#                    at all, but a logout can not revoke a copied cookie
+# SESSION_PROFILE picks one; purge_sessions deletes expired rows of the db ones.
+
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+
+SESSION_PROFILE = os.environ.get('SESSION_PROFILE', 'db')
+SESSION_ENGINE = SESSION_ENGINES[SESSION_PROFILE]
+SESSION_CACHE_ALIAS = 'sessions'
+
+# flash messages ride in a cookie of their own instead of touching the session
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
 
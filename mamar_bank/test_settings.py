@@ -0,0 +1,24 @@
+"""
+Settings for the test suite. `python manage.py test` runs on them, other
+runners need DJANGO_SETTINGS_MODULE=mamar_bank.test_settings.
+"""
+from .settings import *  # noqa: F401,F403
+
+# a stand-in replica mirroring the test database for the routing tests,
+# which switch it on themselves; everything else reads the primary
+DATABASES.setdefault('replica_1', dict(
+    DATABASES['default'],
+    OPTIONS=dict(DATABASES['default'].get('OPTIONS', {})),
+    TEST={'MIRROR': 'default'},
+))
+DATABASE_REPLICAS = []
+
+# the whole suite posts from 127.0.0.1; RateLimitTests switch the limits back on
+RATE_LIMITS = {}
+
+# hashing with PBKDF2 would be most of the suite's run time
+PASSWORD_HASHER_PROFILE = os.environ.get('PASSWORD_HASHER_PROFILE', 'fast')
+PASSWORD_HASHERS = [PASSWORD_HASHER_PROFILES[PASSWORD_HASHER_PROFILE]] + [
+    hasher for hasher in PASSWORD_HASHERS if hasher != PASSWORD_HASHER_PROFILES[PASSWORD_HASHER_PROFILE]
+]
+PROVISIONING_HASHER_PROFILE = os.environ.get('PROVISIONING_HASHER_PROFILE', PASSWORD_HASHER_PROFILE)
@@ -15,13 +15,18 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
     
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path,include
-from core.views import HomeView
+from core.views import HomeView, RequestMetricsView
+
+if settings.ASYNC_READ_VIEWS:
+    from core.async_views import AsyncHomeView as HomeView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('',HomeView.as_view(),name='home'),
+    path('metrics/', RequestMetricsView.as_view(), name='request_metrics'),
     path('accounts/', include('accounts.urls')),
     path('transactions/', include('transactions.urls')),
 ]
@@ -6,7 +6,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mamar_bank.settings')
+    # the test command runs on the test settings (no rate limits, fast hasher)
+    default = 'mamar_bank.test_settings' if sys.argv[1:2] == ['test'] else 'mamar_bank.settings'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', default)
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -1,13 +1,161 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.http import HttpResponseRedirect
+from django.utils import timezone
+
+
+from accounts.summary import invalidate_account_summary
+from core.admin import LargeTableAdmin
+from .approval import approve_pending_loans
+from .constants import DEPOSIT, LOAN_PENDING, TRANSACTION_TYPE, WITHDRAWAL
+from .models import ArchivedTransaction, JournalEntry, JournalLine, Loan, OutboxEvent, Transaction
+from .services import PostingError, post_transaction
+
+
+class TransactionAddForm(forms.ModelForm):
+    # loan money only moves through the Loan admin (request, approve, repay),
+    # which keeps the Loan row and the open loan counter in step
+    transaction_type = forms.TypedChoiceField(
+        choices=[(value, label) for value, label in TRANSACTION_TYPE if value in (DEPOSIT, WITHDRAWAL)], coerce=int
+    )
+
+    class Meta:
+        model = Transaction
+        fields = ['account', 'amount', 'transaction_type']
+
+    def clean(self):
+        cleaned_data = super().clean()
+        account, amount = cleaned_data.get('account'), cleaned_data.get('amount')
+        if cleaned_data.get('transaction_type') == WITHDRAWAL and account and amount and amount > account.balance:
+            self.add_error('amount', f'Account {account} has only BDT {account.balance}')
+        return cleaned_data
 
 
-from .models import Transaction
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
-    list_display = ['account', 'amount', 'balance_after_transaction', 'transaction_type', 'loan_approve']
-    
+class TransactionAdmin(LargeTableAdmin):
+    list_display = ['timestamp', 'account', 'amount', 'balance_after_transaction', 'transaction_type', 'loan_approve']
+    # account __str__ is its number, one join instead of a query per row
+    list_select_related = ['account']
+    # both backed by the (transaction_type, timestamp) and (timestamp) indexes. Not
+    # date_hierarchy: its drilldown links come from a DISTINCT over every row
+    list_filter = ['transaction_type', ('timestamp', admin.DateFieldListFilter)]
+    search_fields = ['=account__account_no']
+    autocomplete_fields = ['account']
+    readonly_fields = ['balance_after_transaction', 'loan']
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is not None:
+            # a posted transaction is in the journal, money fields can not change
+            return self.readonly_fields + ['account', 'amount', 'transaction_type', 'loan_approve']
+        return self.readonly_fields
+
+    def get_form(self, request, obj=None, **kwargs):
+        if obj is None:
+            kwargs['form'] = TransactionAddForm
+        return super().get_form(request, obj, **kwargs)
+
     def save_model(self, request, obj, form, change):
-        obj.account.balance += obj.amount
-        obj.balance_after_transaction = obj.account.balance
-        obj.account.save()
-        super().save_model(request, obj, form, change)
+        if not change:
+            try:
+                post_transaction(obj)
+            except PostingError as exc:
+                # the balance moved between clean() and the posting; nothing was saved
+                obj.pk = None
+                self.message_user(request, f'Not posted: {exc}', messages.ERROR)
+        else:
+            super().save_model(request, obj, form, change)
+            invalidate_account_summary(obj.account_id)
+
+    def log_addition(self, request, obj, message):
+        if obj.pk is not None:
+            return super().log_addition(request, obj, message)
+
+    def response_add(self, request, obj, post_url_continue=None):
+        if obj.pk is None:
+            return HttpResponseRedirect(request.path)
+        return super().response_add(request, obj, post_url_continue)
+
+
+@admin.register(ArchivedTransaction)
+class ArchivedTransactionAdmin(LargeTableAdmin):
+    # moved here by archive_transactions, kept read-only like the journal
+    list_display = ['timestamp', 'account', 'amount', 'balance_after_transaction', 'transaction_type']
+    list_select_related = ['account']
+    search_fields = ['=account__account_no']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Loan)
+class LoanAdmin(LargeTableAdmin):
+    list_display = ['id', 'account', 'principal', 'outstanding', 'status', 'requested_at']
+    list_select_related = ['account']
+    list_filter = ['status', ('requested_at', admin.DateFieldListFilter)]
+    search_fields = ['=account__account_no']
+    autocomplete_fields = ['account']
+    readonly_fields = ['outstanding', 'status', 'approved_at', 'repaid_at']
+    actions = ['approve_loans']
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is not None and obj.status != LOAN_PENDING:
+            # disbursed: open_loans, the postings and the journal are about this account and principal
+            return self.readonly_fields + ['account', 'principal']
+        return self.readonly_fields
+
+    @admin.action(description='Approve and disburse selected loans')
+    def approve_loans(self, request, queryset):
+        result = approve_pending_loans(queryset)
+        self.message_user(request, f'{result.approved} loans approved')
+        if result.over_limit:
+            self.message_user(
+                request, f'{result.over_limit} loans left pending, their accounts are at the loan limit', messages.WARNING
+            )
+
+
+
+class JournalLineInline(admin.TabularInline):
+    model = JournalLine
+    fields = ['ledger', 'account', 'amount', 'balance_after']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+
+@admin.register(JournalEntry)
+class JournalEntryAdmin(LargeTableAdmin):
+    # append-only, the admin can only look
+    list_display = ['id', 'transaction_id', 'transaction_type', 'memo', 'created_at']
+    list_select_related = False
+    inlines = [JournalLineInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(LargeTableAdmin):
+    list_display = ['id', 'topic', 'created_at', 'attempts', 'available_at', 'sent_at', 'last_error']
+    readonly_fields = ['topic', 'payload', 'created_at', 'attempts', 'available_at', 'sent_at', 'last_error']
+    actions = ['retry_now']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Retry selected undelivered events now')
+    def retry_now(self, request, queryset):
+        # also brings back the ones drain_outbox gave up on
+        retried = queryset.filter(sent_at__isnull=True).update(available_at=timezone.now(), attempts=0)
+        self.message_user(request, f'{retried} events queued for delivery')
@@ -0,0 +1,139 @@
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from accounts.models import UserBankAccount
+from accounts.summary import invalidate_account_summaries
+from core.db import BULK_BATCH_SIZE
+from .batch import apply_deltas
+from .constants import LOAN, LOAN_APPROVED, LOAN_PENDING, MAX_OPEN_LOANS
+from .journal import record_entries
+from .models import Loan, Transaction
+from .outbox import enqueue_postings
+from .snapshots import record_daily_balances
+from .velocity import record_postings
+from .write_queue import serialized
+
+
+@dataclass
+class ApprovalResult:
+    approved: int = 0
+    # left pending, their account has no free loan slot
+    over_limit: int = 0
+    elapsed: float = 0.0
+
+
+def approvable_loans(loan_ids):
+    """
+    Pending loans among loan_ids that fit in their account's free loan
+    slots. Loans are ranked per account, oldest request first, and kept
+    while open_loans + rank <= MAX_OPEN_LOANS: the limit is one query, not a
+    check per loan.
+    """
+    return (
+        Loan.objects.filter(pk__in=loan_ids, status=LOAN_PENDING)
+        .annotate(
+            slot=Window(RowNumber(), partition_by=[F('account_id')], order_by=[F('requested_at').asc(), F('id').asc()]),
+            free_slots=MAX_OPEN_LOANS - F('account__open_loans'),
+        )
+        .filter(slot__lte=F('free_slots'))
+        .order_by('pk')
+        .values_list('pk', 'account_id', 'principal')
+    )
+
+
+def _add_open_loans(counts):
+    items = list(counts.items())
+    for start in range(0, len(items), BULK_BATCH_SIZE):
+        batch = items[start:start + BULK_BATCH_SIZE]
+        UserBankAccount.objects.filter(pk__in=[pk for pk, _ in batch]).update(
+            open_loans=F('open_loans') + Case(
+                *[When(pk=pk, then=Value(n)) for pk, n in batch], output_field=IntegerField()
+            )
+        )
+
+
+@serialized
+def approve_chunk(loan_ids):
+    """
+    Approve and disburse the approvable loans among loan_ids in one db
+    transaction: a status UPDATE per slice of loans, one CASE UPDATE each
+    for the balances and the open loan counters, and bulk inserts of the
+    disbursement postings with their journal entries.
+    Returns the number of approved loans.
+    """
+    with transaction.atomic():
+        account_ids = set(Loan.objects.filter(pk__in=loan_ids).values_list('account_id', flat=True))
+        balances = dict(
+            UserBankAccount.objects.select_for_update().filter(pk__in=account_ids).values_list('pk', 'balance')
+        )
+        approved = list(approvable_loans(loan_ids))
+        if not approved:
+            return 0
+
+        now = timezone.now()
+        for start in range(0, len(approved), BULK_BATCH_SIZE):
+            Loan.objects.filter(pk__in=[pk for pk, _, _ in approved[start:start + BULK_BATCH_SIZE]]).update(
+                status=LOAN_APPROVED, outstanding=F('principal'), approved_at=now
+            )
+
+        deltas = defaultdict(Decimal)
+        counts = defaultdict(int)
+        postings = []
+        journal = []
+        for loan_id, account_id, principal in approved:
+            balances[account_id] += principal
+            deltas[account_id] += principal
+            counts[account_id] += 1
+            txn = Transaction(
+                account_id=account_id,
+                amount=principal,
+                transaction_type=LOAN,
+                loan_approve=True,
+                loan_id=loan_id,
+                balance_after_transaction=balances[account_id],
+            )
+            postings.append(txn)
+            journal.append((txn, principal))
+
+        Transaction.objects.bulk_create(postings, batch_size=BULK_BATCH_SIZE)
+        record_entries(journal)
+        enqueue_postings(postings)
+        record_postings(postings)
+        apply_deltas(deltas)
+        _add_open_loans(counts)
+        invalidate_account_summaries(deltas)
+        record_daily_balances({pk: (delta, Decimal(0), balances[pk]) for pk, delta in deltas.items()})
+    return len(approved)
+
+
+def approve_pending_loans(loans=None, chunk_size=1000, on_chunk=None):
+    """
+    Work through the pending loans (of the given Loan queryset, default
+    all) in id order, chunk_size loans per db transaction. Loans over their
+    account's limit stay pending. on_chunk(result) is called after every
+    chunk.
+    """
+    pending = (Loan.objects.all() if loans is None else loans).filter(status=LOAN_PENDING).order_by('pk')
+    result = ApprovalResult()
+    started = time.perf_counter()
+    last_pk = 0
+    while True:
+        chunk = list(pending.filter(pk__gt=last_pk).values_list('pk', flat=True)[:chunk_size])
+        if not chunk:
+            break
+        approved = approve_chunk(chunk)
+        result.approved += approved
+        result.over_limit += len(chunk) - approved
+        last_pk = chunk[-1]
+        result.elapsed = time.perf_counter() - started
+        if on_chunk:
+            on_chunk(result)
+    result.elapsed = time.perf_counter() - started
+    return result
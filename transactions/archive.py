@@ -0,0 +1,111 @@
+"""
+Archival of cold history. archive_transactions() moves the Transaction rows
+older than a cutoff into ArchivedTransaction, oldest first, one chunk per
+db transaction, so the hot table only holds the last
+TRANSACTION_ARCHIVE_DAYS days. Daily balance snapshots are not touched:
+range totals and balances of archived days still come from them.
+
+Archived rows are always older than every hot row, so a newest-first read
+is the hot rows followed by the archived ones, and the archive only has to
+be read when a date range starts before the last cutoff.
+"""
+import time
+from dataclasses import dataclass
+from datetime import datetime, time as day_time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from core.db import BULK_BATCH_SIZE
+from .models import ArchivedTransaction, ArchiveRun, Transaction
+
+FIELDS = ['id', 'account_id', 'amount', 'balance_after_transaction', 'transaction_type', 'timestamp', 'loan_approve', 'loan_id']
+
+
+def _aware(day):
+    return timezone.make_aware(datetime.combine(day, day_time.min))
+
+
+def archive_cutoff(days=None):
+    """Local midnight `days` (default TRANSACTION_ARCHIVE_DAYS) days ago."""
+    days = settings.TRANSACTION_ARCHIVE_DAYS if days is None else days
+    return _aware(timezone.localdate() - timedelta(days=days))
+
+
+@dataclass
+class ArchiveResult:
+    moved: int = 0
+    chunks: int = 0
+    elapsed: float = 0.0
+
+
+def archive_chunk(cutoff, chunk_size):
+    """Move the chunk_size oldest rows before cutoff; returns how many moved."""
+    with transaction.atomic():
+        rows = list(
+            Transaction.objects.filter(timestamp__lt=cutoff).order_by('timestamp', 'id').values(*FIELDS)[:chunk_size]
+        )
+        if not rows:
+            return 0
+        ArchivedTransaction.objects.bulk_create(
+            [ArchivedTransaction(**row) for row in rows], batch_size=BULK_BATCH_SIZE
+        )
+        # the chunk is everything up to its last (timestamp, id): a range delete, not a list of ids
+        last = rows[-1]
+        Transaction.objects.filter(
+            Q(timestamp__lt=last['timestamp']) | Q(timestamp=last['timestamp'], id__lte=last['id'])
+        ).delete()
+    return len(rows)
+
+
+def archive_transactions(cutoff=None, chunk_size=2000, on_chunk=None):
+    """
+    Move every Transaction older than cutoff (default archive_cutoff()) to
+    the archive. An interrupted run is finished by running it again.
+    on_chunk(result) is called after every chunk.
+    """
+    cutoff = cutoff or archive_cutoff()
+    # recorded first: while the rows move, readers must already look in the archive
+    run, _ = ArchiveRun.objects.get_or_create(cutoff=cutoff)
+    result = ArchiveResult()
+    started = time.perf_counter()
+    while True:
+        moved = archive_chunk(cutoff, chunk_size)
+        if not moved:
+            break
+        ArchiveRun.objects.filter(pk=run.pk).update(moved=F('moved') + moved)
+        result.moved += moved
+        result.chunks += 1
+        result.elapsed = time.perf_counter() - started
+        if on_chunk:
+            on_chunk(result)
+    ArchiveRun.objects.filter(pk=run.pk).update(finished_at=timezone.now())
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def _latest_cutoff():
+    return ArchiveRun.objects.order_by('-cutoff').values_list('cutoff', flat=True)
+
+
+def _reaches_archive(cutoff, start_date):
+    return cutoff is not None and (start_date is None or _aware(start_date) < cutoff)
+
+
+def archived_transactions(account, start_date=None):
+    """
+    The account's ArchivedTransaction rows when a range starting on
+    start_date (None: the whole history) reaches back into the archive,
+    otherwise None.
+    """
+    if not _reaches_archive(_latest_cutoff().first(), start_date):
+        return None
+    return ArchivedTransaction.objects.filter(account=account)
+
+
+async def aarchived_transactions(account, start_date=None):
+    if not _reaches_archive(await _latest_cutoff().afirst(), start_date):
+        return None
+    return ArchivedTransaction.objects.filter(account=account)
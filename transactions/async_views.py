@@ -0,0 +1,88 @@
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import render
+
+from core.async_views import AsyncPageView
+from transactions.idempotency import FIELD as IDEMPOTENCY_FIELD, new_idempotency_key
+from transactions.export import abuffered, acsv_lines, ahistory_rows, ajsonl_lines
+from transactions.models import Loan, Transaction
+from transactions.pagination import InvalidCursor, akeyset_page, page_links
+from transactions.snapshots import arange_summary
+from transactions.views import DateRangeMixin
+
+
+class AsyncAccountView(AsyncPageView):
+    login_required = True
+
+    def get_account(self):
+        summary = self.request._account_summary
+        if summary is None:
+            raise Http404('You do not have a bank account')
+        return summary.account
+
+
+class AsyncTransactionReportView(DateRangeMixin, AsyncAccountView):
+    template_name = 'transactions/transaction_report.html'
+    paginate_by = 50
+
+    async def get(self, request):
+        account = self.get_account()
+        queryset = Transaction.objects.filter(account=account)
+        summary = None
+
+        dates = self.get_dates()
+        if dates:
+            queryset = self.filter_dates(queryset, *dates)
+            summary = await arange_summary(account, *dates)
+
+        try:
+            rows, next_cursor = await akeyset_page(
+                queryset, request.GET.get('cursor'), self.paginate_by,
+                older=lambda: self.aget_archived(account, dates),
+            )
+        except InvalidCursor:
+            raise Http404('Invalid page cursor')
+
+        next_page_query, first_page_query = page_links(request.GET, next_cursor)
+        return render(request, self.template_name, {
+            'object_list': rows,
+            'transaction_list': rows,
+            'account': account,
+            'summary': summary,
+            'next_page_query': next_page_query,
+            'first_page_query': first_page_query,
+        })
+
+
+class AsyncLoanListView(AsyncAccountView):
+    template_name = 'transactions/loan_request.html'
+
+    async def get(self, request):
+        loans = [loan async for loan in Loan.objects.filter(account=self.get_account())]
+        return render(request, self.template_name, {
+            'loans': loans, 'object_list': loans, IDEMPOTENCY_FIELD: new_idempotency_key(),
+        })
+
+
+class AsyncStatementExportView(DateRangeMixin, AsyncAccountView):
+    formats = {
+        'csv': ('text/csv', acsv_lines),
+        'jsonl': ('application/x-ndjson', ajsonl_lines),
+    }
+
+    async def get(self, request):
+        fmt = request.GET.get('format', 'csv')
+        if fmt not in self.formats:
+            raise Http404('Unknown statement format')
+        content_type, serialize = self.formats[fmt]
+
+        account = self.get_account()
+        queryset = Transaction.objects.filter(account=account)
+        dates = self.get_dates()
+        if dates:
+            queryset = self.filter_dates(queryset, *dates)
+
+        # async iterator: under ASGI rows are sent as aiterator() yields them
+        rows = ahistory_rows(queryset, await self.aget_archived(account, dates))
+        response = StreamingHttpResponse(abuffered(serialize(rows)), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="statement-{account.account_no}.{fmt}"'
+        return response
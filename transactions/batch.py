@@ -0,0 +1,209 @@
+import csv
+import json
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Value, When
+
+from accounts.models import UserBankAccount
+from accounts.summary import invalidate_account_summaries
+from core.db import BULK_BATCH_SIZE
+from .constants import (
+    DEPOSIT,
+    WITHDRAWAL,
+    MIN_DEPOSIT_AMOUNT,
+    MIN_WITHDRAW_AMOUNT,
+    MAX_WITHDRAW_AMOUNT,
+)
+from .journal import record_entries
+from .models import Transaction
+from .outbox import enqueue_postings
+from .services import balance_delta
+from .snapshots import record_daily_balances
+from .velocity import record_postings
+from .write_queue import serialized
+
+TRANSACTION_TYPES = {
+    'deposit': DEPOSIT,
+    'withdraw': WITHDRAWAL,
+    'withdrawal': WITHDRAWAL,
+    str(DEPOSIT): DEPOSIT,
+    str(WITHDRAWAL): WITHDRAWAL,
+}
+
+
+class RejectedRecord(ValueError):
+    pass
+
+
+@dataclass
+class BatchRecord:
+    line: int
+    account_no: int
+    transaction_type: int
+    amount: Decimal
+
+
+@dataclass
+class BatchResult:
+    posted: int = 0
+    rejected: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def throughput(self):
+        return self.posted / self.elapsed if self.elapsed else 0.0
+
+
+def read_records(stream, fmt='csv'):
+    """Yield (line_no, dict) from a csv or jsonl stream, one line at a time."""
+    if fmt == 'jsonl':
+        for line_no, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_no, json.loads(line)
+            except ValueError:
+                yield line_no, {'__raw__': line}
+    elif fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        raise ValueError(f'Unknown batch format {fmt!r}')
+
+
+def validate_amount(transaction_type, amount):
+    # same bounds as DepositForm/WithdrawForm.clean_amount; the balance check happens at posting time
+    if transaction_type == DEPOSIT and amount < MIN_DEPOSIT_AMOUNT:
+        raise RejectedRecord(f'You need to deposit at least BDT {MIN_DEPOSIT_AMOUNT}')
+    if transaction_type == WITHDRAWAL:
+        if amount < MIN_WITHDRAW_AMOUNT:
+            raise RejectedRecord(f'You can withdraw at least BDT {MIN_WITHDRAW_AMOUNT}')
+        if amount > MAX_WITHDRAW_AMOUNT:
+            raise RejectedRecord(f'You can withdraw at most BDT {MAX_WITHDRAW_AMOUNT}')
+
+
+def parse_record(line_no, raw):
+    try:
+        account_no = int(raw['account_no'])
+        transaction_type = TRANSACTION_TYPES[str(raw['type']).strip().lower()]
+        amount = Decimal(str(raw['amount']).strip())
+    except (KeyError, TypeError, ValueError, InvalidOperation):
+        raise RejectedRecord('Malformed record, expected account_no, type and amount')
+    if not amount.is_finite() or amount.as_tuple().exponent < -2:
+        raise RejectedRecord('Amount must have at most 2 decimal places')
+    _, digits, exponent = amount.as_tuple()
+    if len(digits) + exponent > 10:
+        # would not fit the max_digits=12 columns and fail the whole chunk
+        raise RejectedRecord('Amount must have at most 10 digits before the decimal point')
+    validate_amount(transaction_type, amount)
+    return BatchRecord(line_no, account_no, transaction_type, amount)
+
+
+def _reject(on_reject, line_no, reason):
+    if on_reject:
+        on_reject(line_no, reason)
+
+
+def apply_deltas(deltas):
+    """Add {account_id: delta} to the balances, one CASE UPDATE per slice of accounts."""
+    items = list(deltas.items())
+    for start in range(0, len(items), BULK_BATCH_SIZE):
+        batch = items[start:start + BULK_BATCH_SIZE]
+        UserBankAccount.objects.filter(pk__in=[pk for pk, _ in batch]).update(
+            balance=F('balance') + Case(
+                *[When(pk=pk, then=Value(delta)) for pk, delta in batch],
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            )
+        )
+
+
+@serialized
+def post_records(records, on_reject=None):
+    """
+    Post one chunk of BatchRecords in a single db transaction: one locked read
+    of the touched accounts, a bulk_create of the Transaction rows and their
+    journal entries and a CASE UPDATE that applies the net delta of every
+    account.
+    Returns the number of posted records.
+    """
+    with transaction.atomic():
+        accounts = (
+            UserBankAccount.objects.select_for_update()
+            .only('id', 'account_no', 'balance')
+            .in_bulk({record.account_no for record in records}, field_name='account_no')
+        )
+        balances = {}
+        deltas = defaultdict(Decimal)
+        movements = defaultdict(lambda: [Decimal(0), Decimal(0)])
+        postings = []
+        journal = []
+        for record in records:
+            account = accounts.get(record.account_no)
+            if account is None:
+                _reject(on_reject, record.line, f'Unknown account {record.account_no}')
+                continue
+            balance = balances.get(account.pk, account.balance)
+            delta = balance_delta(record.transaction_type, record.amount)
+            if balance + delta < 0:
+                _reject(on_reject, record.line, f'Insufficient balance in account {record.account_no}')
+                continue
+            balances[account.pk] = balance + delta
+            deltas[account.pk] += delta
+            movements[account.pk][0 if delta > 0 else 1] += abs(delta)
+            txn = Transaction(
+                account_id=account.pk,
+                amount=record.amount,
+                transaction_type=record.transaction_type,
+                balance_after_transaction=balance + delta,
+            )
+            postings.append(txn)
+            journal.append((txn, delta))
+
+        Transaction.objects.bulk_create(postings, batch_size=BULK_BATCH_SIZE)
+        record_entries(journal)
+        enqueue_postings(postings)
+        record_postings(postings)
+        apply_deltas(deltas)
+        invalidate_account_summaries(deltas)
+        record_daily_balances({
+            pk: (credits, debits, balances[pk]) for pk, (credits, debits) in movements.items()
+        })
+    return len(postings)
+
+
+def post_batch(rows, chunk_size=5000, on_reject=None):
+    """
+    Stream (line_no, dict) rows (see read_records) through validation and
+    post them chunk by chunk. Only one chunk is held in memory at a time.
+    on_reject(line_no, reason) is called for every rejected line.
+    """
+    result = BatchResult()
+    started = time.perf_counter()
+
+    def report(line_no, reason):
+        result.rejected += 1
+        if on_reject:
+            on_reject(line_no, reason)
+
+    def valid_records():
+        for line_no, raw in rows:
+            try:
+                yield parse_record(line_no, raw)
+            except RejectedRecord as exc:
+                report(line_no, str(exc))
+
+    records = valid_records()
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+        result.posted += post_records(chunk, on_reject=report)
+
+    result.elapsed = time.perf_counter() - started
+    return result
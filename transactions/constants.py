@@ -2,11 +2,45 @@ DEPOSIT = 1
 WITHDRAWAL = 2
 LOAN = 3
 LOAN_PAID = 4
+INTEREST = 5
 
 TRANSACTION_TYPE = (
     (DEPOSIT, 'Deposite'),
     (WITHDRAWAL, 'Withdrawal'),
     (LOAN, 'Loan'),
     (LOAN_PAID, 'Loan Paid'),
+    (INTEREST, 'Interest'),
     
-)
\ No newline at end of file
+)
+
+MIN_DEPOSIT_AMOUNT = 100
+MIN_WITHDRAW_AMOUNT = 500
+MAX_WITHDRAW_AMOUNT = 20000
+
+LOAN_PENDING = 1
+LOAN_APPROVED = 2
+LOAN_REPAID = 3
+
+LOAN_STATUS = (
+    (LOAN_PENDING, 'Pending'),
+    (LOAN_APPROVED, 'Approved'),
+    (LOAN_REPAID, 'Repaid'),
+)
+
+MAX_OPEN_LOANS = 3
+
+
+# journal ledgers: every entry debits one and credits another
+LEDGER_CUSTOMER = 'customer'
+LEDGER_CASH = 'cash'
+LEDGER_LOANS = 'loans'
+LEDGER_SUSPENSE = 'suspense'
+LEDGER_INTEREST = 'interest'
+
+LEDGERS = (
+    (LEDGER_CUSTOMER, 'Customer deposits'),
+    (LEDGER_CASH, 'Cash'),
+    (LEDGER_LOANS, 'Loans receivable'),
+    (LEDGER_SUSPENSE, 'Suspense'),
+    (LEDGER_INTEREST, 'Interest expense'),
+)
@@ -0,0 +1,136 @@
+import csv
+import json
+
+from django.utils import timezone
+
+from .constants import TRANSACTION_TYPE
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_BUFFER_SIZE = 32 * 1024
+
+STATEMENT_FIELDS = ['timestamp', 'transaction_type', 'amount', 'balance_after_transaction']
+
+TRANSACTION_TYPE_NAMES = dict(TRANSACTION_TYPE)
+
+
+def statement_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield plain tuples for a statement, newest first. values_list + iterator
+    skips model instantiation and fetches from a server-side cursor, so memory
+    stays constant however long the history is.
+    """
+    return queryset.order_by('-timestamp', '-id').values_list(*STATEMENT_FIELDS).iterator(chunk_size=chunk_size)
+
+
+def history_rows(queryset, archived=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """statement_rows of queryset, then of the archived rows (all older) when there are any to read."""
+    yield from statement_rows(queryset, chunk_size)
+    if archived is not None:
+        yield from statement_rows(archived, chunk_size)
+
+
+async def astatement_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    # values() rather than values_list(): ValuesListIterable runs its query as
+    # soon as it is created, which aiterator() does on the event loop thread
+    rows = queryset.order_by('-timestamp', '-id').values(*STATEMENT_FIELDS).aiterator(chunk_size=chunk_size)
+    async for row in rows:
+        yield tuple(row[name] for name in STATEMENT_FIELDS)
+
+
+async def ahistory_rows(queryset, archived=None, chunk_size=EXPORT_CHUNK_SIZE):
+    async for row in astatement_rows(queryset, chunk_size):
+        yield row
+    if archived is not None:
+        async for row in astatement_rows(archived, chunk_size):
+            yield row
+
+
+class Echo:
+    # csv.writer wants a file; this one hands every line straight back
+    def write(self, value):
+        return value
+
+
+CSV_HEADER = ['date', 'type', 'amount', 'balance_after_transaction']
+
+
+def _fields(row):
+    timestamp, transaction_type, amount, balance_after = row
+    return (
+        timezone.localtime(timestamp).isoformat(),
+        TRANSACTION_TYPE_NAMES.get(transaction_type, transaction_type),
+        f'{amount:.2f}',
+        f'{balance_after:.2f}',
+    )
+
+
+def csv_line(row, writer=csv.writer(Echo())):
+    return writer.writerow(_fields(row))
+
+
+def jsonl_line(row):
+    return json.dumps(dict(zip(CSV_HEADER, _fields(row)))) + '\n'
+
+
+def csv_lines(rows):
+    yield csv.writer(Echo()).writerow(CSV_HEADER)
+    for row in rows:
+        yield csv_line(row)
+
+
+def jsonl_lines(rows):
+    for row in rows:
+        yield jsonl_line(row)
+
+
+async def acsv_lines(rows):
+    yield csv.writer(Echo()).writerow(CSV_HEADER)
+    async for row in rows:
+        yield csv_line(row)
+
+
+async def ajsonl_lines(rows):
+    async for row in rows:
+        yield jsonl_line(row)
+
+
+def buffered(lines, size=EXPORT_BUFFER_SIZE):
+    """
+    Join small lines into blocks of about size characters, so the server does
+    not write row by row. The first line goes out alone so the download starts
+    before the first block is full.
+    """
+    lines = iter(lines)
+    for line in lines:
+        yield line
+        break
+    block = []
+    length = 0
+    for line in lines:
+        block.append(line)
+        length += len(line)
+        if length >= size:
+            yield ''.join(block)
+            block = []
+            length = 0
+    if block:
+        yield ''.join(block)
+
+
+async def abuffered(lines, size=EXPORT_BUFFER_SIZE):
+    first = True
+    block = []
+    length = 0
+    async for line in lines:
+        if first:
+            yield line
+            first = False
+            continue
+        block.append(line)
+        length += len(line)
+        if length >= size:
+            yield ''.join(block)
+            block = []
+            length = 0
+    if block:
+        yield ''.join(block)
@@ -1,5 +1,7 @@
 from django import forms
+from .constants import MIN_DEPOSIT_AMOUNT, MIN_WITHDRAW_AMOUNT, MAX_WITHDRAW_AMOUNT
 from .models import Transaction
+from .services import post_transaction, request_loan
 class TransactionForm(forms.ModelForm):
     class Meta:
         model = Transaction
@@ -16,13 +18,13 @@ class TransactionForm(forms.ModelForm):
 
     def save(self, commit=True):
         self.instance.account = self.account
-        self.instance.balance_after_transaction = self.account.balance
-        return super().save()
+        # balance update + insert ek sathe, services e; customer er posting e velocity rule check hoy
+        return post_transaction(self.instance, enforce_velocity=True)
 
 
 class DepositForm(TransactionForm):
     def clean_amount(self): # amount field ke filter korbo
-        min_deposit_amount = 100
+        min_deposit_amount = MIN_DEPOSIT_AMOUNT
         amount = self.cleaned_data.get('amount') # user er fill up kora form theke amra amount field er value ke niye aslam
         if amount < min_deposit_amount:
             raise forms.ValidationError(
@@ -36,8 +38,8 @@ class WithdrawForm(TransactionForm):
 
     def clean_amount(self):
         account = self.account
-        min_withdraw_amount = 500
-        max_withdraw_amount = 20000
+        min_withdraw_amount = MIN_WITHDRAW_AMOUNT
+        max_withdraw_amount = MAX_WITHDRAW_AMOUNT
         balance = account.balance 
         amount = self.cleaned_data.get('amount')
         if amount < min_withdraw_amount:
@@ -66,6 +68,10 @@ class LoanRequestForm(TransactionForm):
 
         return amount
 
+    def save(self, commit=True):
+        # loan request ekhon Loan model e jay, kono Transaction row hoy na
+        return request_loan(self.account, self.cleaned_data['amount'])
+
 
 
 
@@ -0,0 +1,141 @@
+"""
+Idempotency keys for the views that move money. The client sends a token
+with the POST (Idempotency-Key header, or the idempotency_key field the
+forms render); the first request with a token is processed, a retry of it
+gets the stored redirect back without touching the ledger.
+"""
+import hashlib
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib import messages
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseRedirect
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+FIELD = 'idempotency_key'
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+MAX_KEY_LENGTH = 64
+# inserts tried before an IntegrityError that is not about an existing key is re-raised
+CLAIM_ATTEMPTS = 3
+TTL = timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
+
+def new_idempotency_key():
+    return uuid.uuid4().hex
+
+
+def request_key(request):
+    return request.META.get(HEADER) or request.POST.get(FIELD) or None
+
+
+def request_fingerprint(request):
+    # a retry must repeat the same request; the csrf token and the key itself may differ
+    digest = hashlib.blake2b(request.path.encode(), digest_size=16)
+    for name, values in sorted(request.POST.lists()):
+        if name not in ('csrfmiddlewaretoken', FIELD):
+            digest.update(f'\0{name}={values}'.encode())
+    return digest.hexdigest()
+
+
+def claim(user, key, fingerprint):
+    """
+    Insert the key in its own short transaction and return (record, created).
+    The unique (user, key) constraint decides the race between two copies of
+    the same request. A key past its TTL that is not purged yet is taken over.
+    """
+    for _ in range(CLAIM_ATTEMPTS):
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=user, key=key, fingerprint=fingerprint, expires_at=now + TTL
+                )
+            return record, True
+        except IntegrityError as exc:
+            error = exc
+        record = IdempotencyKey.objects.filter(user=user, key=key).first()
+        if record is None:
+            # released by a failed first attempt in between (try again), or
+            # not a duplicate key at all, which the last attempt re-raises
+            continue
+        if record.expires_at > now:
+            return record, False
+        taken = IdempotencyKey.objects.filter(pk=record.pk, expires_at__lte=now).update(
+            fingerprint=fingerprint, status_code=None, location='', expires_at=now + TTL
+        )
+        if taken:
+            return record, True
+    raise error
+
+
+def replay(request, record, fingerprint):
+    if record.fingerprint != fingerprint:
+        return HttpResponse('This idempotency key was already used for a different request', status=422)
+    if record.status_code is None:
+        return HttpResponse('A request with this idempotency key is still being processed', status=409)
+    messages.info(request, 'This request was already processed')
+    response = HttpResponseRedirect(record.location)
+    response.status_code = record.status_code
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+class IdempotentPostMixin:
+    """
+    Processes a keyed POST at most once per user and key. Only redirects
+    (a completed posting) are stored; a re-rendered form, an error or a
+    redirect after release_idempotency_key() releases the key, so the
+    request can be sent again with it.
+    POSTs without a key go straight to the view. Goes after
+    LoginRequiredMixin, keys belong to the logged in user.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        key = request_key(request) if request.method == 'POST' else None
+        if key is None:
+            return super().dispatch(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return HttpResponseBadRequest(f'Idempotency key longer than {MAX_KEY_LENGTH} characters')
+
+        fingerprint = request_fingerprint(request)
+        record, created = claim(request.user, key, fingerprint)
+        if not created:
+            return replay(request, record, fingerprint)
+
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+        except Exception:
+            IdempotencyKey.objects.filter(pk=record.pk).delete()
+            raise
+        if response.status_code in (301, 302, 303) and not getattr(self, 'idempotency_released', False):
+            IdempotencyKey.objects.filter(pk=record.pk).update(
+                status_code=response.status_code, location=response['Location']
+            )
+        else:
+            IdempotencyKey.objects.filter(pk=record.pk).delete()
+        return response
+
+    def release_idempotency_key(self):
+        # the posting failed, a retry with the same key must run it again
+        self.idempotency_released = True
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # a re-rendered form keeps the key it was sent with
+        context[FIELD] = request_key(self.request) or new_idempotency_key()
+        return context
+
+
+def purge_expired_keys(batch_size=1000):
+    """Delete expired keys in batches of primary keys; returns how many went."""
+    purged = 0
+    while True:
+        now = timezone.now()
+        batch = list(IdempotencyKey.objects.filter(expires_at__lte=now).values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return purged
+        purged += IdempotencyKey.objects.filter(pk__in=batch).delete()[0]
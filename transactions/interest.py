@@ -0,0 +1,146 @@
+import calendar
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+
+from accounts.models import UserBankAccount
+from .batch import BatchRecord, post_records
+from .constants import INTEREST
+from .models import DailyBalance, InterestAccrual, InterestRun
+
+SAVINGS = 'Savings'
+CENT = Decimal('0.01')
+
+
+class InterestError(Exception):
+    pass
+
+
+def month_bounds(period):
+    start = period.replace(day=1)
+    return start, start.replace(day=calendar.monthrange(start.year, start.month)[1])
+
+
+def previous_month(today=None):
+    today = today or timezone.localdate()
+    return (today.replace(day=1) - timedelta(days=1)).replace(day=1)
+
+
+def average_daily_balances(account_ids, start, end):
+    """
+    {account_id: (account_no, average end-of-day balance over start..end)}.
+    Two queries per chunk: the balance carried into the month (last snapshot
+    before it) and the month's snapshots, streamed in (account, date) order.
+    Each balance is weighted by the days it was held.
+    """
+    carried = (
+        UserBankAccount.objects.filter(pk__in=account_ids)
+        .annotate(carried=Subquery(
+            DailyBalance.objects.filter(account=OuterRef('pk'), date__lt=start)
+            .order_by('-date').values('closing_balance')[:1]
+        ))
+        .values_list('pk', 'account_no', 'carried')
+    )
+    account_nos = {}
+    held = {}  # account_id -> (since, balance)
+    for pk, account_no, balance in carried:
+        account_nos[pk] = account_no
+        held[pk] = (start, balance or Decimal(0))
+
+    weighted = defaultdict(Decimal)
+    snapshots = (
+        DailyBalance.objects.filter(account_id__in=account_ids, date__gte=start, date__lte=end)
+        .order_by('account_id', 'date')
+        .values_list('account_id', 'date', 'closing_balance')
+        .iterator(chunk_size=2000)
+    )
+    for account_id, day, closing in snapshots:
+        since, balance = held[account_id]
+        weighted[account_id] += balance * (day - since).days
+        held[account_id] = (day, closing)
+
+    days = (end - start).days + 1
+    averages = {}
+    for pk, (since, balance) in held.items():
+        weighted[pk] += balance * ((end - since).days + 1)
+        averages[pk] = (account_nos[pk], (weighted[pk] / days).quantize(CENT, ROUND_HALF_UP))
+    return averages
+
+
+def interest_for(average_balance, rate, start, end):
+    days = (end - start).days + 1
+    year = 366 if calendar.isleap(start.year) else 365
+    return (average_balance * rate * days / year).quantize(CENT, ROUND_HALF_UP)
+
+
+def accrue_chunk(run, account_ids):
+    """
+    Credit the interest of one chunk of accounts and move the checkpoint,
+    all in one db transaction, so a crash either keeps the whole chunk or
+    none of it. Returns (accounts credited, interest posted).
+    """
+    start, end = month_bounds(run.period)
+    averages = average_daily_balances(account_ids, start, end)
+    accruals = []
+    records = []
+    for account_id in account_ids:
+        account_no, average = averages[account_id]
+        amount = interest_for(average, run.rate, start, end)
+        if amount <= 0:
+            continue
+        accruals.append(InterestAccrual(run=run, account_id=account_id, average_balance=average, amount=amount))
+        records.append(BatchRecord(line=account_id, account_no=account_no, transaction_type=INTEREST, amount=amount))
+
+    total = sum((accrual.amount for accrual in accruals), Decimal(0))
+    with transaction.atomic():
+        # the unique (run, account) constraint refuses a second credit
+        InterestAccrual.objects.bulk_create(accruals)
+        post_records(records)
+        InterestRun.objects.filter(pk=run.pk).update(
+            last_account_id=account_ids[-1],
+            accounts=F('accounts') + len(accruals),
+            total_interest=F('total_interest') + total,
+        )
+    run.last_account_id = account_ids[-1]
+    return len(accruals), total
+
+
+def accrue_interest(period, rate=None, chunk_size=1000, max_chunks=None, on_chunk=None):
+    """
+    Run (or resume) the interest run of the month containing `period` over
+    every savings account, chunk_size accounts at a time in primary key
+    order. max_chunks bounds the work of one invocation; the next call picks
+    up after the checkpoint. Returns the InterestRun.
+    """
+    start, end = month_bounds(period)
+    # the month's last balances are only known once it is over; an early run
+    # would be finished at a guessed average and could never be redone
+    if end >= timezone.localdate():
+        raise InterestError(f'{start:%Y-%m} is not over yet, interest is accrued after the month ends')
+    run, created = InterestRun.objects.get_or_create(
+        period=start,
+        defaults={'rate': Decimal(str(rate if rate is not None else settings.SAVINGS_INTEREST_RATE))},
+    )
+    if not created and rate is not None and Decimal(str(rate)) != run.rate:
+        raise InterestError(f'The {start:%Y-%m} run was started at rate {run.rate}, not {rate}')
+    if run.finished_at:
+        return run
+
+    account_ids = UserBankAccount.objects.filter(account_type=SAVINGS).order_by('pk').values_list('pk', flat=True)
+    chunks = 0
+    while max_chunks is None or chunks < max_chunks:
+        chunk = list(account_ids.filter(pk__gt=run.last_account_id)[:chunk_size])
+        if not chunk:
+            InterestRun.objects.filter(pk=run.pk).update(finished_at=timezone.now())
+            break
+        credited, total = accrue_chunk(run, chunk)
+        chunks += 1
+        if on_chunk:
+            on_chunk(chunk[-1], credited, total)
+    run.refresh_from_db()
+    return run
@@ -0,0 +1,116 @@
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from accounts.models import UserBankAccount
+from core.db import BULK_BATCH_SIZE
+from .constants import (
+    DEPOSIT,
+    WITHDRAWAL,
+    INTEREST,
+    LEDGER_CUSTOMER,
+    LEDGER_CASH,
+    LEDGER_LOANS,
+    LEDGER_INTEREST,
+)
+from .models import JournalEntry, JournalLine
+
+
+def counter_ledger(transaction_type):
+    # deposits and withdrawals move cash, interest is an expense, loan postings move loans receivable
+    if transaction_type in (DEPOSIT, WITHDRAWAL):
+        return LEDGER_CASH
+    if transaction_type == INTEREST:
+        return LEDGER_INTEREST
+    return LEDGER_LOANS
+
+
+def _lines(entry, account_id, ledger, delta, balance_after):
+    return [
+        JournalLine(entry=entry, ledger=LEDGER_CUSTOMER, account_id=account_id, amount=delta, balance_after=balance_after),
+        JournalLine(entry=entry, ledger=ledger, amount=-delta),
+    ]
+
+
+def record_entry(txn, delta, balance_after):
+    """
+    Journal one posting: a customer line carrying the new running balance
+    and the opposite line on the counter ledger. Runs inside the posting's
+    db transaction; balance_after may be an expression.
+    """
+    if not delta:
+        return None
+    entry = JournalEntry.objects.create(transaction=txn, transaction_type=txn.transaction_type)
+    JournalLine.objects.bulk_create(
+        _lines(entry, txn.account_id, counter_ledger(txn.transaction_type), delta, balance_after)
+    )
+    return entry
+
+
+def record_entries(postings):
+    """Bulk version of record_entry for (saved Transaction, delta) pairs with a known balance_after_transaction."""
+    postings = [(txn, delta) for txn, delta in postings if delta]
+    entries = JournalEntry.objects.bulk_create(
+        [JournalEntry(transaction=txn, transaction_type=txn.transaction_type) for txn, _ in postings],
+        batch_size=BULK_BATCH_SIZE,
+    )
+    lines = []
+    for entry, (txn, delta) in zip(entries, postings):
+        lines.extend(_lines(
+            entry, txn.account_id, counter_ledger(txn.transaction_type), delta, txn.balance_after_transaction
+        ))
+    JournalLine.objects.bulk_create(lines, batch_size=BULK_BATCH_SIZE)
+
+
+@dataclass
+class Drift:
+    account_id: int
+    account_no: int
+    balance: Decimal
+    journal_balance: Decimal
+
+    @property
+    def difference(self):
+        return self.balance - self.journal_balance
+
+
+def journal_balance():
+    """Sum of the customer journal lines of the outer account, 0 when there are none."""
+    money = DecimalField(max_digits=12, decimal_places=2)
+    total = (
+        JournalLine.objects.filter(account=OuterRef('pk'), ledger=LEDGER_CUSTOMER)
+        .order_by()
+        .values('account')
+        .annotate(total=Sum('amount'))
+        .values('total')
+    )
+    return Coalesce(Subquery(total, output_field=money), Value(Decimal(0)), output_field=money)
+
+
+def find_drift(account_ids):
+    """
+    Accounts among account_ids whose stored balance differs from their
+    journal sum. One statement, so balance and journal are read from the
+    same snapshot and a concurrent posting can not show up as drift.
+    """
+    rows = (
+        UserBankAccount.objects.filter(pk__in=account_ids)
+        .annotate(journal_balance=journal_balance())
+        .exclude(balance=F('journal_balance'))
+        .values_list('pk', 'account_no', 'balance', 'journal_balance')
+    )
+    return [Drift(*row) for row in rows]
+
+
+def unbalanced_entries(first_id, last_id):
+    """Ids of entries in [first_id, last_id] whose lines do not sum to zero."""
+    return list(
+        JournalLine.objects.filter(entry_id__gte=first_id, entry_id__lte=last_id)
+        .order_by()
+        .values('entry_id')
+        .annotate(total=Sum('amount'))
+        .exclude(total=0)
+        .values_list('entry_id', flat=True)
+    )
@@ -0,0 +1,53 @@
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions.interest import InterestError, accrue_interest, previous_month
+
+
+class Command(BaseCommand):
+    help = (
+        'Credit a month of interest on the average daily balance of every savings account. '
+        'Checkpointed per chunk: run it again to resume. Reads the daily balance snapshots, '
+        'so run rebuild_daily_balances once for history older than them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help='YYYY-MM, defaults to the previous month')
+        parser.add_argument('--rate', help='Yearly rate, defaults to SAVINGS_INTEREST_RATE')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--max-chunks', type=int, help='Stop after this many chunks, resume later')
+
+    def handle(self, *args, **options):
+        if options['month']:
+            try:
+                period = date.fromisoformat(options['month'] + '-01')
+            except ValueError:
+                raise CommandError('--month must look like 2024-05')
+        else:
+            period = previous_month()
+
+        rate = options['rate']
+        if rate is not None:
+            try:
+                rate = Decimal(rate)
+            except InvalidOperation:
+                raise CommandError('--rate must be a number like 0.035')
+            if not (rate.is_finite() and 0 < rate < 1):
+                raise CommandError('--rate is a yearly fraction between 0 and 1, e.g. 0.035')
+
+        def on_chunk(last_account_id, credited, total):
+            self.stdout.write(f'Accounts up to id {last_account_id}: credited {credited}, BDT {total}')
+
+        try:
+            run = accrue_interest(
+                period, rate=rate, chunk_size=options['chunk_size'],
+                max_chunks=options['max_chunks'], on_chunk=on_chunk,
+            )
+        except InterestError as exc:
+            raise CommandError(str(exc))
+        state = 'finished' if run.finished_at else f'paused after account id {run.last_account_id}'
+        self.stdout.write(self.style.SUCCESS(
+            f'{run} {state}: {run.accounts} accounts credited BDT {run.total_interest} at {run.rate}'
+        ))
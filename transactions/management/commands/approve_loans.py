@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from transactions.approval import approve_pending_loans
+from transactions.models import Loan
+
+
+class Command(BaseCommand):
+    help = 'Approve and disburse pending loans in batches, oldest request first, within the open loan limit'
+
+    def add_arguments(self, parser):
+        parser.add_argument('account_no', nargs='*', type=int, help='Only approve loans of these accounts')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        loans = Loan.objects.all()
+        if options['account_no']:
+            loans = loans.filter(account__account_no__in=options['account_no'])
+
+        def on_chunk(result):
+            self.stdout.write(f'{result.approved} approved, {result.over_limit} over the limit ({result.elapsed:.1f}s)')
+
+        result = approve_pending_loans(loans, chunk_size=options['chunk_size'], on_chunk=on_chunk)
+        self.stdout.write(self.style.SUCCESS(
+            f'Approved {result.approved} loans, left {result.over_limit} pending over the limit '
+            f'in {result.elapsed:.2f}s'
+        ))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions.archive import archive_cutoff, archive_transactions
+
+
+class Command(BaseCommand):
+    help = 'Move transactions older than the archive horizon to the archive table in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Archive horizon in days (default TRANSACTION_ARCHIVE_DAYS)')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options['days'] is not None and options['days'] < 1:
+            raise CommandError('--days must be at least 1')
+        cutoff = archive_cutoff(options['days'])
+
+        def on_chunk(result):
+            self.stdout.write(f'{result.moved} rows moved in {result.chunks} chunks ({result.elapsed:.1f}s)')
+
+        result = archive_transactions(cutoff, chunk_size=options['chunk_size'], on_chunk=on_chunk)
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {result.moved} transactions before {cutoff:%Y-%m-%d} in {result.elapsed:.2f}s'
+        ))
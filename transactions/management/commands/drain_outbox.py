@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from transactions.outbox import drain_outbox, purge_sent, run_worker
+
+
+class Command(BaseCommand):
+    help = (
+        'Deliver the posting notifications waiting in the outbox through NOTIFICATION_SENDER. '
+        'Runs until stopped, or drains once with --once.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain what is due and exit')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--workers', type=int, default=4, help='Sender threads')
+        parser.add_argument('--poll-interval', type=float, default=5, help='Seconds to sleep when the outbox is empty')
+        parser.add_argument('--purge-days', type=int, help='First delete events delivered more than this many days ago')
+
+    def handle(self, *args, **options):
+        if options['purge_days'] is not None:
+            purged = purge_sent(timezone.now() - timedelta(days=options['purge_days']))
+            self.stdout.write(f'Purged {purged} delivered events')
+
+        def report(result):
+            self.stdout.write(
+                f'{result.sent} sent, {result.failed} failed ({result.gave_up} given up) in {result.batches} batches'
+            )
+
+        if options['once']:
+            report(drain_outbox(batch_size=options['batch_size'], workers=options['workers']))
+            return
+        try:
+            run_worker(
+                poll_interval=options['poll_interval'], batch_size=options['batch_size'],
+                workers=options['workers'], on_drain=report,
+            )
+        except KeyboardInterrupt:
+            pass
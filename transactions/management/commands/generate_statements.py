@@ -0,0 +1,52 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import UserBankAccount
+from transactions.interest import previous_month
+from transactions.statements import FORMATS, StatementError, generate_statements
+
+
+class Command(BaseCommand):
+    help = (
+        'Write a monthly statement file per account with a pool of worker processes. '
+        'Finished statements are skipped, so an interrupted run can simply be started again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('account_no', nargs='*', type=int, help='Only these accounts')
+        parser.add_argument('--month', help='YYYY-MM, defaults to the previous month')
+        parser.add_argument('--output', default='statements', help='Directory the YYYY-MM folders go in')
+        parser.add_argument('--format', choices=FORMATS, default='html', help='pdf needs weasyprint')
+        parser.add_argument('--workers', type=int, help='Worker processes, defaults to one per core')
+        parser.add_argument('--chunk-size', type=int, default=200, help='Accounts per worker task')
+        parser.add_argument('--force', action='store_true', help='Rewrite statements that already exist')
+
+    def handle(self, *args, **options):
+        if options['month']:
+            try:
+                period = date.fromisoformat(options['month'] + '-01')
+            except ValueError:
+                raise CommandError('--month must look like 2024-05')
+        else:
+            period = previous_month()
+
+        accounts = UserBankAccount.objects.all()
+        if options['account_no']:
+            accounts = accounts.filter(account_no__in=options['account_no'])
+
+        def on_chunk(result):
+            self.stdout.write(f'{result.written} written, {result.skipped} skipped ({result.elapsed:.1f}s)')
+
+        try:
+            result = generate_statements(
+                period, options['output'], accounts=accounts, workers=options['workers'],
+                chunk_size=options['chunk_size'], fmt=options['format'], force=options['force'],
+                on_chunk=on_chunk,
+            )
+        except StatementError as exc:
+            raise CommandError(exc)
+        self.stdout.write(self.style.SUCCESS(
+            f'{period:%Y-%m}: wrote {result.written} statements ({result.rows} rows), '
+            f'skipped {result.skipped} in {result.elapsed:.2f}s'
+        ))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions.batch import post_batch, read_records
+
+
+class Command(BaseCommand):
+    help = 'Post a csv/jsonl file of (account_no, type, amount) records in chunked bulk inserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--rejects', help='Write rejected lines to this file instead of stderr')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+
+        rejects = open(options['rejects'], 'w') if options['rejects'] else None
+
+        def on_reject(line_no, reason):
+            message = f'line {line_no}: {reason}\n'
+            if rejects:
+                rejects.write(message)
+            else:
+                self.stderr.write(message, ending='')
+
+        try:
+            with open(path, newline='') as stream:
+                result = post_batch(
+                    read_records(stream, fmt), chunk_size=options['chunk_size'], on_reject=on_reject
+                )
+        except OSError as exc:
+            raise CommandError(exc)
+        finally:
+            if rejects:
+                rejects.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Posted {result.posted} records, rejected {result.rejected} '
+            f'in {result.elapsed:.2f}s ({result.throughput:,.0f} postings/s)'
+        ))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import UserBankAccount
+from transactions.snapshots import SnapshotError, rebuild_daily_balances
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-account daily balance snapshots from the transaction history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('account_no', nargs='*', type=int, help='Only rebuild these accounts')
+        parser.add_argument('--accounts-per-chunk', type=int, default=500)
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        accounts = UserBankAccount.objects.order_by('pk')
+        if options['account_no']:
+            accounts = accounts.filter(account_no__in=options['account_no'])
+
+        step = options['accounts_per_chunk']
+        account_ids = accounts.values_list('pk', flat=True)
+        last_pk = 0
+        written = 0
+        while True:
+            # walk the accounts by primary key so every chunk is its own transaction
+            chunk = list(account_ids.filter(pk__gt=last_pk)[:step])
+            if not chunk:
+                break
+            try:
+                written += rebuild_daily_balances(chunk, chunk_size=options['chunk_size'])
+            except SnapshotError as exc:
+                raise CommandError(exc)
+            last_pk = chunk[-1]
+            self.stdout.write(f'Rebuilt accounts up to id {last_pk} ({written} snapshot rows)')
+
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} daily balance rows'))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+
+from accounts.models import UserBankAccount
+from transactions.journal import find_drift, unbalanced_entries
+from transactions.models import JournalEntry
+
+
+class Command(BaseCommand):
+    help = 'Compare every account balance with its journal sum and check that every journal entry balances'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--accounts-per-chunk', type=int, default=1000)
+        parser.add_argument('--entries-per-chunk', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        problems = 0
+
+        account_ids = UserBankAccount.objects.order_by('pk').values_list('pk', flat=True)
+        step = options['accounts_per_chunk']
+        last_pk = 0
+        checked = 0
+        while True:
+            # walk the accounts by primary key, the db sums each chunk's journal
+            chunk = list(account_ids.filter(pk__gt=last_pk)[:step])
+            if not chunk:
+                break
+            for drift in find_drift(chunk):
+                problems += 1
+                self.stderr.write(
+                    f'account {drift.account_no}: balance {drift.balance}, '
+                    f'journal {drift.journal_balance} (drift {drift.difference})'
+                )
+            checked += len(chunk)
+            last_pk = chunk[-1]
+        self.stdout.write(f'Checked {checked} accounts')
+
+        last_entry = JournalEntry.objects.aggregate(last=Max('pk'))['last'] or 0
+        step = options['entries_per_chunk']
+        for first_id in range(1, last_entry + 1, step):
+            for entry_id in unbalanced_entries(first_id, first_id + step - 1):
+                problems += 1
+                self.stderr.write(f'journal entry {entry_id} does not balance')
+        self.stdout.write(f'Checked journal entries up to id {last_entry}')
+
+        if problems:
+            raise CommandError(f'{problems} ledger problems found')
+        self.stdout.write(self.style.SUCCESS('Ledger reconciles'))
@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts.models import UserBankAccount
+from transactions.velocity import bucket_of, longest_window, purge_counters, replay_counters
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the velocity rule counters from the transaction history and drop expired buckets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('account_no', nargs='*', type=int, help='Only replay these accounts')
+        parser.add_argument('--hours', type=int, help='History to replay (default: the longest rule window)')
+        parser.add_argument('--accounts-per-chunk', type=int, default=500)
+
+    def handle(self, *args, **options):
+        hours = options['hours'] or longest_window()
+        if not hours:
+            raise CommandError('No VELOCITY_RULES configured, nothing to replay')
+        # from the start of the hour the window begins in, its bucket is counted in part
+        since = bucket_of(timezone.now() - timedelta(hours=hours))
+
+        accounts = UserBankAccount.objects.order_by('pk')
+        if options['account_no']:
+            accounts = accounts.filter(account_no__in=options['account_no'])
+
+        step = options['accounts_per_chunk']
+        account_ids = accounts.values_list('pk', flat=True)
+        last_pk = 0
+        written = 0
+        while True:
+            # one db transaction per chunk of accounts, walked by primary key
+            chunk = list(account_ids.filter(pk__gt=last_pk)[:step])
+            if not chunk:
+                break
+            written += replay_counters(chunk, since)
+            last_pk = chunk[-1]
+            self.stdout.write(f'Replayed accounts up to id {last_pk} ({written} counter rows)')
+
+        purged = purge_counters(since)
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {written} velocity counter rows for the last {hours}h, dropped {purged} expired ones'
+        ))
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.15 on 2026-10-18 18:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_userbankaccount_open_loans'),
+        ('transactions', '0003_dailybalance'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Loan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('principal', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('outstanding', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('status', models.IntegerField(choices=[(1, 'Pending'), (2, 'Approved'), (3, 'Repaid')], default=1)),
+                ('requested_at', models.DateTimeField(auto_now_add=True)),
+                ('approved_at', models.DateTimeField(blank=True, null=True)),
+                ('repaid_at', models.DateTimeField(blank=True, null=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='loans', to='accounts.userbankaccount')),
+            ],
+            options={
+                'ordering': ['-requested_at', '-id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='loan',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='postings', to='transactions.loan'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['account', 'status'], name='loan_account_status_idx'),
+        ),
+    ]
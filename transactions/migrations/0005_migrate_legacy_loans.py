@@ -0,0 +1,82 @@
+from django.db import migrations
+from django.db.models import Count
+
+# values frozen from transactions.constants at the time of this migration
+LOAN = 3
+LOAN_PAID = 4
+LOAN_PENDING = 1
+LOAN_APPROVED = 2
+LOAN_REPAID = 3
+
+# rows per bulk statement, under sqlite's bound parameter limit
+BULK_BATCH_SIZE = 300
+
+
+def forwards(apps, schema_editor):
+    """
+    Before the Loan model a loan was a single Transaction row: type LOAN with
+    loan_approve False while pending, True once credited, and rewritten to
+    LOAN_PAID on repayment. Give every such row a Loan and fill the
+    per-account open loan counter. Pending rows never moved money, so they
+    are replaced by their Loan instead of staying in the history.
+    """
+    Transaction = apps.get_model('transactions', 'Transaction')
+    Loan = apps.get_model('transactions', 'Loan')
+    UserBankAccount = apps.get_model('accounts', 'UserBankAccount')
+
+    # read up front: the rows are deleted and updated below
+    legacy = list(
+        Transaction.objects.filter(transaction_type__in=[LOAN, LOAN_PAID], loan__isnull=True)
+        .order_by('id')
+        .values_list('id', 'account_id', 'amount', 'transaction_type', 'loan_approve', 'timestamp')
+    )
+    loans = []
+    for _, account_id, amount, transaction_type, loan_approve, timestamp in legacy:
+        if transaction_type == LOAN_PAID:
+            status, outstanding = LOAN_REPAID, 0
+        elif loan_approve:
+            status, outstanding = LOAN_APPROVED, amount
+        else:
+            status, outstanding = LOAN_PENDING, 0
+        loans.append(Loan(
+            account_id=account_id, principal=amount, outstanding=outstanding, status=status,
+            approved_at=timestamp if status != LOAN_PENDING else None,
+        ))
+    if schema_editor.connection.features.can_return_rows_from_bulk_insert:
+        Loan.objects.bulk_create(loans, batch_size=BULK_BATCH_SIZE)
+    else:
+        for loan in loans:
+            loan.save()
+
+    # auto_now_add ignores requested_at on insert, bulk_update sets it as is
+    for loan, row in zip(loans, legacy):
+        loan.requested_at = row[-1]
+    Loan.objects.bulk_update(loans, ['requested_at'], batch_size=BULK_BATCH_SIZE)
+
+    pending = [row[0] for row, loan in zip(legacy, loans) if loan.status == LOAN_PENDING]
+    for start in range(0, len(pending), BULK_BATCH_SIZE):
+        Transaction.objects.filter(pk__in=pending[start:start + BULK_BATCH_SIZE]).delete()
+    Transaction.objects.bulk_update(
+        [Transaction(pk=row[0], loan_id=loan.pk) for row, loan in zip(legacy, loans) if loan.status != LOAN_PENDING],
+        ['loan'],
+        batch_size=BULK_BATCH_SIZE,
+    )
+
+    counts = (
+        Loan.objects.filter(status=LOAN_APPROVED)
+        .values('account_id')
+        .annotate(open_loans=Count('id'))
+    )
+    for row in counts:
+        UserBankAccount.objects.filter(pk=row['account_id']).update(open_loans=row['open_loans'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0004_loan'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations
+
+# values frozen from transactions.constants at the time of this migration
+LEDGER_CUSTOMER = 'customer'
+LEDGER_SUSPENSE = 'suspense'
+CHUNK_SIZE = 500
+
+
+def forwards(apps, schema_editor):
+    """
+    Open the journal with one entry per account that already holds money,
+    so the journal sum of every account starts equal to its balance. The
+    earlier history stays in Transaction; the journal covers postings from
+    here on.
+    """
+    UserBankAccount = apps.get_model('accounts', 'UserBankAccount')
+    JournalEntry = apps.get_model('transactions', 'JournalEntry')
+    JournalLine = apps.get_model('transactions', 'JournalLine')
+
+    accounts = UserBankAccount.objects.exclude(balance=0).order_by('pk').values_list('pk', 'balance')
+    last_pk = 0
+    while True:
+        chunk = list(accounts.filter(pk__gt=last_pk)[:CHUNK_SIZE])
+        if not chunk:
+            break
+        entries = JournalEntry.objects.bulk_create(
+            [JournalEntry(memo='Opening balance') for _ in chunk]
+        )
+        lines = []
+        for entry, (account_id, balance) in zip(entries, chunk):
+            lines.append(JournalLine(
+                entry_id=entry.pk, ledger=LEDGER_CUSTOMER, account_id=account_id,
+                amount=balance, balance_after=balance,
+            ))
+            lines.append(JournalLine(entry_id=entry.pk, ledger=LEDGER_SUSPENSE, amount=-balance))
+        JournalLine.objects.bulk_create(lines)
+        last_pk = chunk[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_account_number_sequence'),
+        ('transactions', '0006_journal'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
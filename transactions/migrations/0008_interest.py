@@ -0,0 +1,59 @@
+# Generated by Django 5.1.15 on 2026-10-18 18:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_account_number_sequence'),
+        ('transactions', '0007_journal_opening_balances'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InterestRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField(unique=True)),
+                ('rate', models.DecimalField(decimal_places=4, max_digits=6)),
+                ('last_account_id', models.BigIntegerField(default=0)),
+                ('accounts', models.PositiveIntegerField(default=0)),
+                ('total_interest', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-period'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='journalentry',
+            name='transaction_type',
+            field=models.IntegerField(blank=True, choices=[(1, 'Deposite'), (2, 'Withdrawal'), (3, 'Loan'), (4, 'Loan Paid'), (5, 'Interest')], null=True),
+        ),
+        migrations.AlterField(
+            model_name='journalline',
+            name='ledger',
+            field=models.CharField(choices=[('customer', 'Customer deposits'), ('cash', 'Cash'), ('loans', 'Loans receivable'), ('suspense', 'Suspense'), ('interest', 'Interest expense')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='transaction_type',
+            field=models.IntegerField(choices=[(1, 'Deposite'), (2, 'Withdrawal'), (3, 'Loan'), (4, 'Loan Paid'), (5, 'Interest')]),
+        ),
+        migrations.CreateModel(
+            name='InterestAccrual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('average_balance', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='interest_accruals', to='accounts.userbankaccount')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='accruals', to='transactions.interestrun')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('run', 'account'), name='interest_accrual_run_account')],
+            },
+        ),
+    ]
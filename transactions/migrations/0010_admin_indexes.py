@@ -0,0 +1,26 @@
+# Generated by Django 5.1.15 on 2026-10-18 18:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_account_number_sequence'),
+        ('transactions', '0009_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['status', '-requested_at', '-id'], name='loan_status_requested_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['-timestamp', '-id'], name='transaction_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['transaction_type', '-timestamp', '-id'], name='transaction_type_ts_idx'),
+        ),
+    ]
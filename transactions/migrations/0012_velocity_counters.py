@@ -0,0 +1,29 @@
+# Generated by Django 5.1.15 on 2026-10-18 18:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_account_number_sequence'),
+        ('transactions', '0011_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VelocityCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_type', models.IntegerField(choices=[(1, 'Deposite'), (2, 'Withdrawal'), (3, 'Loan'), (4, 'Loan Paid'), (5, 'Interest')])),
+                ('bucket', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='velocity_counters', to='accounts.userbankaccount')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('account', 'transaction_type', 'bucket'), name='velocity_account_type_bucket')],
+            },
+        ),
+    ]
@@ -1,7 +1,38 @@
 from django.db import models
+from django.utils import timezone
+from django.contrib.auth.models import User
 from accounts.models import UserBankAccount
 
-from .constants import TRANSACTION_TYPE
+from .constants import TRANSACTION_TYPE, LOAN_STATUS, LOAN_PENDING, LOAN_APPROVED, LEDGERS
+
+class Loan(models.Model):
+    account = models.ForeignKey(UserBankAccount, related_name='loans', on_delete=models.CASCADE)
+
+    principal = models.DecimalField(decimal_places=2, max_digits=12)
+    outstanding = models.DecimalField(default=0, decimal_places=2, max_digits=12)
+    status = models.IntegerField(choices=LOAN_STATUS, default=LOAN_PENDING)
+    requested_at = models.DateTimeField(auto_now_add=True)
+    approved_at = models.DateTimeField(null=True, blank=True)
+    repaid_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-requested_at', '-id']
+        indexes = [
+            models.Index(fields=['account', 'status'], name='loan_account_status_idx'),
+            models.Index(fields=['status', '-requested_at', '-id'], name='loan_status_requested_idx'),
+        ]
+
+    def __str__(self):
+        return f'Loan {self.pk} ({self.account})'
+
+    @property
+    def is_pending(self):
+        return self.status == LOAN_PENDING
+
+    @property
+    def is_approved(self):
+        return self.status == LOAN_APPROVED
+
 
 class Transaction(models.Model):
     account = models.ForeignKey(UserBankAccount,related_name='transactions',on_delete=models.CASCADE)
@@ -11,6 +42,224 @@ class Transaction(models.Model):
     transaction_type = models.IntegerField(choices=TRANSACTION_TYPE)  
     timestamp = models.DateTimeField(auto_now_add=True)
     loan_approve = models.BooleanField(default=False)
+    # disbursement / repayment postings point at their loan
+    loan = models.ForeignKey(Loan, related_name='postings', null=True, blank=True, on_delete=models.SET_NULL)
     
     class Meta:
-        ordering = ['-timestamp']
+        ordering = ['-timestamp', '-id']
+        indexes = [
+            # report page keyset pagination: account filter + (timestamp, id) order
+            models.Index(fields=['account', '-timestamp', '-id'], name='transaction_account_ts_idx'),
+            # admin changelist: newest first overall and per transaction type
+            models.Index(fields=['-timestamp', '-id'], name='transaction_ts_idx'),
+            models.Index(fields=['transaction_type', '-timestamp', '-id'], name='transaction_type_ts_idx'),
+        ]
+
+
+class ArchivedTransaction(models.Model):
+    # Transaction rows older than the archive horizon, moved by archive_transactions
+    # with their ids, so journal entries still point at them
+    id = models.BigIntegerField(primary_key=True)
+    account = models.ForeignKey(UserBankAccount, related_name='archived_transactions', on_delete=models.CASCADE)
+
+    amount = models.DecimalField(decimal_places=2, max_digits=12)
+    balance_after_transaction = models.DecimalField(decimal_places=2, max_digits=12)
+    transaction_type = models.IntegerField(choices=TRANSACTION_TYPE)
+    timestamp = models.DateTimeField()
+    loan_approve = models.BooleanField(default=False)
+    loan = models.ForeignKey(Loan, related_name='archived_postings', null=True, blank=True, on_delete=models.SET_NULL)
+
+    class Meta:
+        ordering = ['-timestamp', '-id']
+        indexes = [
+            models.Index(fields=['account', '-timestamp', '-id'], name='archive_account_ts_idx'),
+        ]
+
+
+class ArchiveRun(models.Model):
+    # every Transaction older than cutoff is moved (or being moved) to ArchivedTransaction;
+    # the latest cutoff tells the report pages whether a date range needs the archive
+    cutoff = models.DateTimeField(unique=True)
+    moved = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-cutoff']
+
+    def __str__(self):
+        return f'Archive before {self.cutoff:%Y-%m-%d}'
+
+
+class DailyBalance(models.Model):
+    account = models.ForeignKey(UserBankAccount, related_name='daily_balances', on_delete=models.CASCADE)
+
+    date = models.DateField()
+    opening_balance = models.DecimalField(default=0, decimal_places=2, max_digits=12)
+    credits = models.DecimalField(default=0, decimal_places=2, max_digits=12)
+    debits = models.DecimalField(default=0, decimal_places=2, max_digits=12)
+    closing_balance = models.DecimalField(default=0, decimal_places=2, max_digits=12)
+
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'date'], name='daily_balance_account_date'),
+        ]
+
+    def __str__(self):
+        return f'{self.account} {self.date}'
+
+
+class InterestRun(models.Model):
+    # one run per month, last_account_id is the checkpoint a resumed run starts after
+    period = models.DateField(unique=True)
+    rate = models.DecimalField(decimal_places=4, max_digits=6)
+    last_account_id = models.BigIntegerField(default=0)
+    accounts = models.PositiveIntegerField(default=0)
+    total_interest = models.DecimalField(default=0, decimal_places=2, max_digits=14)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-period']
+
+    def __str__(self):
+        return f'Interest {self.period:%Y-%m}'
+
+
+class InterestAccrual(models.Model):
+    run = models.ForeignKey(InterestRun, related_name='accruals', on_delete=models.CASCADE)
+    account = models.ForeignKey(UserBankAccount, related_name='interest_accruals', on_delete=models.CASCADE)
+    average_balance = models.DecimalField(decimal_places=2, max_digits=14)
+    amount = models.DecimalField(decimal_places=2, max_digits=12)
+
+    class Meta:
+        constraints = [
+            # an account is credited at most once per run
+            models.UniqueConstraint(fields=['run', 'account'], name='interest_accrual_run_account'),
+        ]
+
+
+class VelocityCounter(models.Model):
+    # postings of one type on one account within one UTC hour; the velocity
+    # rules sum the last few buckets instead of the transaction history
+    account = models.ForeignKey(UserBankAccount, related_name='velocity_counters', on_delete=models.CASCADE)
+    transaction_type = models.IntegerField(choices=TRANSACTION_TYPE)
+    bucket = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+    total = models.DecimalField(default=0, decimal_places=2, max_digits=14)
+
+    class Meta:
+        constraints = [
+            # also the index the window query reads
+            models.UniqueConstraint(fields=['account', 'transaction_type', 'bucket'], name='velocity_account_type_bucket'),
+        ]
+
+    def __str__(self):
+        return f'{self.account} {self.get_transaction_type_display()} {self.bucket:%Y-%m-%d %H}h'
+
+
+class AppendOnlyError(Exception):
+    pass
+
+
+class AppendOnlyQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        raise AppendOnlyError(f'{self.model.__name__} rows can not be updated')
+
+    def delete(self):
+        raise AppendOnlyError(f'{self.model.__name__} rows can not be deleted')
+
+
+class AppendOnlyModel(models.Model):
+    objects = AppendOnlyQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise AppendOnlyError(f'{type(self).__name__} rows can not be updated')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise AppendOnlyError(f'{type(self).__name__} rows can not be deleted')
+
+
+class JournalEntry(AppendOnlyModel):
+    # no db constraint on the transaction: the journal outlives archived postings
+    transaction = models.ForeignKey(
+        Transaction, related_name='journal_entries', null=True, blank=True,
+        on_delete=models.DO_NOTHING, db_constraint=False,
+    )
+    transaction_type = models.IntegerField(choices=TRANSACTION_TYPE, null=True, blank=True)
+    memo = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = 'journal entries'
+
+    def __str__(self):
+        return f'Entry {self.pk}'
+
+
+class JournalLine(AppendOnlyModel):
+    entry = models.ForeignKey(JournalEntry, related_name='lines', on_delete=models.PROTECT)
+
+    ledger = models.CharField(max_length=20, choices=LEDGERS)
+    # set on customer ledger lines only
+    account = models.ForeignKey(
+        UserBankAccount, related_name='journal_lines', null=True, blank=True, on_delete=models.PROTECT
+    )
+    # signed, the lines of an entry sum to zero; positive raises the customer balance
+    amount = models.DecimalField(decimal_places=2, max_digits=12)
+    balance_after = models.DecimalField(decimal_places=2, max_digits=12, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['account', 'id'], name='journal_line_account_idx'),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    # one row per client token; status_code stays null while the first request is still running
+    user = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    key = models.CharField(max_length=64)
+    fingerprint = models.CharField(max_length=32)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    location = models.CharField(max_length=255, blank=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_user_key'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}:{self.key}'
+
+
+class OutboxEvent(models.Model):
+    # written in the posting's db transaction, delivered later by drain_outbox;
+    # available_at is null once delivery is given up on
+    topic = models.CharField(max_length=50)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now, null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.CharField(max_length=255, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # only undelivered events are indexed, the drain query never reads sent ones
+            models.Index(
+                fields=['available_at', 'id'], name='outbox_due_idx', condition=models.Q(sent_at__isnull=True)
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.topic} {self.pk}'
@@ -0,0 +1,218 @@
+"""
+Transactional outbox for the side work of a posting (email/SMS receipts).
+The posting writes an OutboxEvent in its own db transaction, so an event
+exists exactly when the posting committed; drain_outbox() delivers the
+events later, outside the request, through the NOTIFICATION_SENDER.
+
+Delivery is at least once: an event is leased while it is being sent and
+only marked sent afterwards, so a crashed worker's events come back when
+the lease runs out. Receivers dedupe on Notification.event_id.
+"""
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.db import BULK_BATCH_SIZE
+from .export import TRANSACTION_TYPE_NAMES
+from .models import ArchivedTransaction, OutboxEvent, Transaction
+
+POSTING_CREATED = 'posting.created'
+
+
+def posting_event(txn):
+    return OutboxEvent(topic=POSTING_CREATED, payload={
+        'transaction_id': txn.pk,
+        'account_id': txn.account_id,
+        'transaction_type': txn.transaction_type,
+        'amount': str(txn.amount),
+    })
+
+
+def enqueue_posting(txn):
+    """Queue the receipt of a saved posting; call it inside the posting's db transaction."""
+    posting_event(txn).save()
+
+
+def enqueue_postings(txns):
+    OutboxEvent.objects.bulk_create([posting_event(txn) for txn in txns], batch_size=BULK_BATCH_SIZE)
+
+
+@dataclass
+class Notification:
+    event_id: int
+    recipient: str
+    subject: str
+    body: str
+
+
+class ConsoleSender:
+    """Prints one JSON line per notification; the local stand-in for email/SMS."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def send(self, notification):
+        line = json.dumps(asdict(notification)) + '\n'
+        with self._lock:
+            self.stream.write(line)
+
+
+class FileSender(ConsoleSender):
+    """Appends one JSON line per notification to NOTIFICATION_FILE."""
+
+    def __init__(self, path=None):
+        super().__init__()
+        self.path = path or settings.NOTIFICATION_FILE
+
+    def send(self, notification):
+        line = json.dumps(asdict(notification)) + '\n'
+        with self._lock, open(self.path, 'a', encoding='utf-8') as out:
+            out.write(line)
+
+
+def get_sender():
+    return import_string(settings.NOTIFICATION_SENDER)()
+
+
+def build_notifications(events):
+    """{event_id: Notification}, or None for events with nobody to notify."""
+    transaction_ids = [event.payload['transaction_id'] for event in events if event.topic == POSTING_CREATED]
+    postings = Transaction.objects.select_related('account__user').in_bulk(transaction_ids)
+    # a posting archived before its event went out keeps its id in the archive
+    archived = [pk for pk in transaction_ids if pk not in postings]
+    if archived:
+        postings.update(ArchivedTransaction.objects.select_related('account__user').in_bulk(archived))
+    notifications = {}
+    for event in events:
+        txn = postings.get(event.payload.get('transaction_id'))
+        if txn is None or not txn.account.user.email:
+            notifications[event.pk] = None
+            continue
+        kind = TRANSACTION_TYPE_NAMES.get(txn.transaction_type, txn.transaction_type)
+        notifications[event.pk] = Notification(
+            event_id=event.pk,
+            recipient=txn.account.user.email,
+            subject=f'{kind} of BDT {txn.amount:,.2f}',
+            body=(
+                f'{kind} of BDT {txn.amount:,.2f} on account {txn.account.account_no}. '
+                f'Balance: BDT {txn.balance_after_transaction:,.2f}'
+            ),
+        )
+    return notifications
+
+
+def backoff(attempts):
+    """Seconds before the next try after attempts failures: doubling, capped, with jitter."""
+    delay = min(settings.OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1), settings.OUTBOX_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.5, 1)
+
+
+def claim_batch(batch_size, lease):
+    """Lease up to batch_size due events; other drain workers skip them until the lease runs out."""
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True)
+            .filter(sent_at__isnull=True, available_at__lte=now)
+            .order_by('available_at', 'id')[:batch_size]
+        )
+        if events:
+            OutboxEvent.objects.filter(pk__in=[event.pk for event in events]).update(available_at=now + lease)
+    return events
+
+
+@dataclass
+class DrainResult:
+    sent: int = 0
+    failed: int = 0
+    # failed max attempts times, left in the table with available_at null
+    gave_up: int = 0
+    batches: int = 0
+
+
+def _settle(events, errors, result):
+    now = timezone.now()
+    delivered = [event.pk for event in events if event.pk not in errors]
+    OutboxEvent.objects.filter(pk__in=delivered).update(
+        sent_at=now, attempts=F('attempts') + 1, last_error=''
+    )
+    result.sent += len(delivered)
+    for event in events:
+        if event.pk not in errors:
+            continue
+        attempts = event.attempts + 1
+        give_up = attempts >= settings.OUTBOX_MAX_ATTEMPTS
+        OutboxEvent.objects.filter(pk=event.pk).update(
+            attempts=attempts,
+            last_error=errors[event.pk][:255],
+            available_at=None if give_up else now + timedelta(seconds=backoff(attempts)),
+        )
+        result.failed += 1
+        result.gave_up += give_up
+
+
+def drain_outbox(batch_size=100, workers=4, max_batches=None, sender=None, lease=timedelta(minutes=5)):
+    """
+    Deliver due events until none are left (or max_batches): each leased
+    batch is sent by a pool of threads, then settled with one UPDATE for
+    the delivered events and one per failure.
+    """
+    sender = sender or get_sender()
+    result = DrainResult()
+
+    def deliver(item):
+        event, notification = item
+        if notification is None:
+            return event.pk, None
+        try:
+            sender.send(notification)
+        except Exception as exc:
+            return event.pk, f'{type(exc).__name__}: {exc}'
+        return event.pk, None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while max_batches is None or result.batches < max_batches:
+            events = claim_batch(batch_size, lease)
+            if not events:
+                break
+            notifications = build_notifications(events)
+            outcomes = pool.map(deliver, [(event, notifications[event.pk]) for event in events])
+            errors = {pk: error for pk, error in outcomes if error}
+            _settle(events, errors, result)
+            result.batches += 1
+    return result
+
+
+def run_worker(poll_interval=5, batch_size=100, workers=4, sender=None, on_drain=None, stop=None):
+    """Drain forever, sleeping poll_interval seconds whenever the outbox is empty."""
+    sender = sender or get_sender()
+    while not (stop and stop()):
+        result = drain_outbox(batch_size=batch_size, workers=workers, sender=sender)
+        if on_drain and result.batches:
+            on_drain(result)
+        if not result.batches:
+            time.sleep(poll_interval)
+
+
+def purge_sent(older_than, batch_size=1000):
+    """Delete events delivered before older_than in batches; returns how many went."""
+    purged = 0
+    while True:
+        batch = list(
+            OutboxEvent.objects.filter(sent_at__lt=older_than).values_list('pk', flat=True)[:batch_size]
+        )
+        if not batch:
+            return purged
+        purged += OutboxEvent.objects.filter(pk__in=batch).delete()[0]
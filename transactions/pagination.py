@@ -0,0 +1,83 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(transaction):
+    raw = f'{transaction.timestamp.isoformat()}|{transaction.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(timestamp), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor(cursor)
+
+
+def keyset_filter(queryset, cursor=None):
+    queryset = queryset.order_by('-timestamp', '-id')
+    if cursor:
+        timestamp, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk)
+        )
+    return queryset
+
+
+def split_page(rows, page_size):
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1])
+    return rows, next_cursor
+
+
+def keyset_page(queryset, cursor=None, page_size=50, older=None):
+    """
+    Keyset pagination over (timestamp, id). No OFFSET is used, so a page deep
+    in the history costs the same as the first one.
+    older() may return a queryset of rows that are all older than the ones
+    of queryset (the archive), or None; it is only called when queryset runs
+    out before the page is full.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    rows = list(keyset_filter(queryset, cursor)[:page_size + 1])
+    if older is not None and len(rows) <= page_size:
+        older_rows = older()
+        if older_rows is not None:
+            rows += list(keyset_filter(older_rows, cursor)[:page_size + 1 - len(rows)])
+    return split_page(rows, page_size)
+
+
+async def akeyset_page(queryset, cursor=None, page_size=50, older=None):
+    # older is a coroutine function here
+    rows = [row async for row in keyset_filter(queryset, cursor)[:page_size + 1]]
+    if older is not None and len(rows) <= page_size:
+        older_rows = await older()
+        if older_rows is not None:
+            rows += [row async for row in keyset_filter(older_rows, cursor)[:page_size + 1 - len(rows)]]
+    return split_page(rows, page_size)
+
+
+def page_links(query, next_cursor):
+    """Query strings for the "older" and "newest" links, keeping the other filters."""
+    next_page_query = None
+    if next_cursor:
+        params = query.copy()
+        params['cursor'] = next_cursor
+        next_page_query = params.urlencode()
+
+    first_page_query = None
+    if 'cursor' in query:
+        params = query.copy()
+        del params['cursor']
+        first_page_query = params.urlencode()
+    return next_page_query, first_page_query
@@ -0,0 +1,164 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Subquery
+from django.utils import timezone
+
+from accounts.models import UserBankAccount
+from accounts.summary import invalidate_account_summary
+from .constants import (
+    DEPOSIT,
+    WITHDRAWAL,
+    LOAN,
+    LOAN_PAID,
+    INTEREST,
+    LOAN_PENDING,
+    LOAN_APPROVED,
+    LOAN_REPAID,
+    MAX_OPEN_LOANS,
+)
+from .journal import record_entry
+from .models import Loan, Transaction
+from .outbox import enqueue_posting
+from .snapshots import record_daily_balance
+from .velocity import broken_rule, record_posting
+from .write_queue import serialized
+
+
+class PostingError(Exception):
+    pass
+
+
+class InsufficientFunds(PostingError):
+    pass
+
+
+class LoanNotPayable(PostingError):
+    pass
+
+
+class LoanLimitExceeded(PostingError):
+    pass
+
+
+class VelocityLimitExceeded(PostingError):
+    def __init__(self, rule):
+        super().__init__(rule.message)
+        self.rule = rule
+
+
+def balance_delta(transaction_type, amount, loan_approve=False):
+    if transaction_type in (DEPOSIT, INTEREST) or (transaction_type == LOAN and loan_approve):
+        return amount
+    if transaction_type in (WITHDRAWAL, LOAN_PAID):
+        return -amount
+    # loan request that is not approved yet does not move money
+    return Decimal(0)
+
+
+def current_balance(account_id):
+    """SQL expression for the account balance as seen inside the current transaction."""
+    return Subquery(UserBankAccount.objects.filter(pk=account_id).values('balance')[:1])
+
+
+def _expire(instance, field_name):
+    # drop the stale in-memory value; the next attribute access reloads it from the db
+    instance.__dict__.pop(field_name, None)
+
+
+def move_balance(account, delta):
+    """
+    Apply delta to the account balance as one conditional UPDATE.
+    Debits only match while balance >= amount, so concurrent withdrawals
+    can never take the balance below zero. Callers must be inside an atomic
+    block so the daily snapshot moves together with the balance.
+    """
+    if not delta:
+        return
+    accounts = UserBankAccount.objects.filter(pk=account.pk)
+    if delta < 0:
+        accounts = accounts.filter(balance__gte=-delta)
+    if not accounts.update(balance=F('balance') + delta):
+        raise InsufficientFunds(f'Account {account.pk} has less than BDT {-delta}')
+    record_daily_balance(account.pk, delta)
+    _expire(account, 'balance')
+
+
+@serialized
+def post_transaction(txn, enforce_velocity=False):
+    """
+    Post an unsaved Transaction: move the balance, insert the row and journal
+    it in one db transaction. balance_after_transaction is filled by the
+    INSERT itself from the freshly updated balance, so no Python-side read
+    can race it.
+    With enforce_velocity the posting is refused (VelocityLimitExceeded) if
+    it breaks a VELOCITY_RULES rule; the check runs after the balance
+    UPDATE, which holds the account row until commit.
+    """
+    delta = balance_delta(txn.transaction_type, txn.amount, txn.loan_approve)
+    with transaction.atomic():
+        move_balance(txn.account, delta)
+        if enforce_velocity:
+            rule = broken_rule(txn.account_id, txn.transaction_type, txn.amount)
+            if rule:
+                raise VelocityLimitExceeded(rule)
+        record_posting(txn.account_id, txn.transaction_type, txn.amount)
+        txn.balance_after_transaction = current_balance(txn.account_id)
+        txn.save()
+        record_entry(txn, delta, current_balance(txn.account_id))
+        enqueue_posting(txn)
+        invalidate_account_summary(txn.account_id)
+    _expire(txn, 'balance_after_transaction')
+    return txn
+
+
+def request_loan(account, amount):
+    """
+    Open a pending loan. The limit check reads the denormalized counter
+    instead of counting loans; approve_loan enforces it again atomically.
+    """
+    if account.open_loans >= MAX_OPEN_LOANS:
+        raise LoanLimitExceeded(f'Account {account.pk} already has {MAX_OPEN_LOANS} open loans')
+    loan = Loan.objects.create(account=account, principal=amount)
+    invalidate_account_summary(account.pk)
+    return loan
+
+
+@serialized
+def approve_loan(loan):
+    """Mark a pending loan approved, bump the open loan counter and post the disbursement."""
+    with transaction.atomic():
+        approved = Loan.objects.filter(pk=loan.pk, status=LOAN_PENDING).update(
+            status=LOAN_APPROVED, outstanding=F('principal'), approved_at=timezone.now()
+        )
+        if not approved:
+            raise PostingError(f'Loan {loan.pk} is not pending')
+        counted = UserBankAccount.objects.filter(
+            pk=loan.account_id, open_loans__lt=MAX_OPEN_LOANS
+        ).update(open_loans=F('open_loans') + 1)
+        if not counted:
+            raise LoanLimitExceeded(f'Account {loan.account_id} already has {MAX_OPEN_LOANS} open loans')
+        post_transaction(Transaction(
+            account=loan.account, amount=loan.principal, transaction_type=LOAN, loan_approve=True, loan=loan
+        ))
+    loan.status = LOAN_APPROVED
+    loan.outstanding = loan.principal
+    return loan
+
+
+@serialized
+def repay_loan(loan):
+    """Debit the outstanding amount, close the loan and release its slot in the counter."""
+    with transaction.atomic():
+        settled = Loan.objects.filter(pk=loan.pk, status=LOAN_APPROVED).update(
+            status=LOAN_REPAID, outstanding=0, repaid_at=timezone.now()
+        )
+        if not settled:
+            raise LoanNotPayable(f'Loan {loan.pk} is not payable')
+        UserBankAccount.objects.filter(pk=loan.account_id).update(open_loans=F('open_loans') - 1)
+        post_transaction(Transaction(
+            account=loan.account, amount=loan.outstanding, transaction_type=LOAN_PAID, loan=loan
+        ))
+    loan.status = LOAN_REPAID
+    loan.outstanding = Decimal(0)
+    return loan
@@ -0,0 +1,202 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.utils import timezone
+
+from accounts.models import UserBankAccount
+from core.db import BULK_BATCH_SIZE
+from .models import ArchivedTransaction, DailyBalance, Transaction
+
+
+def _balance_of(account_ref):
+    return Subquery(UserBankAccount.objects.filter(pk=account_ref).values('balance')[:1])
+
+
+def record_daily_balance(account_id, delta, day=None):
+    """
+    Fold one balance movement into today's snapshot. Must run in the same db
+    transaction as the balance UPDATE, after it; closing_balance is copied
+    from the account row so it can never drift from the real balance.
+    """
+    if not delta:
+        return
+    day = day or timezone.localdate()
+    credit = delta if delta > 0 else Decimal(0)
+    debit = -delta if delta < 0 else Decimal(0)
+
+    snapshot = DailyBalance.objects.filter(account_id=account_id, date=day)
+    update = dict(
+        credits=F('credits') + credit,
+        debits=F('debits') + debit,
+        closing_balance=_balance_of(account_id),
+    )
+    if snapshot.update(**update):
+        return
+    try:
+        with transaction.atomic():
+            DailyBalance.objects.create(
+                account_id=account_id,
+                date=day,
+                opening_balance=_balance_of(account_id) - Value(delta),
+                credits=credit,
+                debits=debit,
+                closing_balance=_balance_of(account_id),
+            )
+    except IntegrityError:
+        # another posting created today's row first
+        snapshot.update(**update)
+
+
+def record_daily_balances(movements, day=None):
+    """
+    Bulk version of record_daily_balance for batch postings.
+    movements is {account_id: (credits, debits, closing_balance)} for balances
+    that are locked by the caller's transaction.
+    """
+    if not movements:
+        return
+    day = day or timezone.localdate()
+    existing = set(
+        DailyBalance.objects.filter(account_id__in=movements, date=day).values_list('account_id', flat=True)
+    )
+    money = DecimalField(max_digits=12, decimal_places=2)
+    updates = [(pk, movements[pk]) for pk in existing]
+    for start in range(0, len(updates), BULK_BATCH_SIZE):
+        batch = updates[start:start + BULK_BATCH_SIZE]
+        DailyBalance.objects.filter(account_id__in=[pk for pk, _ in batch], date=day).update(
+            credits=F('credits') + Case(*[When(account_id=pk, then=Value(m[0])) for pk, m in batch], output_field=money),
+            debits=F('debits') + Case(*[When(account_id=pk, then=Value(m[1])) for pk, m in batch], output_field=money),
+            closing_balance=Case(*[When(account_id=pk, then=Value(m[2])) for pk, m in batch], output_field=money),
+        )
+    DailyBalance.objects.bulk_create(
+        [
+            DailyBalance(
+                account_id=pk,
+                date=day,
+                opening_balance=closing - credits + debits,
+                credits=credits,
+                debits=debits,
+                closing_balance=closing,
+            )
+            for pk, (credits, debits, closing) in movements.items()
+            if pk not in existing
+        ],
+        batch_size=BULK_BATCH_SIZE,
+    )
+
+
+def _range_snapshots(account, start_date, end_date):
+    return DailyBalance.objects.filter(account=account, date__gte=start_date, date__lte=end_date)
+
+
+def _last_snapshot(account, end_date):
+    return DailyBalance.objects.filter(account=account, date__lte=end_date).order_by('-date')
+
+
+def _summary(totals, last):
+    credits = totals['credits'] or Decimal(0)
+    debits = totals['debits'] or Decimal(0)
+    closing = last.closing_balance if last else Decimal(0)
+    return {
+        'opening_balance': closing - credits + debits,
+        'credits': credits,
+        'debits': debits,
+        'closing_balance': closing,
+    }
+
+
+def range_summary(account, start_date, end_date):
+    """
+    Opening/closing balance and totals for [start_date, end_date] from at most
+    one snapshot row per day, instead of scanning the transactions.
+    """
+    return _summary(
+        _range_snapshots(account, start_date, end_date).aggregate(credits=Sum('credits'), debits=Sum('debits')),
+        _last_snapshot(account, end_date).first(),
+    )
+
+
+async def arange_summary(account, start_date, end_date):
+    return _summary(
+        await _range_snapshots(account, start_date, end_date).aaggregate(credits=Sum('credits'), debits=Sum('debits')),
+        await _last_snapshot(account, end_date).afirst(),
+    )
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def rebuild_daily_balances(account_ids, chunk_size=2000):
+    """
+    Recompute the snapshots of the given accounts from their Transaction
+    history, archived rows included. Rows are streamed newest first, per
+    account, and written back in chunks, so memory stays bounded whatever
+    the history size.
+
+    Closing balances are worked back from the account's balance through
+    each day's credits and debits, not copied from balance_after_transaction:
+    on legacy rows that is stale (repaid loans were relabelled LOAN_PAID
+    without it). Raises SnapshotError, rolling the rebuild back, when the
+    newest snapshot of an account does not match its balance at the end.
+    Returns the number of snapshot rows written.
+    """
+    from .services import balance_delta
+
+    fields = ['account_id', 'timestamp', 'id', 'transaction_type', 'amount', 'loan_approve']
+    written = 0
+    with transaction.atomic():
+        balances = dict(UserBankAccount.objects.filter(pk__in=account_ids).values_list('pk', 'balance'))
+        DailyBalance.objects.filter(account_id__in=account_ids).delete()
+        rows = (
+            Transaction.objects.filter(account_id__in=account_ids).order_by().values_list(*fields)
+            .union(
+                ArchivedTransaction.objects.filter(account_id__in=account_ids).order_by().values_list(*fields),
+                all=True,
+            )
+            .order_by('account_id', '-timestamp', '-id')
+            .iterator(chunk_size=chunk_size)
+        )
+        pending = []
+        current = None
+        for account_id, timestamp, _, transaction_type, amount, loan_approve in rows:
+            day = timezone.localdate(timestamp)
+            if current is None or current.account_id != account_id:
+                balance = balances[account_id]
+            if current is None or current.account_id != account_id or current.date != day:
+                # the balance at the end of this day, what the newer days have not moved yet
+                current = DailyBalance(account_id=account_id, date=day, closing_balance=balance)
+                pending.append(current)
+            delta = balance_delta(transaction_type, amount, loan_approve)
+            if delta > 0:
+                current.credits += delta
+            else:
+                current.debits -= delta
+            balance -= delta
+
+            if len(pending) > chunk_size:
+                written += _flush_snapshots(pending[:-1])
+                pending = pending[-1:]
+        written += _flush_snapshots(pending)
+
+        # a posting that came in meanwhile moved the balance away from the anchor
+        moved = list(
+            UserBankAccount.objects.filter(pk__in=account_ids)
+            .annotate(newest=Subquery(
+                DailyBalance.objects.filter(account=OuterRef('pk')).order_by('-date').values('closing_balance')[:1]
+            ))
+            .exclude(newest__isnull=True)
+            .exclude(newest=F('balance'))
+            .values_list('account_no', flat=True)
+        )
+        if moved:
+            raise SnapshotError(f'Newest snapshot does not match the balance of accounts {moved}')
+    return written
+
+
+def _flush_snapshots(snapshots):
+    for snapshot in snapshots:
+        snapshot.opening_balance = snapshot.closing_balance - snapshot.credits + snapshot.debits
+    DailyBalance.objects.bulk_create(snapshots, batch_size=BULK_BATCH_SIZE)
+    return len(snapshots)
@@ -0,0 +1,213 @@
+"""
+Monthly statement files, one per account, rendered from the Transaction
+rows of the month. Accounts are handed to a process pool in chunks; every
+statement is streamed row by row into <output>/<YYYY-MM>/<account_no>.html
+through a .part file, so a rerun skips the accounts that are done.
+"""
+import itertools
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import datetime, time as day_time, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+import django
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from accounts.models import UserBankAccount
+from .export import EXPORT_CHUNK_SIZE, TRANSACTION_TYPE_NAMES
+from .interest import month_bounds
+from .models import ArchivedTransaction, Transaction
+
+FORMATS = ['html', 'pdf']
+
+ROW = '<tr><td>{date}</td><td>{type}</td><td class="money">{credit}</td><td class="money">{debit}</td><td class="money">{balance:,.2f}</td></tr>\n'
+
+
+class StatementError(Exception):
+    pass
+
+
+@dataclass
+class StatementRunResult:
+    written: int = 0
+    skipped: int = 0
+    rows: int = 0
+    elapsed: float = 0.0
+
+    def add(self, other):
+        self.written += other.written
+        self.skipped += other.skipped
+        self.rows += other.rows
+
+
+def statement_path(output_dir, period, account_no, fmt='html'):
+    return Path(output_dir) / f'{period:%Y-%m}' / f'{account_no}.{fmt}'
+
+
+def _aware(day):
+    return timezone.make_aware(datetime.combine(day, day_time.min))
+
+
+def _money(value):
+    return f'{value:,.2f}' if value else ''
+
+
+def _html_to_pdf(source, target):
+    try:
+        from weasyprint import HTML
+    except ImportError:
+        raise StatementError('PDF statements need weasyprint: pip install weasyprint')
+    HTML(filename=str(source)).write_pdf(str(target))
+
+
+def write_statement(account, period, path, fmt='html'):
+    """
+    Stream one account's month into path; returns the number of rows.
+    account needs the opening_balance annotation of statement_accounts().
+    """
+    start, end = month_bounds(period)
+    # oldest first: the archived part of the month (if any) comes before the hot one
+    rows = itertools.chain.from_iterable(
+        model.objects.filter(
+            account_id=account.pk, timestamp__gte=_aware(start), timestamp__lt=_aware(end + timedelta(days=1))
+        )
+        .order_by('timestamp', 'id')
+        .values_list('timestamp', 'transaction_type', 'balance_after_transaction')
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        for model in (ArchivedTransaction, Transaction)
+    )
+    opening = account.opening_balance or Decimal(0)
+    context = {'account': account, 'user': account.user, 'start': start, 'end': end, 'opening_balance': opening}
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    html_path = path.with_suffix('.html.part')
+    balance, credits, debits, count = opening, Decimal(0), Decimal(0), 0
+    with open(html_path, 'w', encoding='utf-8') as out:
+        out.write(render_to_string('transactions/statement_header.html', context))
+        for timestamp, transaction_type, balance_after in rows:
+            # the running balance tells the direction, whatever the type
+            delta = balance_after - balance
+            credit, debit = (delta, 0) if delta > 0 else (0, -delta)
+            credits += credit
+            debits += debit
+            balance = balance_after
+            count += 1
+            out.write(ROW.format(
+                date=timezone.localtime(timestamp).strftime('%Y-%m-%d %H:%M'),
+                type=TRANSACTION_TYPE_NAMES.get(transaction_type, transaction_type),
+                credit=_money(credit),
+                debit=_money(debit),
+                balance=balance_after,
+            ))
+        out.write(render_to_string('transactions/statement_footer.html', dict(
+            context, credits=credits, debits=debits, closing_balance=balance, rows=count,
+        )))
+
+    if fmt == 'pdf':
+        pdf_part = path.with_suffix('.pdf.part')
+        _html_to_pdf(html_path, pdf_part)
+        os.remove(html_path)
+        html_path = pdf_part
+    # the finished file only ever appears whole
+    os.replace(html_path, path)
+    return count
+
+
+def statement_accounts(account_ids, period):
+    """The accounts with their user and the balance carried into the month."""
+    def last_before(model):
+        return Subquery(
+            model.objects.filter(account=OuterRef('pk'), timestamp__lt=_aware(month_bounds(period)[0]))
+            .order_by('-timestamp', '-id').values('balance_after_transaction')[:1]
+        )
+
+    return (
+        UserBankAccount.objects.filter(pk__in=account_ids)
+        .select_related('user')
+        # the archive is only looked at when the hot table has nothing before the month
+        .annotate(opening_balance=Coalesce(last_before(Transaction), last_before(ArchivedTransaction)))
+        .order_by('pk')
+    )
+
+
+def generate_chunk(account_ids, period, output_dir, fmt='html', force=False):
+    """Write the statements of one chunk of accounts; runs in a pool worker."""
+    result = StatementRunResult()
+    for account in statement_accounts(account_ids, period):
+        path = statement_path(output_dir, period, account.account_no, fmt)
+        if path.exists() and not force:
+            result.skipped += 1
+            continue
+        result.rows += write_statement(account, period, path, fmt)
+        result.written += 1
+    return result
+
+
+def _chunks(accounts, chunk_size):
+    # keyset walk over the account ids, only one chunk of ids in memory
+    last_pk = 0
+    ids = accounts.order_by('pk').values_list('pk', flat=True)
+    while True:
+        chunk = list(ids.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1]
+
+
+def generate_statements(period, output_dir, accounts=None, workers=None, chunk_size=200,
+                        fmt='html', force=False, on_chunk=None):
+    """
+    Statements of every account (or of the accounts queryset) for the month
+    of period. workers=1 runs in this process; otherwise chunks of
+    chunk_size accounts go to a pool of workers processes (default: one per
+    core), at most two chunks per worker in flight.
+    """
+    if fmt not in FORMATS:
+        raise StatementError(f'Unknown statement format {fmt!r}')
+    if fmt == 'pdf':
+        # fail before the run, not once per account in every worker
+        try:
+            import weasyprint  # noqa: F401
+        except ImportError:
+            raise StatementError('PDF statements need weasyprint: pip install weasyprint')
+
+    accounts = UserBankAccount.objects.all() if accounts is None else accounts
+    workers = workers or os.cpu_count() or 1
+    result = StatementRunResult()
+    started = time.perf_counter()
+
+    def done(chunk_result):
+        result.add(chunk_result)
+        result.elapsed = time.perf_counter() - started
+        if on_chunk:
+            on_chunk(result)
+
+    chunks = _chunks(accounts, chunk_size)
+    if workers == 1:
+        for chunk in chunks:
+            done(generate_chunk(chunk, period, output_dir, fmt, force))
+    else:
+        # spawned, not forked: a worker opens its own db connection instead of
+        # inheriting the parent's socket; django.setup runs before this module is unpickled
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=django.setup) as pool:
+            pending = set()
+            for chunk in chunks:
+                pending.add(pool.submit(generate_chunk, chunk, period, output_dir, fmt, force))
+                if len(pending) >= workers * 2:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        done(future.result())
+            for future in wait(pending).done:
+                done(future.result())
+
+    result.elapsed = time.perf_counter() - started
+    return result
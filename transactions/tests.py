@@ -1,3 +1,1093 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError, connection
+from django.db.models import F, Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import UserBankAccount
+from .batch import post_batch, read_records
+from .constants import (
+    DEPOSIT,
+    WITHDRAWAL,
+    LOAN,
+    LOAN_PAID,
+    INTEREST,
+    LOAN_PENDING,
+    LOAN_APPROVED,
+    LOAN_REPAID,
+    MAX_OPEN_LOANS,
+)
+from .approval import approve_pending_loans
+from .archive import archive_transactions, archived_transactions
+from .idempotency import claim
+from .interest import accrue_interest, average_daily_balances
+from .journal import find_drift, unbalanced_entries
+from .models import (
+    AppendOnlyError, ArchivedTransaction, ArchiveRun, DailyBalance, IdempotencyKey, InterestRun, JournalEntry,
+    JournalLine, Loan, OutboxEvent, Transaction, VelocityCounter,
+)
+from .services import (
+    InsufficientFunds,
+    LoanLimitExceeded,
+    VelocityLimitExceeded,
+    approve_loan,
+    post_transaction,
+    repay_loan,
+    request_loan,
+)
+from .outbox import drain_outbox
+from .pagination import keyset_page
+from . import snapshots
+from .snapshots import SnapshotError, range_summary, rebuild_daily_balances
+from .statements import generate_statements, statement_path
+from .velocity import broken_rule, bucket_of
+
+
+class BankTestCase(TestCase):
+    def setUp(self):
+        # test db rolls back but the in-process summary cache does not
+        caches['account_summary'].clear()
+
+
+def make_account(username='rahim', balance=0, account_no=None):
+    user = User.objects.create_user(username=username, password='pass12345')
+    account = UserBankAccount.objects.create(
+        user=user,
+        account_type='Savings',
+        gender='Male',
+        account_no=account_no or 100000 + user.id,
+        balance=balance,
+    )
+    return user, account
+
+
+class TransactionReportViewTests(BankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user, self.account = make_account()
+        self.client.force_login(self.user)
+
+    def make_transactions(self, count, start):
+        rows = Transaction.objects.bulk_create(
+            Transaction(
+                account=self.account,
+                amount=Decimal(100 + i),
+                balance_after_transaction=Decimal(100 + i),
+                transaction_type=DEPOSIT,
+            )
+            for i in range(count)
+        )
+        # auto_now_add ignores explicit values, so spread the rows out afterwards
+        for i, row in enumerate(rows):
+            Transaction.objects.filter(pk=row.pk).update(timestamp=start + timedelta(hours=i))
+        return rows
+
+    def test_keyset_pages_cover_history_once(self):
+        self.make_transactions(120, timezone.now() - timedelta(days=30))
+        seen = []
+        params = {}
+        while True:
+            response = self.client.get(reverse('transaction_report'), params)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(t.pk for t in response.context['object_list'])
+            if not response.context['next_page_query']:
+                break
+            params = {'cursor': response.context['view'].next_cursor}
+
+        expected = list(
+            Transaction.objects.filter(account=self.account).order_by('-timestamp', '-id').values_list('pk', flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_page_query_count_is_flat(self):
+        self.make_transactions(300, timezone.now() - timedelta(days=30))
+        first = self.client.get(reverse('transaction_report'))
+        cursor = first.context['view'].next_cursor
+        # session, user and the page itself; the account comes from the summary cache
+        with self.assertNumQueries(3):
+            self.client.get(reverse('transaction_report'), {'cursor': cursor})
+
+    def test_date_range_filter(self):
+        start = timezone.make_aware(datetime(2025, 1, 1, 12))
+        self.make_transactions(72, start)
+        response = self.client.get(
+            reverse('transaction_report'), {'start_date': '2025-01-02', 'end_date': '2025-01-02'}
+        )
+        rows = response.context['object_list']
+        self.assertEqual(len(rows), 24)
+        self.assertTrue(all(row.timestamp.date().isoformat() == '2025-01-02' for row in rows))
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get(reverse('transaction_report'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class PostingServiceTests(BankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user, self.account = make_account(balance=1000)
+
+    def post(self, amount, transaction_type):
+        return post_transaction(Transaction(
+            account=self.account, amount=Decimal(amount), transaction_type=transaction_type
+        ))
+
+    def test_posting_never_reads_balance_into_python(self):
+        self.post(100, DEPOSIT)
+        with CaptureQueriesContext(connection) as queries:
+            self.post(250, DEPOSIT)
+        statements = [q['sql'] for q in queries if not q['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        self.assertFalse([sql for sql in statements if sql.startswith('SELECT')])
+        # balance UPDATE, Transaction INSERT, daily snapshot UPDATE, the
+        # journal entry + lines INSERTs and the outbox event INSERT
+        self.assertEqual(len(statements), 6)
+
+    def test_deposit_and_withdraw_update_balance(self):
+        deposit = self.post(250, DEPOSIT)
+        withdrawal = self.post(1000, WITHDRAWAL)
+        self.assertEqual(deposit.balance_after_transaction, Decimal('1250'))
+        self.assertEqual(withdrawal.balance_after_transaction, Decimal('250'))
+        self.assertEqual(self.account.balance, Decimal('250'))
+
+    def test_overdraft_is_rejected_and_rolled_back(self):
+        with self.assertRaises(InsufficientFunds):
+            self.post(1500, WITHDRAWAL)
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('1000'))
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_loan_approve_and_repay(self):
+        loan = request_loan(self.account, Decimal(500))
+        self.assertEqual(loan.status, LOAN_PENDING)
+        approve_loan(loan)
+        self.assertEqual(self.account.balance, Decimal('1500'))
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.open_loans, 1)
+
+        repay_loan(loan)
+        loan.refresh_from_db()
+        self.account.refresh_from_db()
+        self.assertEqual((loan.status, loan.outstanding), (LOAN_REPAID, Decimal(0)))
+        self.assertEqual((self.account.balance, self.account.open_loans), (Decimal('1000'), 0))
+        self.assertEqual(
+            list(loan.postings.order_by('id').values_list('transaction_type', 'balance_after_transaction')),
+            [(LOAN, Decimal('1500')), (LOAN_PAID, Decimal('1000'))],
+        )
+
+    def test_open_loan_limit(self):
+        loans = [request_loan(self.account, Decimal(100)) for _ in range(MAX_OPEN_LOANS + 1)]
+        for loan in loans[:MAX_OPEN_LOANS]:
+            approve_loan(loan)
+        with self.assertRaises(LoanLimitExceeded):
+            approve_loan(loans[-1])
+        loans[-1].refresh_from_db()
+        self.assertEqual(loans[-1].status, LOAN_PENDING)
+
+        self.account.refresh_from_db()
+        with self.assertRaises(LoanLimitExceeded):
+            request_loan(self.account, Decimal(100))
+
+
+class PostingViewTests(BankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user, self.account = make_account(balance=1000)
+        self.client.force_login(self.user)
+
+    def test_withdraw_view(self):
+        response = self.client.post(reverse('withdraw_money'), {'amount': '600'})
+        self.assertRedirects(response, reverse('transaction_report'))
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('400'))
+
+    def test_pay_loan_only_once(self):
+        loan = approve_loan(request_loan(self.account, Decimal(300)))
+        self.client.post(reverse('pay', args=[loan.pk]))
+        self.client.post(reverse('pay', args=[loan.pk]))
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('1000'))
+
+    def test_pay_loan_is_post_only(self):
+        loan = approve_loan(request_loan(self.account, Decimal(300)))
+        self.assertEqual(self.client.get(reverse('pay', args=[loan.pk])).status_code, 405)
+        loan.refresh_from_db()
+        self.assertEqual(loan.status, LOAN_APPROVED)
+
+    def test_loan_request_and_list(self):
+        response = self.client.post(reverse('loan_request'), {'amount': '5000'})
+        self.assertRedirects(response, reverse('loan_list'))
+        # the list reads the loan table only: session, user, loans
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('loan_list'))
+        self.assertEqual([loan.principal for loan in response.context['loans']], [Decimal(5000)])
+        self.assertFalse(Transaction.objects.exists())
+
+
+class IdempotencyTests(BankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user, self.account = make_account(balance=1000)
+        self.client.force_login(self.user)
+
+    def deposit(self, amount, key='key-1'):
+        return self.client.post(reverse('deposit_money'), {'amount': amount, 'idempotency_key': key})
+
+    def test_retry_replays_without_posting_again(self):
+        first = self.deposit('500')
+        self.assertRedirects(first, reverse('transaction_report'))
+        with CaptureQueriesContext(connection) as captured:
+            retry = self.deposit('500')
+        self.assertRedirects(retry, reverse('transaction_report'))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertFalse([q for q in captured if 'UPDATE "accounts_userbankaccount"' in q['sql']])
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('1500'))
+        self.assertEqual(JournalEntry.objects.count(), 1)
+
+        # keys are per user and the header works as well as the form field
+        self.deposit('500', key='key-2')
+        response = self.client.post(reverse('withdraw_money'), {'amount': '100'}, headers={'Idempotency-Key': 'key-2'})
+        self.assertEqual(response.status_code, 422)
+
+    def test_rejected_form_releases_the_key(self):
+        response = self.client.post(reverse('withdraw_money'), {'amount': '5000', 'idempotency_key': 'w-1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['idempotency_key'], 'w-1')
+        self.assertFalse(IdempotencyKey.objects.exists())
+        # the same key with a different amount is now a new request
+        response = self.client.post(reverse('withdraw_money'), {'amount': '600', 'idempotency_key': 'w-1'})
+        self.assertRedirects(response, reverse('transaction_report'))
+
+    def test_failed_loan_payment_releases_the_key(self):
+        loan = approve_loan(request_loan(self.account, Decimal(300)))
+        UserBankAccount.objects.filter(pk=self.account.pk).update(balance=Decimal(100))
+        url = reverse('pay', args=[loan.pk])
+        self.client.post(url, {'idempotency_key': 'p-1'})
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        # topped up, the retry with the same key pays the loan
+        UserBankAccount.objects.filter(pk=self.account.pk).update(balance=Decimal(1300))
+        response = self.client.post(url, {'idempotency_key': 'p-1'})
+        self.assertNotIn('Idempotent-Replayed', response)
+        loan.refresh_from_db()
+        self.assertEqual(loan.status, LOAN_REPAID)
+        self.assertEqual(IdempotencyKey.objects.get().status_code, 302)
+
+    def test_claim_reraises_other_integrity_errors(self):
+        with mock.patch.object(IdempotencyKey.objects, 'create', side_effect=IntegrityError('FOREIGN KEY constraint failed')):
+            with self.assertRaises(IntegrityError):
+                claim(self.user, 'k-1', 'fingerprint')
+
+    def test_request_in_flight_conflicts(self):
+        self.deposit('500')
+        IdempotencyKey.objects.update(status_code=None)
+        self.assertEqual(self.deposit('500').status_code, 409)
+
+    def test_expired_keys(self):
+        self.deposit('500', key='old')
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        # past its TTL the key counts as new again
+        self.assertRedirects(self.deposit('500', key='old'), reverse('transaction_report'))
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('2000'))
+
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.deposit('500', key='fresh')
+        out = io.StringIO()
+        call_command('purge_idempotency_keys', stdout=out)
+        self.assertIn('Purged 1 expired', out.getvalue())
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['fresh'])
+
+
+class AdminChangelistTests(BankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser('boss', 'boss@example.com', 'pass12345')
+        self.client.force_login(self.admin)
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(captured)
+
+    def test_queries_do_not_grow_with_rows(self):
+        url = reverse('admin:transactions_transaction_changelist')
+        _, account = make_account(username='a1')
+        post_transaction(Transaction(account=account, amount=Decimal(100), transaction_type=DEPOSIT))
+        _, few = self.changelist_queries(url)
+        for n in range(2, 12):
+            _, account = make_account(username=f'a{n}')
+            post_transaction(Transaction(account=account, amount=Decimal(100), transaction_type=DEPOSIT))
+        response, many = self.changelist_queries(url)
+        self.assertEqual(few, many)
+        self.assertEqual(response.context['cl'].result_count, 11)
+
+        response, _ = self.changelist_queries(f'{url}?transaction_type={DEPOSIT}&q={account.account_no}')
+        self.assertEqual(response.context['cl'].result_count, 1)
+        # a non numeric search on the account number column finds nothing instead of failing
+        self.changelist_queries(f'{url}?q=abc')
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=3)
+    def test_large_tables_are_estimated(self):
+        _, account = make_account(username='a1')
+        for _ in range(5):
+            post_transaction(Transaction(account=account, amount=Decimal(100), transaction_type=DEPOSIT))
+        Transaction.objects.filter(pk=Transaction.objects.order_by('pk')[0].pk).delete()
+        url = reverse('admin:transactions_transaction_changelist')
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        # highest id, not a COUNT(*) of the table
+        self.assertEqual(response.context['cl'].result_count, 5)
+        self.assertFalse([q for q in captured if 'COUNT(*)' in q['sql'] and 'transactions_transaction' in q['sql']])
+        # filtered lists count up to the limit
+        response = self.client.get(f'{url}?transaction_type={DEPOSIT}')
+        self.assertEqual(response.context['cl'].result_count, 3)
+
+    def test_add_only_deposits_and_withdrawals(self):
+        _, account = make_account(username='a1', balance=0)
+        url = reverse('admin:transactions_transaction_add')
+        response = self.client.post(url, {
+            'account': account.pk, 'amount': '5000', 'transaction_type': LOAN, 'loan_approve': 'on',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('transaction_type', response.context['adminform'].form.errors)
+        self.assertFalse(Transaction.objects.exists())
+
+        response = self.client.post(url, {'account': account.pk, 'amount': '500', 'transaction_type': DEPOSIT})
+        self.assertEqual(response.status_code, 302)
+        account.refresh_from_db()
+        self.assertEqual(account.balance, Decimal(500))
+
+    def test_admin_withdrawal_over_the_balance(self):
+        _, account = make_account(username='a1', balance=0)
+        post_transaction(Transaction(account=account, amount=Decimal(300), transaction_type=DEPOSIT))
+        url = reverse('admin:transactions_transaction_add')
+        data = {'account': account.pk, 'amount': '500', 'transaction_type': WITHDRAWAL}
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('amount', response.context['adminform'].form.errors)
+
+        # the balance drops after the form was validated
+        with mock.patch('transactions.admin.post_transaction', side_effect=InsufficientFunds('gone')):
+            response = self.client.post(url, dict(data, amount='200'), follow=True)
+        self.assertContains(response, 'Not posted: gone')
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_account_autocomplete(self):
+        make_account(username='a1', account_no=555001)
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'transactions', 'model_name': 'transaction', 'field_name': 'account', 'term': '555001',
+        })
+        self.assertEqual([r['text'] for r in response.json()['results']], ['555001'])
+
+    def test_disbursed_loan_keeps_account_and_principal(self):
+        _, account = make_account(username='a1')
+        pending = request_loan(account, Decimal(300))
+        approved = approve_loan(request_loan(account, Decimal(500)))
+
+        def fields(loan):
+            response = self.client.get(reverse('admin:transactions_loan_change', args=[loan.pk]))
+            return response.context['adminform'].form.fields
+
+        self.assertIn('principal', fields(pending))
+        self.assertNotIn('principal', fields(approved))
+        self.assertNotIn('account', fields(approved))
+
+
+class LoanApprovalTests(BankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user, self.busy = make_account(username='busy')
+        _, self.free = make_account(username='free')
+        # two of busy's three slots are taken
+        for _ in range(2):
+            approve_loan(request_loan(self.busy, Decimal(100)))
+
+    def pending(self, account, *amounts):
+        return [Loan.objects.create(account=account, principal=Decimal(amount)) for amount in amounts]
+
+    def test_limit_is_enforced_oldest_request_first(self):
+        busy_loans = self.pending(self.busy, 1000, 2000, 3000)
+        free_loans = self.pending(self.free, 500, 700)
+
+        result = approve_pending_loans()
+        self.assertEqual((result.approved, result.over_limit), (3, 2))
+        statuses = dict(Loan.objects.filter(pk__in=[l.pk for l in busy_loans + free_loans]).values_list('pk', 'status'))
+        self.assertEqual([statuses[l.pk] for l in busy_loans], [LOAN_APPROVED, LOAN_PENDING, LOAN_PENDING])
+        self.assertEqual([statuses[l.pk] for l in free_loans], [LOAN_APPROVED, LOAN_APPROVED])
+
+        self.free.refresh_from_db()
+        self.assertEqual((self.free.balance, self.free.open_loans), (Decimal(1200), 2))
+        self.busy.refresh_from_db()
+        self.assertEqual((self.busy.balance, self.busy.open_loans), (Decimal(1200), MAX_OPEN_LOANS))
+        self.assertEqual(
+            list(self.free.transactions.order_by('pk').values_list('balance_after_transaction', flat=True)),
+            [Decimal(500), Decimal(1200)],
+        )
+        self.assertEqual(find_drift([self.busy.pk, self.free.pk]), [])
+        self.assertEqual(DailyBalance.objects.get(account=self.free).closing_balance, Decimal(1200))
+
+        # a repaid loan frees a slot for the next run
+        repay_loan(Loan.objects.filter(account=self.busy, status=LOAN_APPROVED).first())
+        self.assertEqual(approve_pending_loans().approved, 1)
+
+    def test_queries_do_not_grow_with_loans(self):
+        self.pending(self.free, 500)
+        with CaptureQueriesContext(connection) as one:
+            approve_pending_loans()
+        for n in range(2, 12):
+            _, account = make_account(username=f'borrower{n}')
+            self.pending(account, 500, 600)
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(approve_pending_loans().approved, 20)
+        self.assertEqual(len(one), len(many))
+
+    def test_command_and_admin_action(self):
+        self.pending(self.free, 500)
+        other = self.pending(self.busy, 800)
+        out = io.StringIO()
+        call_command('approve_loans', str(self.free.account_no), stdout=out)
+        self.assertIn('Approved 1 loans', out.getvalue())
+
+        self.client.force_login(User.objects.create_superuser('boss', 'boss@example.com', 'pass12345'))
+        response = self.client.post(reverse('admin:transactions_loan_changelist'), {
+            'action': 'approve_loans', '_selected_action': [other[0].pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Loan.objects.get(pk=other[0].pk).status, LOAN_APPROVED)
+
+
+class ConcurrentPostingTests(TransactionTestCase):
+    workers = 8
+    postings_per_worker = 25
+
+    def withdraw_concurrently(self):
+        _, account = make_account(balance=100 * self.workers * self.postings_per_worker // 2)
+        results = {'posted': 0, 'rejected': 0, 'locked': 0}
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                for _ in range(self.postings_per_worker):
+                    while True:
+                        try:
+                            post_transaction(Transaction(
+                                account=UserBankAccount(pk=account.pk),
+                                amount=Decimal(100),
+                                transaction_type=WITHDRAWAL,
+                            ))
+                            outcome = 'posted'
+                        except InsufficientFunds:
+                            outcome = 'rejected'
+                        except OperationalError:
+                            # sqlite reports lock contention instead of waiting
+                            with lock:
+                                results['locked'] += 1
+                            continue
+                        break
+                    with lock:
+                        results[outcome] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        account.refresh_from_db()
+        total = self.workers * self.postings_per_worker
+        self.assertEqual(results['posted'] + results['rejected'], total)
+        self.assertEqual(results['posted'], total // 2)
+        self.assertEqual(account.balance, Decimal(0))
+        self.assertEqual(Transaction.objects.filter(account=account).count(), total // 2)
+        self.assertEqual(
+            sorted(Transaction.objects.values_list('balance_after_transaction', flat=True)),
+            [Decimal(100 * i) for i in range(total // 2)],
+        )
+        return results
+
+    def test_concurrent_withdrawals_never_lose_updates(self):
+        self.withdraw_concurrently()
+
+    @override_settings(SERIALIZE_MONEY_WRITES=True)
+    def test_write_queue_removes_lock_contention(self):
+        results = self.withdraw_concurrently()
+        self.assertEqual(results['locked'], 0)
+
+
+class BatchPostingTests(BankTestCase):
+    def setUp(self):
+        super().setUp()
+        _, self.first = make_account('karim', balance=1000, account_no=200001)
+        _, self.second = make_account('jamal', balance=0, account_no=200002)
+
+    def test_post_batch_applies_valid_records(self):
+        stream = io.StringIO(
+            'account_no,type,amount\n'
+            '200001,withdraw,800\n'
+            '200002,deposit,150.50\n'
+            '200001,withdraw,800\n'      # insufficient after the first one
+            '200002,deposit,50\n'        # below the deposit minimum
+            '999999,deposit,500\n'       # unknown account
+            '200001,deposit,1000\n'
+            '200002,transfer,100\n'      # unknown type
+            '200002,deposit,1e15\n'      # does not fit the amount column
+        )
+        rejected = []
+        result = post_batch(read_records(stream), chunk_size=2, on_reject=lambda *args: rejected.append(args))
+
+        self.assertEqual(result.posted, 3)
+        self.assertEqual(result.rejected, 5)
+        self.assertEqual(sorted(line for line, _ in rejected), [4, 5, 6, 8, 9])
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual(self.first.balance, Decimal('1200'))
+        self.assertEqual(self.second.balance, Decimal('150.50'))
+        self.assertEqual(
+            list(Transaction.objects.filter(account=self.first).order_by('id').values_list('balance_after_transaction', flat=True)),
+            [Decimal('200'), Decimal('1200')],
+        )
+
+    def test_post_batch_command_reads_jsonl(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as batch_file:
+            batch_file.write('{"account_no": 200002, "type": "deposit", "amount": "500"}\n')
+            batch_file.write('not json\n')
+        self.addCleanup(os.remove, batch_file.name)
+
+        out, err = io.StringIO(), io.StringIO()
+        call_command('post_batch', batch_file.name, stdout=out, stderr=err)
+        self.assertIn('Posted 1 records, rejected 1', out.getvalue())
+        self.assertIn('line 2', err.getvalue())
+        self.second.refresh_from_db()
+        self.assertEqual(self.second.balance, Decimal('500'))
+
+
+class DailyBalanceTests(BankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user, self.account = make_account(balance=0)
+
+    def post_on(self, day, amount, transaction_type):
+        moment = timezone.make_aware(datetime.combine(day, datetime.min.time()).replace(hour=12))
+        with mock.patch('django.utils.timezone.now', return_value=moment):
+            return post_transaction(Transaction(
+                account=self.account, amount=Decimal(amount), transaction_type=transaction_type
+            ))
+
+    def test_snapshots_follow_postings(self):
+        day1, day2, day3 = (datetime(2025, 3, d).date() for d in (1, 2, 4))
+        self.post_on(day1, 1000, DEPOSIT)
+        self.post_on(day1, 500, WITHDRAWAL)
+        self.post_on(day2, 2000, DEPOSIT)
+        self.post_on(day3, 700, WITHDRAWAL)
+
+        snapshot = DailyBalance.objects.get(account=self.account, date=day1)
+        self.assertEqual(
+            (snapshot.opening_balance, snapshot.credits, snapshot.debits, snapshot.closing_balance),
+            (Decimal(0), Decimal(1000), Decimal(500), Decimal(500)),
+        )
+        with self.assertNumQueries(2):
+            summary = range_summary(self.account, day2, datetime(2025, 3, 3).date())
+        self.assertEqual(summary, {
+            'opening_balance': Decimal(500),
+            'credits': Decimal(2000),
+            'debits': Decimal(0),
+            'closing_balance': Decimal(2500),
+        })
+
+        incremental = list(DailyBalance.objects.order_by('date').values_list(
+            'date', 'opening_balance', 'credits', 'debits', 'closing_balance'
+        ))
+        DailyBalance.objects.all().delete()
+        self.assertEqual(rebuild_daily_balances([self.account.pk], chunk_size=1), 3)
+        rebuilt = list(DailyBalance.objects.order_by('date').values_list(
+            'date', 'opening_balance', 'credits', 'debits', 'closing_balance'
+        ))
+        self.assertEqual(rebuilt, incremental)
+
+    def test_rebuild_works_back_from_the_balance(self):
+        self.post_on(datetime(2025, 3, 1).date(), 4000, DEPOSIT)
+        self.post_on(datetime(2025, 3, 2).date(), 3450, WITHDRAWAL)
+        # a legacy row whose balance_after_transaction was never brought up to date
+        Transaction.objects.filter(transaction_type=WITHDRAWAL).update(balance_after_transaction=Decimal(3550))
+        rebuild_daily_balances([self.account.pk])
+        self.assertEqual(
+            list(DailyBalance.objects.order_by('date').values_list('opening_balance', 'closing_balance')),
+            [(Decimal(0), Decimal(4000)), (Decimal(4000), Decimal(550))],
+        )
+
+    def test_rebuild_fails_when_the_balance_moves(self):
+        self.post_on(datetime(2025, 3, 1).date(), 1000, DEPOSIT)
+        flush = snapshots._flush_snapshots
+
+        def posting_meanwhile(pending):
+            UserBankAccount.objects.filter(pk=self.account.pk).update(balance=F('balance') + 100)
+            return flush(pending)
+
+        with mock.patch('transactions.snapshots._flush_snapshots', side_effect=posting_meanwhile):
+            with self.assertRaises(SnapshotError):
+                rebuild_daily_balances([self.account.pk])
+        self.assertEqual(DailyBalance.objects.get().closing_balance, Decimal(1000))
+
+    def test_rebuild_command(self):
+        self.post_on(datetime(2025, 3, 1).date(), 1000, DEPOSIT)
+        DailyBalance.objects.all().delete()
+        out = io.StringIO()
+        call_command('rebuild_daily_balances', stdout=out)
+        self.assertIn('Wrote 1 daily balance rows', out.getvalue())
+        self.assertEqual(DailyBalance.objects.get().closing_balance, Decimal(1000))
+
+    def test_report_shows_range_summary(self):
+        self.post_on(datetime(2025, 3, 1).date(), 1000, DEPOSIT)
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse('transaction_report'), {'start_date': '2025-03-01', 'end_date': '2025-03-31'}
+        )
+        self.assertEqual(response.context['summary']['credits'], Decimal(1000))
+
+
+class JournalTests(BankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user, self.account = make_account(account_no=500001)
+
+    def test_every_posting_is_a_balanced_entry(self):
+        post_transaction(Transaction(account=self.account, amount=Decimal(3000), transaction_type=DEPOSIT))
+        post_transaction(Transaction(account=self.account, amount=Decimal(1000), transaction_type=WITHDRAWAL))
+        loan = approve_loan(request_loan(self.account, Decimal(500)))
+        repay_loan(loan)
+        post_batch([(1, {'account_no': 500001, 'type': 'deposit', 'amount': '200'})])
+
+        self.assertEqual(JournalEntry.objects.count(), 5)
+        self.assertEqual(JournalLine.objects.aggregate(total=Sum('amount'))['total'], 0)
+        self.assertEqual(unbalanced_entries(1, 10**6), [])
+        running = list(
+            JournalLine.objects.filter(account=self.account).order_by('id').values_list('balance_after', flat=True)
+        )
+        self.assertEqual(running, [Decimal(3000), Decimal(2000), Decimal(2500), Decimal(2000), Decimal(2200)])
+        self.assertEqual(find_drift([self.account.pk]), [])
+
+    def test_reconciliation_flags_drift(self):
+        post_transaction(Transaction(account=self.account, amount=Decimal(3000), transaction_type=DEPOSIT))
+        call_command('reconcile_ledger', stdout=io.StringIO())
+
+        UserBankAccount.objects.filter(pk=self.account.pk).update(balance=F('balance') + 7)
+        [drift] = find_drift([self.account.pk])
+        self.assertEqual((drift.account_no, drift.difference), (500001, Decimal(7)))
+        with self.assertRaises(CommandError):
+            call_command('reconcile_ledger', stdout=io.StringIO(), stderr=io.StringIO())
+
+    def test_journal_is_append_only(self):
+        post_transaction(Transaction(account=self.account, amount=Decimal(3000), transaction_type=DEPOSIT))
+        entry = JournalEntry.objects.get()
+        with self.assertRaises(AppendOnlyError):
+            JournalLine.objects.filter(entry=entry).update(amount=0)
+        with self.assertRaises(AppendOnlyError):
+            entry.delete()
+        with self.assertRaises(AppendOnlyError):
+            entry.save()
+
+
+class InterestAccrualTests(BankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user, self.account = make_account(account_no=600001)
+        _, self.other = make_account('selim', account_no=600002)
+        current_user = User.objects.create_user(username='current', password='pass12345')
+        self.current = UserBankAccount.objects.create(
+            user=current_user, account_type='Current', gender='Male', account_no=600003
+        )
+        for account in (self.account, self.other, self.current):
+            # 1000 carried into September, 4000 from the 11th on
+            DailyBalance.objects.create(account=account, date=date(2024, 8, 31), closing_balance=1000)
+            DailyBalance.objects.create(account=account, date=date(2024, 9, 11), closing_balance=4000)
+
+    def test_average_daily_balance(self):
+        averages = average_daily_balances([self.account.pk], date(2024, 9, 1), date(2024, 9, 30))
+        self.assertEqual(averages, {self.account.pk: (600001, Decimal('3000.00'))})
+
+    def test_run_is_checkpointed_and_runs_once(self):
+        run = accrue_interest(date(2024, 9, 1), rate='0.0366', chunk_size=1, max_chunks=1)
+        self.assertIsNone(run.finished_at)
+        self.assertEqual((run.accounts, run.last_account_id), (1, self.account.pk))
+
+        run = accrue_interest(date(2024, 9, 1), chunk_size=1)
+        self.assertIsNotNone(run.finished_at)
+        # 3000 * 3.66% * 30 / 366 days
+        self.assertEqual((run.accounts, run.total_interest), (2, Decimal('18.00')))
+
+        accrue_interest(date(2024, 9, 1))
+        postings = Transaction.objects.filter(transaction_type=INTEREST)
+        self.assertEqual(sorted(postings.values_list('account__account_no', 'amount')),
+                         [(600001, Decimal('9.00')), (600002, Decimal('9.00'))])
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('9.00'))
+        self.assertEqual(find_drift([self.account.pk, self.other.pk, self.current.pk]), [])
+        self.assertEqual(InterestRun.objects.count(), 1)
+
+    def test_month_must_be_over(self):
+        today = timezone.localdate()
+        for month in (f'{today:%Y-%m}', f'{today.year + 1}-01'):
+            with self.assertRaisesMessage(CommandError, 'is not over yet'):
+                call_command('accrue_interest', '--month', month, stdout=io.StringIO())
+        self.assertFalse(InterestRun.objects.exists())
+
+    def test_rate_is_validated(self):
+        for rate in ('abc', '-0.01', '0', 'NaN', '2'):
+            with self.assertRaises(CommandError):
+                call_command('accrue_interest', '--month', '2024-09', '--rate', rate, stdout=io.StringIO())
+        self.assertFalse(InterestRun.objects.exists())
+
+    def test_resume_at_another_rate_is_refused(self):
+        accrue_interest(date(2024, 9, 1), rate='0.0366', chunk_size=1, max_chunks=1)
+        with self.assertRaisesMessage(CommandError, 'was started at rate 0.0366'):
+            call_command('accrue_interest', '--month', '2024-09', '--rate', '0.05', stdout=io.StringIO())
+        call_command('accrue_interest', '--month', '2024-09', '--rate', '0.0366', stdout=io.StringIO())
+        self.assertEqual(InterestRun.objects.get().accounts, 2)
+
+
+class StatementExportTests(BankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user, self.account = make_account(balance=0)
+        self.client.force_login(self.user)
+        for amount in (1000, 250):
+            post_transaction(Transaction(account=self.account, amount=Decimal(amount), transaction_type=DEPOSIT))
+
+    def test_csv_export_streams_rows(self):
+        response = self.client.get(reverse('transaction_statement'), {'format': 'csv'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'date,type,amount,balance_after_transaction')
+        self.assertEqual([line.split(',')[2:] for line in lines[1:]], [['250.00', '1250.00'], ['1000.00', '1000.00']])
+
+    def test_jsonl_export(self):
+        response = self.client.get(reverse('transaction_statement'), {'format': 'jsonl'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['amount'] for row in rows], ['250.00', '1000.00'])
+        self.assertEqual(rows[0]['type'], 'Deposite')
+
+    def test_unknown_format_is_404(self):
+        response = self.client.get(reverse('transaction_statement'), {'format': 'xml'})
+        self.assertEqual(response.status_code, 404)
+
+
+class MonthlyStatementTests(BankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user, self.account = make_account()
+        self.user.first_name, self.user.last_name = 'Rahim', 'Uddin'
+        self.user.save()
+        _, self.other = make_account(username='karim')
+        # posted in date order, so the running balances match the backdated timestamps
+        for transaction_type, amount, when in [
+            (DEPOSIT, 1000, '2025-01-20'), (DEPOSIT, 500, '2025-02-03'), (DEPOSIT, 700, '2025-02-10'),
+            (WITHDRAWAL, 200, '2025-02-15'), (DEPOSIT, 50, '2025-03-01'),
+        ]:
+            txn = post_transaction(Transaction(account=self.account, amount=Decimal(amount), transaction_type=transaction_type))
+            Transaction.objects.filter(pk=txn.pk).update(timestamp=timezone.make_aware(datetime.fromisoformat(when)))
+        self.output = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output)
+
+    def test_month_statement(self):
+        result = generate_statements(date(2025, 2, 1), self.output, workers=1)
+        self.assertEqual((result.written, result.rows), (2, 3))
+
+        html = statement_path(self.output, date(2025, 2, 1), self.account.account_no).read_text()
+        self.assertIn('Rahim Uddin', html)
+        self.assertIn('Opening balance</td><td></td><td></td><td class="money">1,000.00', html)
+        # opening balance row + the month's three postings
+        self.assertEqual(html.count('<tr><td>2025-02'), 4)
+        # credits 1,200, debits 200, closing 2,000
+        self.assertIn('<th class="money">1,200.00</th>\n        <th class="money">200.00</th>\n'
+                      '        <th class="money">2,000.00</th>', html)
+        self.assertFalse(list(Path(self.output).rglob('*.part')))
+
+    def test_rerun_skips_finished_accounts(self):
+        out = io.StringIO()
+        call_command('generate_statements', '--month', '2025-02', '--output', self.output, '--workers', '1',
+                     str(self.account.account_no), stdout=out)
+        self.assertIn('wrote 1 statements', out.getvalue())
+
+        result = generate_statements(date(2025, 2, 1), self.output, workers=1)
+        self.assertEqual((result.written, result.skipped), (1, 1))
+        result = generate_statements(date(2025, 2, 1), self.output, workers=1, force=True)
+        self.assertEqual(result.written, 2)
+
+
+class RecordingSender:
+    def __init__(self, fail=()):
+        self.sent = []
+        self.fail = set(fail)
+
+    def send(self, notification):
+        if notification.event_id in self.fail:
+            raise ConnectionError('gateway down')
+        self.sent.append(notification)
+
+
+class OutboxTests(BankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user, self.account = make_account(balance=1000)
+        self.user.email = 'rahim@example.com'
+        self.user.save()
+
+    def post(self, amount, transaction_type=DEPOSIT):
+        return post_transaction(Transaction(account=self.account, amount=Decimal(amount), transaction_type=transaction_type))
+
+    def test_event_commits_with_the_posting(self):
+        txn = self.post(500)
+        with self.assertRaises(InsufficientFunds):
+            self.post(5000, WITHDRAWAL)
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.payload['transaction_id'], txn.pk)
+
+        post_batch(read_records(io.StringIO(f'account_no,type,amount\n{self.account.account_no},deposit,700\n')))
+        self.assertEqual(OutboxEvent.objects.count(), 2)
+
+    def test_drain_delivers_once(self):
+        self.post(500)
+        self.post(250)
+        sender = RecordingSender()
+        result = drain_outbox(sender=sender, workers=2)
+        self.assertEqual((result.sent, result.failed), (2, 0))
+        self.assertEqual(
+            sorted(n.body for n in sender.sent),
+            ['Deposite of BDT 250.00 on account 100001. Balance: BDT 1,750.00',
+             'Deposite of BDT 500.00 on account 100001. Balance: BDT 1,500.00'],
+        )
+        self.assertEqual({n.recipient for n in sender.sent}, {'rahim@example.com'})
+        self.assertEqual(drain_outbox(sender=sender).sent, 0)
+        self.assertFalse(OutboxEvent.objects.filter(sent_at__isnull=True).exists())
+
+    def test_failures_back_off_and_give_up(self):
+        self.post(500)
+        event = OutboxEvent.objects.get()
+        result = drain_outbox(sender=RecordingSender(fail=[event.pk]))
+        self.assertEqual(result.failed, 1)
+        event.refresh_from_db()
+        self.assertEqual((event.attempts, event.last_error), (1, 'ConnectionError: gateway down'))
+        self.assertGreater(event.available_at, timezone.now())
+        # not due again until the backoff has passed
+        self.assertEqual(drain_outbox(sender=RecordingSender()).sent, 0)
+
+        OutboxEvent.objects.update(available_at=timezone.now())
+        with override_settings(OUTBOX_MAX_ATTEMPTS=2):
+            result = drain_outbox(sender=RecordingSender(fail=[event.pk]))
+        self.assertEqual(result.gave_up, 1)
+        event.refresh_from_db()
+        self.assertIsNone(event.available_at)
+        self.assertIsNone(event.sent_at)
+
+    def test_archived_posting_is_still_delivered(self):
+        txn = self.post(500)
+        archive_transactions(cutoff=timezone.now() + timedelta(seconds=1))
+        self.assertFalse(Transaction.objects.filter(pk=txn.pk).exists())
+
+        sender = RecordingSender()
+        self.assertEqual(drain_outbox(sender=sender).sent, 1)
+        self.assertEqual(sender.sent[0].body, 'Deposite of BDT 500.00 on account 100001. Balance: BDT 1,500.00')
+
+    def test_command_with_file_sender(self):
+        self.post(500)
+        path = os.path.join(tempfile.mkdtemp(), 'notifications.jsonl')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        out = io.StringIO()
+        with override_settings(NOTIFICATION_SENDER='transactions.outbox.FileSender', NOTIFICATION_FILE=path):
+            call_command('drain_outbox', '--once', stdout=out)
+        self.assertIn('1 sent, 0 failed', out.getvalue())
+        with open(path) as f:
+            self.assertEqual(json.loads(f.readline())['recipient'], 'rahim@example.com')
+
+
+@override_settings(VELOCITY_RULES=[
+    {'name': 'withdrawals_per_hour', 'transaction_type': WITHDRAWAL, 'window_hours': 1, 'max_count': 3},
+    {'name': 'withdrawn_per_day', 'transaction_type': WITHDRAWAL, 'window_hours': 24, 'max_amount': 5000},
+])
+class VelocityTests(BankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user, self.account = make_account()
+        post_transaction(Transaction(account=self.account, amount=Decimal(20000), transaction_type=DEPOSIT))
+
+    def withdraw(self, amount):
+        return post_transaction(
+            Transaction(account=self.account, amount=Decimal(amount), transaction_type=WITHDRAWAL),
+            enforce_velocity=True,
+        )
+
+    def test_counters_follow_postings(self):
+        self.withdraw(1000)
+        self.withdraw(500)
+        counter = VelocityCounter.objects.get()
+        self.assertEqual((counter.transaction_type, counter.count, counter.total), (WITHDRAWAL, 2, Decimal(1500)))
+        self.assertEqual(counter.bucket, bucket_of(timezone.now()))
+
+    def test_count_rule(self):
+        for _ in range(3):
+            self.withdraw(500)
+        with self.assertRaises(VelocityLimitExceeded) as caught:
+            self.withdraw(500)
+        self.assertEqual(caught.exception.rule.name, 'withdrawals_per_hour')
+        # the refused posting moved nothing
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal(18500))
+        self.assertEqual(VelocityCounter.objects.get().count, 3)
+
+    def test_amount_rule_over_rolling_window(self):
+        now = timezone.now()
+        VelocityCounter.objects.create(
+            account=self.account, transaction_type=WITHDRAWAL, bucket=bucket_of(now) - timedelta(hours=5),
+            count=1, total=Decimal(4500),
+        )
+        self.assertEqual(broken_rule(self.account.pk, WITHDRAWAL, Decimal(600)).name, 'withdrawn_per_day')
+        self.assertIsNone(broken_rule(self.account.pk, WITHDRAWAL, Decimal(500)))
+        # a day later the old bucket is out of the window
+        self.assertIsNone(broken_rule(self.account.pk, WITHDRAWAL, Decimal(600), now=now + timedelta(hours=20)))
+
+    def test_window_start_hour_counts_in_part(self):
+        hour = bucket_of(timezone.now()) - timedelta(hours=1)
+        VelocityCounter.objects.create(
+            account=self.account, transaction_type=WITHDRAWAL, bucket=hour, count=3, total=Decimal(1500),
+        )
+        # just past the hour boundary the last hour's postings still count (almost) in full
+        rule = broken_rule(self.account.pk, WITHDRAWAL, Decimal(500), now=hour + timedelta(hours=1, minutes=1))
+        self.assertEqual(rule.name, 'withdrawals_per_hour')
+        # 40 minutes on only a third of them are inside the window
+        self.assertIsNone(broken_rule(self.account.pk, WITHDRAWAL, Decimal(500), now=hour + timedelta(hours=1, minutes=40)))
+
+    def test_check_is_one_query(self):
+        for hour in range(24):
+            VelocityCounter.objects.create(
+                account=self.account, transaction_type=WITHDRAWAL,
+                bucket=bucket_of(timezone.now()) - timedelta(hours=hour), count=0, total=0,
+            )
+        with self.assertNumQueries(1):
+            broken_rule(self.account.pk, WITHDRAWAL, Decimal(500))
+
+    def test_withdraw_view_shows_the_rule(self):
+        self.client.force_login(self.user)
+        for _ in range(3):
+            self.client.post(reverse('withdraw_money'), {'amount': '500'})
+        response = self.client.post(reverse('withdraw_money'), {'amount': '500'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(
+            response.context['form'], 'amount', 'You can make at most 3 withdrawal postings per hour'
+        )
+
+    def test_batch_postings_are_counted(self):
+        post_batch(read_records(io.StringIO(
+            f'account_no,type,amount\n{self.account.account_no},withdrawal,700\n'
+            f'{self.account.account_no},withdrawal,800\n'
+        )))
+        counter = VelocityCounter.objects.get()
+        self.assertEqual((counter.count, counter.total), (2, Decimal(1500)))
+
+    def test_replay_rebuilds_counters(self):
+        self.withdraw(1000)
+        self.withdraw(700)
+        Transaction.objects.filter(transaction_type=WITHDRAWAL).update(timestamp=timezone.now() - timedelta(hours=3))
+        VelocityCounter.objects.all().delete()
+        stale = VelocityCounter.objects.create(
+            account=self.account, transaction_type=WITHDRAWAL,
+            bucket=bucket_of(timezone.now()) - timedelta(days=3), count=9, total=0,
+        )
+        call_command('replay_velocity_counters', stdout=io.StringIO())
+        counter = VelocityCounter.objects.get()
+        self.assertNotEqual(counter.pk, stale.pk)
+        self.assertEqual((counter.count, counter.total), (2, Decimal(1700)))
+        self.assertEqual(counter.bucket, bucket_of(timezone.now() - timedelta(hours=3)))
+
+
+@override_settings(TRANSACTION_ARCHIVE_DAYS=30)
+class ArchiveTests(BankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user, self.account = make_account()
+        self.client.force_login(self.user)
+        now = timezone.now()
+        for amount, days_ago in [(100, 60), (200, 50), (300, 40), (400, 5), (500, 0)]:
+            txn = post_transaction(Transaction(account=self.account, amount=Decimal(amount), transaction_type=DEPOSIT))
+            Transaction.objects.filter(pk=txn.pk).update(timestamp=now - timedelta(days=days_ago))
+        rebuild_daily_balances([self.account.pk])
+        self.old_ids = list(Transaction.objects.filter(amount__lte=300).values_list('pk', flat=True))
+
+    def amounts(self, response):
+        return [int(txn.amount) for txn in response.context['object_list']]
+
+    def test_command_moves_old_rows_in_chunks(self):
+        snapshots = list(DailyBalance.objects.values_list('date', 'closing_balance'))
+        out = io.StringIO()
+        call_command('archive_transactions', '--chunk-size', '2', stdout=out)
+        self.assertIn('Archived 3 transactions', out.getvalue())
+        self.assertEqual(sorted(ArchivedTransaction.objects.values_list('pk', flat=True)), sorted(self.old_ids))
+        self.assertEqual(list(Transaction.objects.values_list('amount', flat=True)), [Decimal(500), Decimal(400)])
+        run = ArchiveRun.objects.get()
+        self.assertEqual(run.moved, 3)
+        self.assertIsNotNone(run.finished_at)
+        # journal entries still point at the archived ids, snapshots survive a rebuild
+        self.assertEqual(JournalEntry.objects.filter(transaction_id__in=self.old_ids).count(), 3)
+        rebuild_daily_balances([self.account.pk])
+        self.assertEqual(list(DailyBalance.objects.values_list('date', 'closing_balance')), snapshots)
+        self.assertEqual(find_drift([self.account.pk]), [])
+
+    def test_report_reads_archive_only_for_old_ranges(self):
+        archive_transactions()
+        today = timezone.localdate()
+        recent = {'start_date': (today - timedelta(days=10)).isoformat(), 'end_date': today.isoformat()}
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('transaction_report'), recent)
+        self.assertEqual(self.amounts(response), [500, 400])
+        self.assertFalse(any('archivedtransaction' in query['sql'] for query in captured))
+
+        old = {'start_date': (today - timedelta(days=55)).isoformat(), 'end_date': today.isoformat()}
+        response = self.client.get(reverse('transaction_report'), old)
+        self.assertEqual(self.amounts(response), [500, 400, 300, 200])
+        self.assertEqual(response.context['summary']['credits'], Decimal(1400))
+
+    def test_pages_run_on_into_the_archive(self):
+        archive_transactions()
+        queryset = Transaction.objects.filter(account=self.account)
+        older = lambda: archived_transactions(self.account)
+        amounts, cursor = [], None
+        while True:
+            rows, cursor = keyset_page(queryset, cursor, page_size=2, older=older)
+            amounts += [int(txn.amount) for txn in rows]
+            if cursor is None:
+                break
+        self.assertEqual(amounts, [500, 400, 300, 200, 100])
+
+    def test_export_includes_archived_rows(self):
+        archive_transactions()
+        response = self.client.get(reverse('transaction_statement'), {'format': 'csv'})
+        lines = b''.join(response.streaming_content).decode().splitlines()[1:]
+        self.assertEqual([line.split(',')[2] for line in lines], ['500.00', '400.00', '300.00', '200.00', '100.00'])
+
+    def test_statement_of_an_archived_month(self):
+        archive_transactions()
+        output = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output)
+        month = timezone.localtime(ArchivedTransaction.objects.get(amount=300).timestamp).date()
+        result = generate_statements(month, output, workers=1)
+        self.assertGreaterEqual(result.rows, 1)
+        html = statement_path(output, month, self.account.account_no).read_text()
+        self.assertIn('300.00', html)
@@ -1,9 +1,19 @@
+from django.conf import settings
 from django.urls import path
-from .views import DepositMoneyView, WithdrawMoneyView, TransactionReportView,LoanRequestView,LoanListView,PayLoanView
+from .views import DepositMoneyView, WithdrawMoneyView, TransactionReportView,StatementExportView,LoanRequestView,LoanListView,PayLoanView
+
+if settings.ASYNC_READ_VIEWS:
+    # ASGI deployments serve the read-only pages with async-native views
+    from .async_views import (
+        AsyncTransactionReportView as TransactionReportView,
+        AsyncStatementExportView as StatementExportView,
+        AsyncLoanListView as LoanListView,
+    )
 
 urlpatterns = [
     path("deposit/", DepositMoneyView.as_view(), name="deposit_money"),
     path("report/", TransactionReportView.as_view(), name="transaction_report"),
+    path("statement/", StatementExportView.as_view(), name="transaction_statement"),
     path("withdraw/", WithdrawMoneyView.as_view(), name="withdraw_money"),
     path("loan_request/", LoanRequestView.as_view(), name="loan_request"),
     path("loans/", LoanListView.as_view(), name="loan_list"),
@@ -0,0 +1,197 @@
+"""
+Velocity rules (e.g. at most BDT 50,000 or 5 withdrawals per account in a
+rolling window) checked against per-account hourly counters. A posting adds
+itself to its hour's VelocityCounter row; a check sums at most
+window_hours + 1 rows of the (account, type, bucket) index, so the cost per
+posting does not grow with the account's history.
+
+The window is approximate: the hour it starts in is counted by the part of
+it still inside the window, as if that hour's postings were spread evenly.
+Counting whole hours instead would let an account post twice the limit
+around an hour boundary.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from core.db import BULK_BATCH_SIZE
+from .export import TRANSACTION_TYPE_NAMES
+from .models import Transaction, VelocityCounter
+
+
+@dataclass(frozen=True)
+class VelocityRule:
+    name: str
+    transaction_type: int
+    window_hours: int
+    max_count: int = None
+    max_amount: Decimal = None
+
+    @property
+    def message(self):
+        kind = TRANSACTION_TYPE_NAMES[self.transaction_type].lower()
+        hours = 'hour' if self.window_hours == 1 else f'{self.window_hours} hours'
+        if self.max_count is not None:
+            return f'You can make at most {self.max_count} {kind} postings per {hours}'
+        return f'You can {kind} at most BDT {self.max_amount} per {hours}'
+
+
+def get_rules(transaction_type=None):
+    rules = [
+        VelocityRule(
+            name=rule['name'],
+            transaction_type=rule['transaction_type'],
+            window_hours=rule['window_hours'],
+            max_count=rule.get('max_count'),
+            max_amount=Decimal(str(rule['max_amount'])) if rule.get('max_amount') is not None else None,
+        )
+        for rule in settings.VELOCITY_RULES
+    ]
+    if transaction_type is None:
+        return rules
+    return [rule for rule in rules if rule.transaction_type == transaction_type]
+
+
+def tracked_types():
+    return {rule.transaction_type for rule in get_rules()}
+
+
+def bucket_of(moment):
+    return moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def broken_rule(account_id, transaction_type, amount, now=None):
+    """
+    The first rule a posting of amount would break, or None. One aggregate
+    query over the buckets of the longest window, whatever the number of rules.
+    """
+    rules = get_rules(transaction_type)
+    if not rules:
+        return None
+    now = now or timezone.now()
+    current = bucket_of(now)
+    # share of the window's first hour that is still inside the window
+    weight = Decimal(1) - Decimal((now - current).total_seconds()) / 3600
+    aggregates = {}
+    for rule in rules:
+        start = current - timedelta(hours=rule.window_hours)
+        aggregates[f'{rule.name}_count'] = Sum('count', filter=Q(bucket__gt=start))
+        aggregates[f'{rule.name}_amount'] = Sum('total', filter=Q(bucket__gt=start))
+        aggregates[f'{rule.name}_first_count'] = Sum('count', filter=Q(bucket=start))
+        aggregates[f'{rule.name}_first_amount'] = Sum('total', filter=Q(bucket=start))
+    longest = max(rule.window_hours for rule in rules)
+    totals = VelocityCounter.objects.filter(
+        account_id=account_id, transaction_type=transaction_type, bucket__gte=current - timedelta(hours=longest)
+    ).aggregate(**aggregates)
+
+    def in_window(rule, measure):
+        return (totals[f'{rule.name}_{measure}'] or 0) + weight * (totals[f'{rule.name}_first_{measure}'] or 0)
+
+    for rule in rules:
+        if rule.max_count is not None and in_window(rule, 'count') + 1 > rule.max_count:
+            return rule
+        if rule.max_amount is not None and in_window(rule, 'amount') + amount > rule.max_amount:
+            return rule
+    return None
+
+
+def record_posting(account_id, transaction_type, amount, now=None):
+    """
+    Count one posting in its hour. Runs in the posting's db transaction after
+    the balance UPDATE, which already serializes postings of the account.
+    """
+    if transaction_type not in tracked_types():
+        return
+    bucket = bucket_of(now or timezone.now())
+    counter = VelocityCounter.objects.filter(account_id=account_id, transaction_type=transaction_type, bucket=bucket)
+    if counter.update(count=F('count') + 1, total=F('total') + amount):
+        return
+    try:
+        with transaction.atomic():
+            VelocityCounter.objects.create(
+                account_id=account_id, transaction_type=transaction_type, bucket=bucket, count=1, total=amount
+            )
+    except IntegrityError:
+        # a posting of the same hour from outside the account lock (batch) got there first
+        counter.update(count=F('count') + 1, total=F('total') + amount)
+
+
+def record_postings(txns, now=None):
+    """Bulk record_posting for saved Transactions of one batch: a select, a CASE UPDATE and a bulk insert."""
+    types = tracked_types()
+    bucket = bucket_of(now or timezone.now())
+    sums = defaultdict(lambda: [0, Decimal(0)])
+    for txn in txns:
+        if txn.transaction_type in types:
+            sums[txn.account_id, txn.transaction_type][0] += 1
+            sums[txn.account_id, txn.transaction_type][1] += txn.amount
+    if not sums:
+        return
+
+    existing = dict(
+        ((account_id, transaction_type), pk)
+        for pk, account_id, transaction_type in VelocityCounter.objects.filter(
+            account_id__in={account_id for account_id, _ in sums}, transaction_type__in=types, bucket=bucket
+        ).values_list('pk', 'account_id', 'transaction_type')
+    )
+    updates = [(pk, sums[key]) for key, pk in existing.items() if key in sums]
+    for start in range(0, len(updates), BULK_BATCH_SIZE):
+        batch = updates[start:start + BULK_BATCH_SIZE]
+        VelocityCounter.objects.filter(pk__in=[pk for pk, _ in batch]).update(
+            count=F('count') + Case(*[When(pk=pk, then=Value(s[0])) for pk, s in batch], output_field=IntegerField()),
+            total=F('total') + Case(
+                *[When(pk=pk, then=Value(s[1])) for pk, s in batch],
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            ),
+        )
+    VelocityCounter.objects.bulk_create(
+        [
+            VelocityCounter(account_id=account_id, transaction_type=transaction_type, bucket=bucket, count=n, total=total)
+            for (account_id, transaction_type), (n, total) in sums.items()
+            if (account_id, transaction_type) not in existing
+        ],
+        batch_size=BULK_BATCH_SIZE,
+    )
+
+
+def longest_window():
+    return max((rule.window_hours for rule in get_rules()), default=0)
+
+
+def replay_counters(account_ids, since):
+    """
+    Rebuild the counters of account_ids from the Transaction rows since
+    `since`: the old buckets go and the history is regrouped by hour in SQL.
+    Returns the number of counter rows written.
+    """
+    types = tracked_types()
+    with transaction.atomic():
+        VelocityCounter.objects.filter(account_id__in=account_ids).delete()
+        rows = (
+            Transaction.objects.filter(account_id__in=account_ids, transaction_type__in=types, timestamp__gte=since)
+            .annotate(hour=TruncHour('timestamp', tzinfo=dt_timezone.utc))
+            .order_by()
+            .values('account_id', 'transaction_type', 'hour')
+            .annotate(n=Count('id'), total=Sum('amount'))
+            .values_list('account_id', 'transaction_type', 'hour', 'n', 'total')
+        )
+        counters = VelocityCounter.objects.bulk_create(
+            [
+                VelocityCounter(account_id=account_id, transaction_type=transaction_type, bucket=hour, count=n, total=total)
+                for account_id, transaction_type, hour, n, total in rows
+            ],
+            batch_size=BULK_BATCH_SIZE,
+        )
+    return len(counters)
+
+
+def purge_counters(before):
+    """Drop buckets no rule window reaches any more."""
+    return VelocityCounter.objects.filter(bucket__lt=bucket_of(before)).delete()[0]
@@ -4,19 +4,39 @@ from django.urls import reverse_lazy
 from django.utils import timezone
 from django.shortcuts import get_object_or_404, redirect
 from django.views import View
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.views.generic import CreateView, ListView
-from transactions.constants import DEPOSIT, WITHDRAWAL,LOAN, LOAN_PAID
-from datetime import datetime
-from django.db.models import Sum
+from accounts.summary import request_account_summary
+from transactions.constants import DEPOSIT, WITHDRAWAL,LOAN, LOAN_APPROVED
+from datetime import datetime, time, timedelta
 from transactions.forms import (
     DepositForm,
     WithdrawForm,
     LoanRequestForm,
 )
-from transactions.models import Transaction
+from transactions.idempotency import FIELD as IDEMPOTENCY_FIELD, IdempotentPostMixin, new_idempotency_key
+from transactions.archive import aarchived_transactions, archived_transactions
+from transactions.export import buffered, csv_lines, history_rows, jsonl_lines
+from transactions.models import Loan, Transaction
+from transactions.pagination import InvalidCursor, keyset_page, page_links
+from transactions.services import (
+    InsufficientFunds,
+    LoanLimitExceeded,
+    LoanNotPayable,
+    VelocityLimitExceeded,
+    repay_loan,
+)
+from transactions.snapshots import range_summary
+
+def get_account(request):
+    # cached summary theke account, prottek request e db te jay na
+    summary = request_account_summary(request)
+    if summary is None:
+        raise Http404('You do not have a bank account')
+    return summary.account
+
 
-class TransactionCreateMixin(LoginRequiredMixin, CreateView):
+class TransactionCreateMixin(LoginRequiredMixin, IdempotentPostMixin, CreateView):
     template_name = 'transactions/transaction_form.html'
     model = Transaction
     title = ''
@@ -25,7 +45,7 @@ class TransactionCreateMixin(LoginRequiredMixin, CreateView):
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
         kwargs.update({
-            'account': self.request.user.account
+            'account': get_account(self.request)
         })
         return kwargs
 
@@ -48,21 +68,18 @@ class DepositMoneyView(TransactionCreateMixin):
 
     def form_valid(self, form):
         amount = form.cleaned_data.get('amount')
-        account = self.request.user.account
-   
-        account.balance += amount 
-        account.save(
-            update_fields=[
-                'balance'
-            ]
-        )
+        try:
+            response = super().form_valid(form)
+        except VelocityLimitExceeded as exc:
+            form.add_error('amount', str(exc))
+            return self.form_invalid(form)
 
         messages.success(
             self.request,
             f'BDT {"{:,.2f}".format(float(amount))} was deposited to your account successfully'
         )
 
-        return super().form_valid(form)
+        return response
 
 
 class WithdrawMoneyView(TransactionCreateMixin):
@@ -75,21 +92,27 @@ class WithdrawMoneyView(TransactionCreateMixin):
 
     def form_valid(self, form):
         amount = form.cleaned_data.get('amount')
-
-        self.request.user.account.balance -= form.cleaned_data.get('amount')
-
-        self.request.user.account.save(update_fields=['balance'])
+        try:
+            response = super().form_valid(form)
+        except InsufficientFunds:
+            # balance changed between clean_amount and the posting
+            form.add_error('amount', 'You can not withdraw more than your account balance')
+            return self.form_invalid(form)
+        except VelocityLimitExceeded as exc:
+            form.add_error('amount', str(exc))
+            return self.form_invalid(form)
 
         messages.success(
             self.request,
             f'Successfully withdrawn BDT {"{:,.2f}".format(float(amount))} from your account'
         )
 
-        return super().form_valid(form)
+        return response
 
 class LoanRequestView(TransactionCreateMixin):
     form_class = LoanRequestForm
     title = 'Request For Loan'
+    success_url = reverse_lazy('loan_list')
 
     def get_initial(self):
         initial = {'transaction_type': LOAN}
@@ -97,82 +120,150 @@ class LoanRequestView(TransactionCreateMixin):
 
     def form_valid(self, form):
         amount = form.cleaned_data.get('amount')
-        current_loan_count = Transaction.objects.filter(
-            account=self.request.user.account,transaction_type=3,loan_approve=True).count()
-        if current_loan_count >= 3:
+        try:
+            response = super().form_valid(form)
+        except LoanLimitExceeded:
             return HttpResponse("You have cross the loan limits")
         messages.success(
             self.request,
             f'Loan request for BDT {"{:,.2f}".format(float(amount))} submitted successfully'
         )
 
-        return super().form_valid(form)
+        return response
     
-class TransactionReportView(LoginRequiredMixin, ListView):
-    template_name = 'transactions/transaction_report.html'
-    model = Transaction
-    balance = 0 
-    
-    def get_queryset(self):
-        queryset = super().get_queryset().filter(
-            account=self.request.user.account
-        )
+class DateRangeMixin:
+    def get_dates(self):
         start_date_str = self.request.GET.get('start_date')
         end_date_str = self.request.GET.get('end_date')
-        
-        if start_date_str and end_date_str:
+        if not (start_date_str and end_date_str):
+            return None
+
+        try:
             start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
             end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-            
-            queryset = queryset.filter(timestamp__date__gte=start_date, timestamp__date__lte=end_date)
-            self.balance = Transaction.objects.filter(
-                timestamp__date__gte=start_date, timestamp__date__lte=end_date
-            ).aggregate(Sum('amount'))['amount__sum']
-        else:
-            self.balance = self.request.user.account.balance
-       
-        return queryset.distinct() 
-    
+        except ValueError:
+            return None
+        return start_date, end_date
+
+    def filter_dates(self, queryset, start_date, end_date):
+        # timestamp__date na use kore plain range, jate index kaje lage
+        start = timezone.make_aware(datetime.combine(start_date, time.min))
+        end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+        return queryset.filter(timestamp__gte=start, timestamp__lt=end)
+
+    def archived_queryset(self, queryset, dates):
+        if queryset is not None and dates:
+            queryset = self.filter_dates(queryset, *dates)
+        return queryset
+
+    def get_archived(self, account, dates):
+        # archive table shudhu tokhon, jokhon date range ta archive cutoff er age theke shuru
+        return self.archived_queryset(archived_transactions(account, dates[0] if dates else None), dates)
+
+    async def aget_archived(self, account, dates):
+        return self.archived_queryset(await aarchived_transactions(account, dates[0] if dates else None), dates)
+
+
+class TransactionReportView(LoginRequiredMixin, DateRangeMixin, ListView):
+    template_name = 'transactions/transaction_report.html'
+    model = Transaction
+    paginate_by = 50
+    next_cursor = None
+    summary = None
+
+    def get_queryset(self):
+        account = get_account(self.request)
+        queryset = Transaction.objects.filter(account=account)
+
+        dates = self.get_dates()
+        if dates:
+            start_date, end_date = dates
+            queryset = self.filter_dates(queryset, start_date, end_date)
+            # totals come from the daily snapshots, not from the transactions
+            self.summary = range_summary(account, start_date, end_date)
+
+        try:
+            rows, self.next_cursor = keyset_page(
+                queryset, self.request.GET.get('cursor'), self.paginate_by,
+                older=lambda: self.get_archived(account, dates),
+            )
+        except InvalidCursor:
+            raise Http404('Invalid page cursor')
+        return rows
+
+    def paginate_queryset(self, queryset, page_size):
+        # get_queryset already returns a single keyset page
+        return None, None, queryset, self.next_cursor is not None
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        next_page_query, first_page_query = page_links(self.request.GET, self.next_cursor)
         context.update({
-            'account': self.request.user.account
+            'account': get_account(self.request),
+            'summary': self.summary,
+            'next_page_query': next_page_query,
+            'first_page_query': first_page_query,
         })
 
         return context
     
         
-class PayLoanView(LoginRequiredMixin, View):
-    def get(self, request, loan_id):
-        loan = get_object_or_404(Transaction, id=loan_id)
-        print(loan)
-        if loan.loan_approve:
-            user_account = loan.account
-              
-            if loan.amount < user_account.balance:
-                user_account.balance -= loan.amount
-                loan.balance_after_transaction = user_account.balance
-                user_account.save()
-                loan.loan_approved = True
-                loan.transaction_type = LOAN_PAID
-                loan.save()
-                return redirect('loan_list')
-            else:
+class StatementExportView(LoginRequiredMixin, DateRangeMixin, View):
+    formats = {
+        'csv': ('text/csv', csv_lines),
+        'jsonl': ('application/x-ndjson', jsonl_lines),
+    }
+
+    def get(self, request):
+        fmt = request.GET.get('format', 'csv')
+        if fmt not in self.formats:
+            raise Http404('Unknown statement format')
+        content_type, serialize = self.formats[fmt]
+
+        account = get_account(request)
+        queryset = Transaction.objects.filter(account=account)
+        dates = self.get_dates()
+        if dates:
+            queryset = self.filter_dates(queryset, *dates)
+
+        rows = history_rows(queryset, self.get_archived(account, dates))
+        response = StreamingHttpResponse(buffered(serialize(rows)), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="statement-{account.account_no}.{fmt}"'
+        return response
+
+
+class PayLoanView(LoginRequiredMixin, IdempotentPostMixin, View):
+    # POST only, a GET (link prefetch, crawler, retry) must never move money
+    def post(self, request, loan_id):
+        loan = get_object_or_404(Loan, id=loan_id, account=get_account(request))
+        if loan.status == LOAN_APPROVED:
+            try:
+                repay_loan(loan)
+            except InsufficientFunds:
+                self.release_idempotency_key()
                 messages.error(
             self.request,
             f'Loan amount is greater than available balance'
         )
+            except LoanNotPayable:
+                self.release_idempotency_key()
 
         return redirect('loan_list')
 
 
 class LoanListView(LoginRequiredMixin,ListView):
-    model = Transaction
+    model = Loan
     template_name = 'transactions/loan_request.html'
     context_object_name = 'loans' 
     
     def get_queryset(self):
-        user_account = self.request.user.account
-        queryset = Transaction.objects.filter(account=user_account,transaction_type=3)
-        print(queryset)
-        return queryset
\ No newline at end of file
+        user_account = get_account(self.request)
+        # Loan table theke, transaction history scan kora lage na
+        queryset = Loan.objects.filter(account=user_account)
+        return queryset
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # the pay buttons post with this key plus the loan id
+        context[IDEMPOTENCY_FIELD] = new_idempotency_key()
+        return context
@@ -0,0 +1,57 @@
+import threading
+from functools import wraps
+
+from django.conf import settings
+
+
+class WriteQueue:
+    """
+    In-process FIFO queue for money-moving writes. Threads wait their turn
+    here, in arrival order, instead of all opening a transaction and
+    retrying against sqlite's single write lock. Re-entrant, so a service
+    that posts from inside another serialized service does not wait on
+    itself.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+        self._owner = None
+        self._depth = 0
+
+    def __enter__(self):
+        me = threading.get_ident()
+        with self._condition:
+            if self._owner == me:
+                self._depth += 1
+                return self
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            while ticket != self._serving:
+                self._condition.wait()
+            self._owner = me
+            self._depth = 1
+        return self
+
+    def __exit__(self, *exc):
+        with self._condition:
+            self._depth -= 1
+            if not self._depth:
+                self._owner = None
+                self._serving += 1
+                self._condition.notify_all()
+
+
+write_queue = WriteQueue()
+
+
+def serialized(func):
+    """Run func through the write queue when SERIALIZE_MONEY_WRITES is on."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not settings.SERIALIZE_MONEY_WRITES:
+            return func(*args, **kwargs)
+        with write_queue:
+            return func(*args, **kwargs)
+    return wrapper